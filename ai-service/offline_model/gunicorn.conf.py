@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# Multi-worker deployment of the offline PHQ-9 service with a shared, preloaded model.
+#
+#   cd ai-service/offline_model
+#   gunicorn -c gunicorn.conf.py
+#
+# The app (and the model) is imported once in the master; workers are forked from it
+# and share the weight pages. Each worker gets cpu_count // workers intra-op threads
+# (override with PHQ9_THREADS_PER_WORKER) and runs a warm-up pass before serving.
+# PHQ9_INFERENCE_WORKERS (the spawned inference pool) cannot be used with this config:
+# app.py refuses it together with PHQ9_PRELOAD=1.
+import os
+
+chdir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src")
+wsgi_app = "app:asgi_app"
+worker_class = "uvicorn.workers.UvicornWorker"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+preload_app = True
+
+# read by src/app.py (preload in the master) and src/preload.py (thread split per worker)
+os.environ.setdefault("PHQ9_PRELOAD", "1")
+os.environ["PHQ9_WORKERS"] = str(workers)
+
+
+def post_fork(server, worker):
+    from preload import configure_worker_threads, warmup
+    configure_worker_threads(server.cfg.workers)
+    warmup()
@@ -1,9 +1,12 @@
 # src/app.py
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, Response, render_template, request, jsonify
 from flask_cors import CORS
-from infer import predict_from_answers
+from infer import predict_from_answers, enable_batching, batching_stats, cache_stats, cascade_stats, early_exit_stats, hierarchical_stats, enable_worker_pool, worker_pool_stats
+from serialization import dumps, parse_fields, shape_result
+from metrics import REGISTRY, render as render_metrics, timed
 from asgiref.wsgi import WsgiToAsgi
 import logging
+import os
 import numpy as np
 
 # --- Setup logging ---
@@ -12,6 +15,31 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(
 app = Flask(__name__, template_folder="../templates")
 CORS(app, resources={r"/api/": {"origins": "*"}})
 
+REQUEST_SECONDS = REGISTRY.histogram("phq9_request_seconds", "End-to-end request latency.", ("endpoint",))
+REQUEST_ERRORS = REGISTRY.counter("phq9_request_errors_total", "Requests that returned an error.", ("endpoint",))
+
+# --- Inference worker pool: PHQ9_INFERENCE_WORKERS=N runs the model in N pinned processes ---
+# Must come before batching so the batcher keeps one batch in flight per worker.
+# The pool is started on the first prediction in the serving process, never at import.
+# It does not combine with preload mode: the gunicorn workers would each start N more
+# model processes and nothing would be shared, so that combination is refused.
+if int(os.environ.get("PHQ9_INFERENCE_WORKERS", 0)) > 0:
+    if os.environ.get("PHQ9_PRELOAD") == "1":
+        raise RuntimeError("PHQ9_INFERENCE_WORKERS cannot be combined with PHQ9_PRELOAD=1 (gunicorn.conf.py); "
+                           "use gunicorn workers or an inference pool, not both")
+    enable_worker_pool(int(os.environ["PHQ9_INFERENCE_WORKERS"]))
+
+# --- Micro-batching: coalesce concurrent /api/predict calls into one forward pass ---
+# PHQ9_BATCHING=0 disables it; limits come from PHQ9_BATCH_MAX_SIZE / PHQ9_BATCH_MAX_WAIT_MS.
+if os.environ.get("PHQ9_BATCHING", "1") != "0":
+    enable_batching()
+
+# --- Preload mode: load the model once in the gunicorn master before workers fork ---
+# Set by gunicorn.conf.py; workers then share the weights instead of loading their own copy.
+if os.environ.get("PHQ9_PRELOAD") == "1":
+    from preload import preload_model
+    preload_model()
+
 # --- PHQ-9 Questions ---
 PHQ9_QUESTIONS = [
     "Little interest or pleasure in doing things? Please answer roughly: rare / a few days / most days / nearly every day (or reply in your own words).",
@@ -47,41 +75,66 @@ def index():
     result = None
     if request.method == "POST":
         answers = [request.form.get(f"q{i}", "") for i in range(1, 10)]
-        logging.info(f"[WEB FORM] Input to model: {answers}")
         try:
             result = predict_from_answers(answers, top_k=5)
             result = to_serializable(result)
-            logging.info(f"[WEB FORM] Model output: {result}")
+            # answers are sensitive: log only the outcome
+            logging.info(f"[WEB FORM] Model output: label={result['label']} source={result.get('source')}")
         except Exception as e:
             result = {"error": str(e)}
+            REQUEST_ERRORS.inc(endpoint="/")
             logging.error(f"[WEB FORM] Error: {e}")
 
     return render_template("index.html", questions=PHQ9_QUESTIONS, result=result)
 
 
 # --- API endpoint for Postman / React Native ---
+# Optional response shaping (JSON body or query string):
+#   "compact": true          -> skip concat_text and raw_model_output
+#   "fields": "label,probs"  -> return exactly these fields (list or comma-separated)
 @app.route("/api/predict", methods=["POST"])
 def api_predict():
-    try:
-        data = request.get_json(force=True)
-        answers = data.get("answers", [])
-
-        # Log input
-        logging.info(f"[API] Input to model: {answers}")
+    with timed(histogram=REQUEST_SECONDS, endpoint="/api/predict"):
+        try:
+            data = request.get_json(force=True)
+            answers = data.get("answers", [])
+            fields = parse_fields(data.get("fields", request.args.get("fields")))
+            compact = data.get("compact", request.args.get("compact", "")) in (True, 1, "1", "true", "yes")
 
-        # Model prediction
-        result = predict_from_answers(answers, top_k=5)
+            # Model prediction (answers are sensitive and are not logged)
+            result = predict_from_answers(answers, top_k=5)
 
-        # Convert NumPy → JSON safe
-        result_serializable = to_serializable(result)
+            # Select fields; NumPy values are serialized directly by dumps()
+            with timed("serialize"):
+                body = dumps({"success": True, "result": shape_result(result, fields=fields, compact=compact)})
 
-        # Log output
-        logging.info(f"[API] Model output: {result_serializable}")
+            # Log output
+            logging.info(f"[API] Model output: label={result['label']} source={result.get('source')}")
 
-        return jsonify({"success": True, "result": result_serializable})
-    except Exception as e:
-        logging.error(f"[API] Error: {e}")
-        return jsonify({"success": False, "error": str(e)}), 400
+            return Response(body, mimetype="application/json")
+        except Exception as e:
+            REQUEST_ERRORS.inc(endpoint="/api/predict")
+            logging.error(f"[API] Error: {e}")
+            return jsonify({"success": False, "error": str(e)}), 400
+
+
+# --- Batching / cache stats ---
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    return jsonify({
+        "batching": batching_stats(),
+        "cache": cache_stats(),
+        "cascade": cascade_stats(),
+        "early_exit": early_exit_stats(),
+        "hierarchical": hierarchical_stats(),
+        "worker_pool": worker_pool_stats(),
+    })
+
+
+# --- Prometheus scrape endpoint: per-stage latency histograms, counters, memory ---
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 
 # --- Wrap Flask WSGI into ASGI ---
@@ -0,0 +1,206 @@
+# src/batcher.py
+"""
+Request-coalescing micro-batcher for PHQ9ModelWrapper.predict_raw.
+
+Concurrent callers (e.g. Flask request threads serving /api/predict) submit a
+single text each; a background thread gathers them until either
+`max_batch_size` items are waiting or `max_wait_ms` has passed since the first
+one arrived, runs ONE padded forward pass and hands every caller its own row.
+A request that finds nobody else waiting is dispatched at once, so a solo
+request never pays the wait window; under load, requests arriving while a
+forward pass runs queue up and form the next batch.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List
+
+# ----------------------
+# CONFIG - overridable through the environment
+# ----------------------
+DEFAULT_MAX_BATCH_SIZE = int(os.environ.get("PHQ9_BATCH_MAX_SIZE", 16))
+DEFAULT_MAX_WAIT_MS = float(os.environ.get("PHQ9_BATCH_MAX_WAIT_MS", 5))
+STATS_WINDOW = 256  # number of recent batches kept for the rolling stats
+
+
+class _Pending:
+    __slots__ = ("text", "top_k", "future", "enqueued_at")
+
+    def __init__(self, text: str, top_k: int):
+        self.text = text
+        self.top_k = top_k
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, get_wrapper, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS,
+                 max_in_flight: int = 1):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        if max_wait_ms < 0:
+            raise ValueError("max_wait_ms must be >= 0")
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be >= 1")
+
+        # zero-arg callable returning the PHQ9ModelWrapper; resolved on the first batch
+        # so creating the batcher does not force a model load
+        self._get_wrapper = get_wrapper
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait_s = float(max_wait_ms) / 1000.0
+        # >1 only when the backend can run batches in parallel (e.g. an InferencePool);
+        # while all slots are busy new requests keep accumulating into the next batch
+        self.max_in_flight = int(max_in_flight)
+        self._slots = threading.Semaphore(self.max_in_flight)
+        self._executor = ThreadPoolExecutor(self.max_in_flight, thread_name_prefix="phq9-batch") if self.max_in_flight > 1 else None
+
+        self._queue: "queue.Queue[_Pending]" = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._recent: List[Dict[str, float]] = []
+        self._totals = {"batches": 0, "items": 0, "errors": 0}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="phq9-microbatcher", daemon=True)
+        self._thread.start()
+
+    # ----------------------
+    # public API
+    # ----------------------
+    def submit(self, text: str, top_k: int = 3) -> Future:
+        """Queue one text; the returned Future resolves to its predict_raw result dict."""
+        if self._stopped.is_set():
+            raise RuntimeError("MicroBatcher has been stopped")
+        item = _Pending(text, int(top_k))
+        self._queue.put(item)
+        return item.future
+
+    def predict(self, text: str, top_k: int = 3, timeout: float = None) -> Dict[str, Any]:
+        """Blocking convenience wrapper around submit()."""
+        return self.submit(text, top_k=top_k).result(timeout=timeout)
+
+    def stop(self, timeout: float = 5.0):
+        self._stopped.set()
+        self._thread.join(timeout=timeout)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Aggregate batching stats:
+          {
+            "batches": int, "items": int, "errors": int,
+            "avg_batch_size": float,          # over all batches
+            "recent": {                       # over the last STATS_WINDOW batches
+              "avg_batch_size", "max_batch_size", "avg_queue_wait_ms", "avg_forward_ms"
+            },
+            "max_batch_size_limit": int, "max_wait_ms_limit": float
+          }
+        """
+        with self._stats_lock:
+            totals = dict(self._totals)
+            recent = list(self._recent)
+
+        out = dict(totals)
+        out["avg_batch_size"] = (totals["items"] / totals["batches"]) if totals["batches"] else 0.0
+        if recent:
+            n = len(recent)
+            out["recent"] = {
+                "avg_batch_size": sum(r["size"] for r in recent) / n,
+                "max_batch_size": max(r["size"] for r in recent),
+                "avg_queue_wait_ms": sum(r["queue_wait_ms"] for r in recent) / n,
+                "avg_forward_ms": sum(r["forward_ms"] for r in recent) / n,
+            }
+        else:
+            out["recent"] = {}
+        out["max_batch_size_limit"] = self.max_batch_size
+        out["max_wait_ms_limit"] = self.max_wait_s * 1000.0
+        return out
+
+    # ----------------------
+    # worker loop
+    # ----------------------
+    def _collect(self) -> List[_Pending]:
+        try:
+            first = self._queue.get(timeout=0.1)
+        except queue.Empty:
+            return []
+
+        batch = [first]
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if len(batch) == 1:
+            return batch  # nobody else waiting: do not hold a solo request for the window
+
+        deadline = first.enqueued_at + self.max_wait_s
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining <= 0:
+                    # window closed - still take whatever is already waiting
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._slots.acquire()
+            batch = self._collect()
+            if not batch:
+                self._slots.release()
+            elif self._executor is None:
+                self._process(batch)
+            else:
+                self._executor.submit(self._process, batch)
+
+        # fail anything still queued so no caller blocks forever
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            item.future.set_exception(RuntimeError("MicroBatcher stopped before the request was processed"))
+
+    def _process(self, batch: List[_Pending]):
+        try:
+            self._run_batch(batch)
+        finally:
+            self._slots.release()
+
+    def _run_batch(self, batch: List[_Pending]):
+        # Run one forward pass with the largest requested top_k; each caller gets its own slice.
+        started = time.perf_counter()
+        max_k = max(item.top_k for item in batch)
+        try:
+            outputs = self._get_wrapper().predict_raw([item.text for item in batch], top_k=max_k)
+        except Exception as e:
+            with self._stats_lock:
+                self._totals["errors"] += 1
+            for item in batch:
+                item.future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        for item, out in zip(batch, outputs):
+            if item.top_k < max_k:
+                out = dict(out)
+                out["topk"] = out["topk"][:item.top_k]
+            item.future.set_result(out)
+
+        record = {
+            "size": len(batch),
+            "queue_wait_ms": (started - batch[0].enqueued_at) * 1000.0,
+            "forward_ms": (finished - started) * 1000.0,
+        }
+        with self._stats_lock:
+            self._totals["batches"] += 1
+            self._totals["items"] += len(batch)
+            self._recent.append(record)
+            if len(self._recent) > STATS_WINDOW:
+                del self._recent[0]
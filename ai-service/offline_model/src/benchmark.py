@@ -0,0 +1,352 @@
+# src/benchmark.py
+"""
+Offline inference benchmarks.
+
+  tokenizer      tokenizer throughput (texts/s, tokens/s) for single texts and batches
+  predict_raw    PHQ9ModelWrapper.predict_raw latency over a batch-size x sequence-length grid
+  predict        predict_from_answers overhead on top of a single-text predict_raw
+  e2e            POST /api/predict through the Flask test client
+
+Every benchmark reports p50/p95/p99 latency (ms) and peak RSS (MB). When the model
+directory has no weight file (the repo ships none), a tiny randomly initialized
+ALBERT with the shipped tokenizer and label map is built instead, so the numbers
+track the code path rather than the model. Results are written as JSON; compare
+two runs (e.g. two commits) with --compare.
+
+Usage (from inside src/):
+  python benchmark.py                                  # all benchmarks -> ../benchmarks/results/
+  python benchmark.py --only predict_raw --repeat 50
+  python benchmark.py --compare old.json new.json      # exit 1 on a p50/p95 regression
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+
+# ----------------------
+# CONFIG
+# ----------------------
+SRC_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = SRC_DIR.parent / "benchmarks" / "results"
+TINY_MODEL_DIR = SRC_DIR.parent / "benchmarks" / "tiny_albert"
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+BENCHMARKS = ("tokenizer", "predict_raw", "predict", "e2e")
+BATCH_SIZES = (1, 4, 16, 32)
+SEQ_LENGTHS = (32, 64, 128, 256)
+# tiny config: same vocab / tokenizer / shared-layer layout as phq9_albert_concat, much smaller tensors
+TINY_CONFIG = {"embedding_size": 32, "hidden_size": 64, "intermediate_size": 128, "num_attention_heads": 2}
+_FILLER_WORDS = ("tired", "sad", "sleep", "days", "week", "feel", "bad", "work", "food", "friends")
+
+
+# ----------------------
+# measurement helpers
+# ----------------------
+def _peak_rss_mb() -> float:
+    """Peak RSS since the last _reset_peak_rss() (Linux), else the process high-water mark."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def _reset_peak_rss():
+    # writing 5 to clear_refs resets VmHWM on Linux; elsewhere the peak stays cumulative
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def _measure(fn: Callable[[], object], repeat: int, warmup: int) -> List[float]:
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000.0)
+    return samples
+
+
+def _summarize(samples: List[float], **extra) -> Dict[str, float]:
+    arr = np.asarray(samples)
+    return {
+        "n": len(samples),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "p99_ms": round(float(np.percentile(arr, 99)), 4),
+        "mean_ms": round(float(arr.mean()), 4),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        **extra,
+    }
+
+
+# ----------------------
+# model + inputs
+# ----------------------
+def has_weights(model_dir: Path) -> bool:
+    return any((Path(model_dir) / name).exists() for name in WEIGHT_FILES)
+
+
+def build_tiny_model(source_dir: Path, out_dir: Path = TINY_MODEL_DIR, seed: int = 0) -> Path:
+    """Randomly initialized small ALBERT + the shipped tokenizer and label map (reused if already built)."""
+    import torch
+    from transformers import AlbertConfig, AlbertForSequenceClassification
+
+    out_dir = Path(out_dir)
+    if has_weights(out_dir):
+        return out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    config = AlbertConfig.from_pretrained(str(source_dir))
+    for key, value in TINY_CONFIG.items():
+        setattr(config, key, value)
+    torch.manual_seed(seed)
+    AlbertForSequenceClassification(config).save_pretrained(str(out_dir))
+    for path in Path(source_dir).iterdir():
+        if path.is_file() and path.name != "config.json" and path.name not in WEIGHT_FILES:
+            shutil.copy2(path, out_dir / path.name)
+    print(f"[bench] No weights in {source_dir}; built a tiny random ALBERT in {out_dir}")
+    return out_dir
+
+
+def _csv_texts(csv_path: str) -> List[List[str]]:
+    return [answers for answers, _ in iter_csv_answers(csv_path)]
+
+
+def _text_of_length(tokenizer, n_tokens: int, rng: random.Random) -> str:
+    """Free text that tokenizes to about n_tokens (including [CLS]/[SEP])."""
+    words = [rng.choice(_FILLER_WORDS) for _ in range(max(1, n_tokens - 2))]
+    text = " ".join(words)
+    while len(tokenizer(text)["input_ids"]) > n_tokens and len(words) > 1:
+        words.pop()
+        text = " ".join(words)
+    return text
+
+
+def _random_answers(rng: random.Random) -> List[str]:
+    # free-text answers so the prediction table, cascade and LRU never short-circuit the model
+    return [" ".join(rng.choice(_FILLER_WORDS) for _ in range(rng.randint(2, 6))) for _ in range(9)]
+
+
+# ----------------------
+# benchmarks
+# ----------------------
+def bench_tokenizer(wrapper, answer_sets, repeat, warmup, **_) -> Dict[str, dict]:
+    from infer import DELIMITER
+    texts = [DELIMITER.join(a) for a in answer_sets]
+    tok = wrapper.tokenizer
+    out = {}
+    for batch_size in (1, 64):
+        batches = [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+        it = iter(range(10 ** 9))
+
+        def run():
+            tok(batches[next(it) % len(batches)], truncation=True, padding=False, max_length=wrapper.max_len)
+
+        _reset_peak_rss()
+        samples = _measure(run, repeat, warmup)
+        mean_tokens = float(np.mean([len(ids) for ids in tok(texts, truncation=True)["input_ids"]]))
+        texts_per_s = batch_size / (np.mean(samples) / 1000.0)
+        out[f"tokenizer[batch={batch_size}]"] = _summarize(
+            samples, texts_per_s=round(texts_per_s, 1), tokens_per_s=round(texts_per_s * mean_tokens, 1))
+    return out
+
+
+def bench_predict_raw(wrapper, repeat, warmup, seed, **_) -> Dict[str, dict]:
+    rng = random.Random(seed)
+    out = {}
+    for seq_len in SEQ_LENGTHS:
+        if seq_len > wrapper.max_len:
+            continue
+        for batch_size in BATCH_SIZES:
+            texts = [_text_of_length(wrapper.tokenizer, seq_len, rng) for _ in range(batch_size)]
+            _reset_peak_rss()
+            samples = _measure(lambda: wrapper.predict_raw(texts, top_k=3), repeat, warmup)
+            out[f"predict_raw[batch={batch_size},seq={seq_len}]"] = _summarize(
+                samples, rows_per_s=round(batch_size / (np.mean(samples) / 1000.0), 1))
+    return out
+
+
+def _uncached_infer():
+    """infer with the table / LRU / cascade out of the way, so every call reaches the model."""
+    import infer
+    from cache import LRUCache
+    infer.disable_batching()
+    infer._table = False
+    infer._cascade = False
+    infer._answer_cache = LRUCache(0)
+    return infer
+
+
+def bench_predict(wrapper, repeat, warmup, seed, **_) -> Dict[str, dict]:
+    from infer import DELIMITER
+    infer = _uncached_infer()
+    rng = random.Random(seed)
+    answer_sets = [_random_answers(rng) for _ in range(repeat + warmup)]
+    texts = [DELIMITER.join(a) for a in answer_sets]
+
+    it = iter(range(10 ** 9))
+    _reset_peak_rss()
+    raw = _summarize(_measure(lambda: wrapper.predict_raw([texts[next(it) % len(texts)]], top_k=5), repeat, warmup))
+    it = iter(range(10 ** 9))
+    _reset_peak_rss()
+    full = _summarize(_measure(lambda: infer.predict_from_answers(answer_sets[next(it) % len(answer_sets)], top_k=5),
+                               repeat, warmup))
+    full["overhead_p50_ms"] = round(full["p50_ms"] - raw["p50_ms"], 4)
+    return {"predict_raw[single]": raw, "predict_from_answers": full}
+
+
+def bench_e2e(wrapper, repeat, warmup, seed, **_) -> Dict[str, dict]:
+    try:
+        import app as app_module
+    except ImportError as e:
+        print(f"[bench] e2e skipped: {e}")
+        return {"e2e[/api/predict]": {"skipped": str(e)}}
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)  # keep per-request log formatting out of the numbers
+    _uncached_infer()
+
+    client = app_module.app.test_client()
+    rng = random.Random(seed)
+    out = {}
+    for compact in (False, True):
+        payloads = [{"answers": _random_answers(rng), "compact": compact} for _ in range(repeat + warmup)]
+        it = iter(range(10 ** 9))
+
+        def run():
+            resp = client.post("/api/predict", json=payloads[next(it) % len(payloads)])
+            if resp.status_code != 200:
+                raise RuntimeError(f"/api/predict returned {resp.status_code}: {resp.get_data(as_text=True)}")
+
+        _reset_peak_rss()
+        out[f"e2e[/api/predict,compact={compact}]"] = _summarize(_measure(run, repeat, warmup))
+    return out
+
+
+_BENCH_FUNCS = {"tokenizer": bench_tokenizer, "predict_raw": bench_predict_raw, "predict": bench_predict, "e2e": bench_e2e}
+
+
+# ----------------------
+# results
+# ----------------------
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=SRC_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(base_path: str, new_path: str, tolerance: float) -> int:
+    """Print p50/p95 changes per benchmark; returns 1 if any got slower by more than `tolerance` (fraction)."""
+    base = json.loads(Path(base_path).read_text())
+    new = json.loads(Path(new_path).read_text())
+    print(f"[bench] {base['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    regressions = 0
+    for name, cur in new["results"].items():
+        old = base["results"].get(name)
+        if not old or "p50_ms" not in old or "p50_ms" not in cur:
+            continue
+        parts = []
+        for key in ("p50_ms", "p95_ms"):
+            change = (cur[key] - old[key]) / old[key] if old[key] else 0.0
+            flag = "  REGRESSION" if change > tolerance else ""
+            regressions += bool(flag)
+            parts.append(f"{key[:3]} {old[key]:.3f} -> {cur[key]:.3f} ms ({change:+.1%}){flag}")
+        print(f"  {name:45s} " + " | ".join(parts))
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    from model import BACKENDS, DEFAULT_BACKEND, DEFAULT_MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Benchmark the offline PHQ-9 inference path.")
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--only", default=",".join(BENCHMARKS), help=f"comma-separated subset of {','.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="result JSON path (default: ../benchmarks/results/<time>-<commit>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"))
+    parser.add_argument("--tolerance", type=float, default=0.10, help="allowed slowdown for --compare")
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.tolerance)
+
+    selected = [b.strip() for b in args.only.split(",") if b.strip()]
+    unknown = [b for b in selected if b not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+
+    import torch
+    import infer
+    from model import PHQ9ModelWrapper
+
+    model_dir = Path(args.model_dir).resolve()
+    tiny = not has_weights(model_dir)
+    if tiny:
+        model_dir = build_tiny_model(model_dir)
+    wrapper = PHQ9ModelWrapper(str(model_dir), backend=args.backend)
+    # everything in infer / app must use the benchmarked model
+    infer.DEFAULT_MODEL_DIR = str(model_dir)
+    infer._model_wrapper = wrapper
+
+    answer_sets = _csv_texts(args.csv)
+    results = {}
+    for name in selected:
+        print(f"[bench] running {name} ...")
+        results.update(_BENCH_FUNCS[name](wrapper, answer_sets=answer_sets, repeat=args.repeat,
+                                          warmup=args.warmup, seed=args.seed))
+
+    for name, r in results.items():
+        if "p50_ms" in r:
+            print(f"  {name:45s} p50={r['p50_ms']:8.3f}  p95={r['p95_ms']:8.3f}  p99={r['p99_ms']:8.3f} ms"
+                  f"  peak_rss={r['peak_rss_mb']:.0f} MB")
+
+    commit = _git_commit()
+    payload = {
+        "meta": {
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "tiny_model": tiny,
+            "model_dir": str(model_dir),
+            "backend": wrapper.backend,
+            "repeat": args.repeat,
+            "python": platform.python_version(),
+            "torch": torch.__version__,
+            "torch_threads": torch.get_num_threads(),
+            "cpu_count": os.cpu_count(),
+            "machine": platform.machine(),
+        },
+        "results": results,
+    }
+    out_path = Path(args.output) if args.output else RESULTS_DIR / f"{time.strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    out_path.write_text(json.dumps(payload, indent=2))
+    print(f"[bench] saved results to {out_path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,297 @@
+# src/bulk_score.py
+"""
+Streaming, resumable bulk scoring of PHQ-9 answer files.
+
+Input is read in chunks of --chunk-size rows:
+  .csv    laid out like Updated_PHQ9_Student_Dataset.csv (Q1..Q9 in columns 2..10, header row);
+          quoted answers may contain newlines
+  .jsonl  one record per line, {"answers": [9 strings]} or {"text": "<Q1> ||| ... ||| <Q9>"}
+A malformed row (unparseable, not 9 answers, non-string answers) gets an
+{"row": n, "error": "..."} line in the output and the run goes on.
+Duplicate answer sets inside a chunk are scored once. Chunks are scored on a
+process pool (--workers, each with its own model via infer.predict_batch_from_answers)
+and results are appended to the output JSONL in input order as chunks finish:
+  {"row": 0, "label_idx": 1, "label": "Minimal", "probs": [...], "q9_suicidal_flag": false, "source": "table"}
+After every written chunk a checkpoint (<output>.ckpt.json) stores the input
+byte offset and the output size, so --resume continues an interrupted run
+without rescoring or duplicating rows.
+
+Usage (from inside src/):
+  python bulk_score.py ../data/Updated_PHQ9_Student_Dataset.csv scores.jsonl --workers 4
+  python bulk_score.py export.jsonl scores.jsonl --resume
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from dataset import ANSWER_COLUMNS
+
+# ----------------------
+# CONFIG
+# ----------------------
+DEFAULT_CHUNK_SIZE = 1000
+CHECKPOINT_SUFFIX = ".ckpt.json"
+RESULT_FIELDS = ("label_idx", "label", "probs", "q9_suicidal_flag", "source")
+
+
+# ----------------------
+# input
+# ----------------------
+class Chunk:
+    __slots__ = ("first_row", "end_offset", "rows")
+
+    def __init__(self, first_row: int, end_offset: int, rows: List[Tuple[Optional[List[str]], Optional[str]]]):
+        self.first_row = first_row    # data-row number of rows[0]
+        self.end_offset = end_offset  # input byte offset just past the chunk
+        self.rows = rows              # (answers, None) or (None, error message)
+
+
+def _check_answers(answers) -> Tuple[Optional[List[str]], Optional[str]]:
+    """Exactly 9 answers, each a string (null counts as a blank answer, as in infer)."""
+    if not isinstance(answers, (list, tuple)):
+        return None, f"answers must be a list, got {type(answers).__name__}"
+    if len(answers) != 9:
+        return None, f"expected 9 answers (Q1..Q9), got {len(answers)}"
+    bad = [i + 1 for i, a in enumerate(answers) if a is not None and not isinstance(a, str)]
+    if bad:
+        return None, f"answers must be strings (Q{', Q'.join(map(str, bad))} are not)"
+    return ["" if a is None else a for a in answers], None
+
+
+def _parse_csv_row(row: List[str]) -> Tuple[Optional[List[str]], Optional[str]]:
+    answers = row[ANSWER_COLUMNS]
+    if len(answers) != 9:
+        return None, f"expected Q1..Q9 in columns {ANSWER_COLUMNS.start}..{ANSWER_COLUMNS.stop - 1}"
+    return answers, None
+
+
+def _parse_json_line(line: str) -> Tuple[Optional[List[str]], Optional[str]]:
+    from infer import DELIMITER
+    try:
+        obj = json.loads(line)
+        answers = obj["answers"] if "answers" in obj else obj["text"].split(DELIMITER)
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return None, f"unreadable record: {e}"
+    return _check_answers(answers)
+
+
+def _lines(f, pos: List[int]) -> Iterator[str]:
+    """Decoded lines of a binary file; pos[0] is the byte offset just past the last line yielded."""
+    for raw in iter(f.readline, b""):
+        pos[0] = f.tell()
+        yield raw.decode("utf-8", errors="replace")
+
+
+def _records(f, fmt: str, skip_header: bool) -> Iterator[Tuple[Tuple[Optional[List[str]], Optional[str]], int]]:
+    """(parsed row, byte offset just past it) per record. CSV records may span lines (quoted newlines)."""
+    pos = [f.tell()]
+    lines = _lines(f, pos)
+    if fmt != "csv":
+        for line in lines:
+            if line.strip():
+                yield _parse_json_line(line.strip()), pos[0]
+        return
+    # csv.reader pulls physical lines only until the current record is complete, so pos
+    # is the end of that record
+    reader = csv.reader(lines)
+    if skip_header:
+        next(reader, None)
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as e:
+            yield (None, f"unreadable record: {e}"), pos[0]
+            continue
+        if row:
+            yield _parse_csv_row(row), pos[0]
+
+
+def read_chunks(path: Path, fmt: str, chunk_size: int, start_offset: int = 0, start_row: int = 0) -> Iterator[Chunk]:
+    """Yield chunks of parsed rows starting at a byte offset; only one chunk is held at a time."""
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        row = start_row
+        rows, end = [], start_offset
+        for parsed, end in _records(f, fmt, skip_header=(start_offset == 0 and fmt == "csv")):
+            rows.append(parsed)
+            if len(rows) == chunk_size:
+                yield Chunk(row, end, rows)
+                row += len(rows)
+                rows = []
+        if rows:
+            yield Chunk(row, end, rows)
+
+
+def dedupe(rows) -> Tuple[List[List[str]], List[Optional[int]]]:
+    """Unique answer sets of a chunk plus, per row, the index of its unique set (None for bad rows)."""
+    from infer import DELIMITER
+    from prediction_table import normalize_text
+    index: Dict[str, int] = {}
+    unique, inverse = [], []
+    for answers, error in rows:
+        if error is not None:
+            inverse.append(None)
+            continue
+        key = normalize_text(DELIMITER.join(a.strip() for a in answers))
+        if key not in index:
+            index[key] = len(unique)
+            unique.append(answers)
+        inverse.append(index[key])
+    return unique, inverse
+
+
+# ----------------------
+# scoring (runs in pool workers)
+# ----------------------
+def _init_worker(model_dir: str, backend: str, threads: int):
+    import torch
+    import infer
+    from model import PHQ9ModelWrapper
+    if threads:
+        torch.set_num_threads(threads)
+    infer.DEFAULT_MODEL_DIR = model_dir
+    infer._model_wrapper = PHQ9ModelWrapper(model_dir, backend=backend)
+
+
+def score_unique(answer_sets: List[List[str]], top_k: int) -> List[Dict]:
+    from infer import predict_batch_from_answers
+    if not answer_sets:
+        return []
+    results = predict_batch_from_answers(answer_sets, top_k=top_k)
+    return [{k: r[k] for k in RESULT_FIELDS} for r in results]
+
+
+# ----------------------
+# checkpointing
+# ----------------------
+def _input_fingerprint(path: Path) -> Dict:
+    st = path.stat()
+    return {"input": str(path.resolve()), "size": st.st_size, "mtime": st.st_mtime}
+
+
+def _load_checkpoint(ckpt_path: Path, input_path: Path) -> Optional[Dict]:
+    if not ckpt_path.exists():
+        return None
+    ckpt = json.loads(ckpt_path.read_text())
+    if {k: ckpt.get(k) for k in ("input", "size", "mtime")} != _input_fingerprint(input_path):
+        raise SystemExit(f"[bulk] {ckpt_path} belongs to a different or modified input; delete it to start over.")
+    return ckpt
+
+
+def _save_checkpoint(ckpt_path: Path, state: Dict):
+    tmp = ckpt_path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state))
+    os.replace(tmp, ckpt_path)
+
+
+# ----------------------
+# driver
+# ----------------------
+def run(args) -> int:
+    from model import DEFAULT_MODEL_DIR
+
+    input_path = Path(args.input)
+    output_path = Path(args.output)
+    ckpt_path = Path(str(output_path) + CHECKPOINT_SUFFIX)
+    fmt = args.format or ("jsonl" if input_path.suffix in (".jsonl", ".json") else "csv")
+
+    state = {**_input_fingerprint(input_path), "offset": 0, "rows": 0, "unique": 0, "errors": 0, "output_bytes": 0}
+    ckpt = _load_checkpoint(ckpt_path, input_path) if args.resume else None
+    if ckpt is not None:
+        state = ckpt
+        print(f"[bulk] resuming at row {state['rows']} (byte {state['offset']})")
+    elif ckpt_path.exists():
+        ckpt_path.unlink()
+
+    model_dir = args.model_dir or str(DEFAULT_MODEL_DIR)
+    init_args = (model_dir, args.backend, args.threads)
+    executor = None
+    if args.workers > 0:
+        # spawn, like worker_pool: every worker builds its own torch / tokenizer state
+        executor = ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context("spawn"),
+                                       initializer=_init_worker, initargs=init_args)
+    if executor is None:
+        _init_worker(*init_args)
+
+    out = open(output_path, "r+b" if (ckpt is not None and output_path.exists()) else "wb")
+    out.truncate(state["output_bytes"])  # drop rows written after the last checkpoint
+    out.seek(state["output_bytes"])
+
+    started, rows_at_start = time.perf_counter(), state["rows"]
+    inflight: "deque[Tuple[Chunk, List[Optional[int]], Future]]" = deque()
+    max_inflight = max(2, 2 * args.workers)
+
+    def write_next():
+        chunk, inverse, fut = inflight.popleft()
+        scored = fut.result()
+        lines = []
+        for i, ((_, error), u) in enumerate(zip(chunk.rows, inverse)):
+            record = {"row": chunk.first_row + i, **(scored[u] if u is not None else {"error": error})}
+            lines.append(json.dumps(record, ensure_ascii=False))
+        out.write(("\n".join(lines) + "\n").encode("utf-8"))
+        out.flush()
+        state.update(offset=chunk.end_offset, rows=chunk.first_row + len(chunk.rows),
+                     unique=state["unique"] + len(scored), errors=state["errors"] + inverse.count(None),
+                     output_bytes=out.tell())
+        _save_checkpoint(ckpt_path, state)
+        elapsed = time.perf_counter() - started
+        print(f"[bulk] {state['rows']} rows ({state['unique']} scored, {state['errors']} bad) "
+              f"- {(state['rows'] - rows_at_start) / elapsed:.1f} rows/s")
+
+    try:
+        for chunk in read_chunks(input_path, fmt, args.chunk_size, state["offset"], state["rows"]):
+            unique, inverse = dedupe(chunk.rows)
+            if executor is not None:
+                fut = executor.submit(score_unique, unique, args.top_k)
+            else:
+                fut = Future()
+                fut.set_result(score_unique(unique, args.top_k))
+            inflight.append((chunk, inverse, fut))
+            while len(inflight) >= max_inflight:
+                write_next()
+        while inflight:
+            write_next()
+    except KeyboardInterrupt:
+        print(f"\n[bulk] interrupted after row {state['rows']}; continue with --resume")
+        return 130
+    finally:
+        out.close()
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    elapsed = time.perf_counter() - started
+    print(f"[bulk] done: {state['rows']} rows in {elapsed:.1f}s "
+          f"({(state['rows'] - rows_at_start) / max(elapsed, 1e-9):.1f} rows/s) -> {output_path}")
+    return 0
+
+
+def main(argv=None) -> int:
+    from model import BACKENDS, DEFAULT_BACKEND
+
+    parser = argparse.ArgumentParser(description="Score a CSV/JSONL file of PHQ-9 answer sets.")
+    parser.add_argument("input")
+    parser.add_argument("output", help="results JSONL (one line per input row)")
+    parser.add_argument("--format", choices=["csv", "jsonl"], default=None, help="input format (default: by extension)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--workers", type=int, default=min(4, os.cpu_count() or 1), help="scoring processes (0 = in-process)")
+    parser.add_argument("--threads", type=int, default=1, help="torch threads per worker (0 = torch default)")
+    parser.add_argument("--model-dir", default=None)
+    parser.add_argument("--backend", default=DEFAULT_BACKEND, choices=BACKENDS)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--resume", action="store_true", help="continue from <output>.ckpt.json")
+    args = parser.parse_args(argv)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
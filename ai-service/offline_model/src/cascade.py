@@ -0,0 +1,167 @@
+# src/cascade.py
+"""
+Cheap first-stage classifier for the PHQ-9 cascade.
+
+A pure-NumPy linear softmax model over hashed per-question word/bigram features,
+trained on Updated_PHQ9_Student_Dataset.csv. predict_from_answers asks it first
+and escalates to ALBERT only when its top probability is below the threshold.
+Scoring one answer set is a handful of hash lookups and one small mat-vec.
+
+Train (from inside src/):
+  python cascade.py --train
+"""
+import argparse
+import os
+import pickle
+import re
+import sys
+import zlib
+from pathlib import Path
+from typing import Dict, Sequence, Tuple
+
+import numpy as np
+
+from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+
+# ----------------------
+# CONFIG
+# ----------------------
+NUM_FEATURES = 1 << 12
+CASCADE_FILENAME = "cascade.npz"
+DEFAULT_THRESHOLD = float(os.environ.get("PHQ9_CASCADE_THRESHOLD", 0.9))
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+
+
+def _hash(feature: str) -> Tuple[int, float]:
+    # crc32 is stable across processes (unlike hash()); the top bit picks the sign
+    h = zlib.crc32(feature.encode("utf-8"))
+    return h % NUM_FEATURES, (1.0 if h & 0x80000000 else -1.0)
+
+
+def featurize(answers: Sequence[str]) -> np.ndarray:
+    """Hashed (signed) bag of per-question unigrams/bigrams plus the whole normalized answer."""
+    x = np.zeros(NUM_FEATURES, dtype=np.float32)
+    for q, answer in enumerate(answers, start=1):
+        tokens = _TOKEN_RE.findall((answer or "").lower())
+        feats = [f"q{q}:a:{' '.join(tokens)}"]
+        feats += [f"q{q}:w:{t}" for t in tokens]
+        feats += [f"q{q}:b:{a}_{b}" for a, b in zip(tokens, tokens[1:])]
+        feats += [f"w:{t}" for t in tokens]
+        for f in feats:
+            i, sign = _hash(f)
+            x[i] += sign
+    return x
+
+
+class CascadeClassifier:
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, label_map: Dict[int, str]):
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.label_map = label_map
+
+    def logits(self, answers: Sequence[str]) -> np.ndarray:
+        return featurize(answers) @ self.weights + self.bias
+
+    # ----------------------
+    # training / persistence
+    # ----------------------
+    @classmethod
+    def train(cls, X: np.ndarray, y: np.ndarray, label_map: Dict[int, str], epochs: int = 1000,
+              lr: float = 1.0, l2: float = 1e-4) -> "CascadeClassifier":
+        """Full-batch gradient descent on the softmax cross-entropy (the dataset is a few hundred rows)."""
+        n, d = X.shape
+        k = len(label_map)
+        W = np.zeros((d, k), dtype=np.float32)
+        b = np.zeros(k, dtype=np.float32)
+        Y = np.eye(k, dtype=np.float32)[y]
+        for _ in range(epochs):
+            z = X @ W + b
+            z -= z.max(axis=1, keepdims=True)
+            p = np.exp(z)
+            p /= p.sum(axis=1, keepdims=True)
+            g = (p - Y) / n
+            W -= lr * (X.T @ g + l2 * W)
+            b -= lr * g.sum(axis=0)
+        return cls(W, b, label_map)
+
+    def save(self, path: Path):
+        keys = sorted(self.label_map)
+        np.savez(str(path), weights=self.weights, bias=self.bias,
+                 label_ids=np.array(keys), label_names=np.array([self.label_map[i] for i in keys]),
+                 num_features=np.array(NUM_FEATURES))
+
+    @classmethod
+    def load(cls, model_dir: Path) -> "CascadeClassifier":
+        """Load <model_dir>/cascade.npz; returns None if it has not been trained."""
+        path = Path(model_dir) / CASCADE_FILENAME
+        if not path.exists():
+            return None
+        data = np.load(str(path))
+        if int(data["num_features"]) != NUM_FEATURES:
+            print(f"[cascade] Ignoring {path}: trained with a different feature size. Retrain with --train.")
+            return None
+        label_map = {int(i): str(n) for i, n in zip(data["label_ids"], data["label_names"])}
+        print(f"[cascade] Loaded first-stage classifier from {path}")
+        return cls(data["weights"], data["bias"], label_map)
+
+
+def load_training_data(csv_path: str, label_map: Dict[int, str]) -> Tuple[np.ndarray, np.ndarray]:
+    name_to_idx = {v: k for k, v in label_map.items()}
+    X, y = [], []
+    for answers, level in iter_csv_answers(csv_path):
+        if level not in name_to_idx:
+            continue
+        X.append(featurize(answers))
+        y.append(name_to_idx[level])
+    return np.stack(X), np.array(y)
+
+
+def _report(clf: CascadeClassifier, X: np.ndarray, y: np.ndarray, threshold: float, tag: str):
+    z = X @ clf.weights + clf.bias
+    p = np.exp(z - z.max(axis=1, keepdims=True))
+    p /= p.sum(axis=1, keepdims=True)
+    conf, pred = p.max(axis=1), p.argmax(axis=1)
+    covered = conf >= threshold
+    acc_cov = float(np.mean(pred[covered] == y[covered])) if covered.any() else float("nan")
+    print(f"[cascade] {tag}: accuracy={np.mean(pred == y):.3f}  "
+          f"answered@{threshold:.2f}={covered.mean():.3f}  accuracy_when_answered={acc_cov:.3f}")
+
+
+def main(argv=None) -> int:
+    from model import DEFAULT_MODEL_DIR
+
+    parser = argparse.ArgumentParser(description="Train the first-stage cascade classifier.")
+    parser.add_argument("--train", action="store_true", required=True)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--epochs", type=int, default=1000)
+    parser.add_argument("--lr", type=float, default=1.0)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    model_dir = Path(args.model_dir).resolve()
+    with open(model_dir / "label_map.pkl", "rb") as f:
+        label_map = pickle.load(f)
+
+    X, y = load_training_data(args.csv, label_map)
+    order = np.random.default_rng(args.seed).permutation(len(y))
+    n_val = int(len(y) * args.val_fraction)
+    val, tr = order[:n_val], order[n_val:]
+
+    clf = CascadeClassifier.train(X[tr], y[tr], label_map, epochs=args.epochs, lr=args.lr)
+    _report(clf, X[tr], y[tr], args.threshold, "train")
+    if n_val:
+        _report(clf, X[val], y[val], args.threshold, "val")
+
+    # final model on all rows
+    clf = CascadeClassifier.train(X, y, label_map, epochs=args.epochs, lr=args.lr)
+    clf.save(model_dir / CASCADE_FILENAME)
+    print(f"[cascade] Saved to {model_dir / CASCADE_FILENAME}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
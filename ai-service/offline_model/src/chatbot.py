@@ -1,15 +1,13 @@
 # src/chatbot.py
 import os
 import sys
-import csv
-import json
-from datetime import datetime
 
 # Add src/ to path for imports
 sys.path.append(os.path.dirname(__file__))
 
 # Use absolute import so you can run `python chatbot.py` from inside src/
 from infer import predict_from_answers
+from session_log import get_session_logger, make_record
 
 # PHQ-9 questions (same order used for training)
 PHQ9_QUESTIONS = [
@@ -24,13 +22,12 @@ PHQ9_QUESTIONS = [
     "Thoughts that you would be better off dead, or thoughts of hurting yourself in some way?"
 ]
 
-LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "logs")
-LOG_FILE = os.path.join(LOG_DIR, "phq9_chatbot_sessions.csv")
+LOG_NAME = "phq9_chatbot_sessions"  # logs/<name>.csv, or logs/<name>/ with PHQ9_SESSION_LOG_FORMAT=parquet
 
 
 def consent_prompt() -> bool:
     print("\nThis session may store sensitive responses (mental health data).")
-    print("By continuing you consent to saving this session locally (logs/phq9_chatbot_sessions.csv).")
+    print(f"By continuing you consent to saving this session locally (logs/{LOG_NAME}).")
     resp = input("Do you consent to saving this session? (y/N): ").strip().lower()
     return resp == "y"
 
@@ -79,19 +76,14 @@ def run_chatbot(save_logs_if_consented: bool = True):
         do_save = False
 
     if do_save:
-        os.makedirs(LOG_DIR, exist_ok=True)
-        write_header = not os.path.exists(LOG_FILE)
-        header = ["timestamp", "age", "gender"] + [f"Q{i}" for i in range(1, 10)] + ["pred_label", "pred_idx", "probs", "q9_flag"]
-        row = [datetime.utcnow().isoformat(), age, gender] + answers + [out["label"], out["label_idx"], json.dumps(out["probs"]), out["q9_suicidal_flag"]]
-        try:
-            with open(LOG_FILE, "a", newline="", encoding="utf-8") as f:
-                writer = csv.writer(f)
-                if write_header:
-                    writer.writerow(header)
-                writer.writerow(row)
-            print(f"Session saved to: {LOG_FILE}")
-        except Exception as e:
-            print("Failed to save session:", e)
+        # buffered: written by the logger's background thread; wait for it before saying so
+        session_log = get_session_logger(LOG_NAME)
+        if not session_log.log(make_record(out, answers, age, gender)):
+            print("Failed to save session: log queue is full.")
+        elif session_log.flush():
+            print(f"Session saved to: {session_log.path}")
+        else:
+            print(f"Session queued for {session_log.path} but not written yet (see the [session-log] message).")
     else:
         print("Session not saved (no consent).")
 
@@ -0,0 +1,31 @@
+# src/dataset.py
+"""
+Helpers for reading the PHQ-9 student dataset (Updated_PHQ9_Student_Dataset.csv).
+
+CSV layout: Age, Gender, Q1..Q9 (free text / canonical phrases), PHQ-9 Total Score, Depression Level.
+"""
+import csv
+import os
+from typing import Iterator, List, Optional, Tuple
+
+DEFAULT_CSV_PATH = os.path.join(os.path.dirname(__file__), "..", "data", "Updated_PHQ9_Student_Dataset.csv")
+
+ANSWER_COLUMNS = slice(2, 11)   # Q1..Q9
+LEVEL_COLUMN = 12               # "Depression Level"
+
+
+def iter_csv_answers(csv_path: str = DEFAULT_CSV_PATH) -> Iterator[Tuple[List[str], Optional[str]]]:
+    """
+    Stream (answers, depression_level) pairs from the dataset CSV.
+    `answers` is the list of 9 answer strings (Q1..Q9 order); `depression_level`
+    is the label string or None when the column is missing. Blank lines are skipped.
+    """
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            if not row or len(row) < 11:
+                continue
+            answers = [a.strip() for a in row[ANSWER_COLUMNS]]
+            level = row[LEVEL_COLUMN].strip() if len(row) > LEVEL_COLUMN else None
+            yield answers, level
@@ -0,0 +1,258 @@
+# src/early_exit.py
+"""
+Early-exit (adaptive-depth) inference for the shared-layer ALBERT classifier.
+
+The config uses num_hidden_groups=1, so the 12 "layers" are one layer group
+applied 12 times. Small exit heads (dense + tanh + linear on the [CLS] state,
+initialised from the model's own pooler/classifier) sit after some of those
+applications. At each exit the row's prediction entropy is checked; a row whose
+entropy is below the threshold keeps that prediction, and the forward pass stops
+as soon as every row in the batch has exited. Unconfident rows run all layers
+and use the original classifier.
+
+The exit heads are distilled from the full model on the PHQ-9 CSV on CPU:
+  python early_exit.py --train
+which also reports agreement with the full model and the average exit layer
+for a few entropy thresholds.
+"""
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+# ----------------------
+# CONFIG
+# ----------------------
+EXIT_HEADS_FILENAME = "exit_heads.pt"
+DEFAULT_EXIT_LAYERS = (3, 6, 9)     # 1-based layer counts after which an exit head runs
+
+
+class ExitHead(nn.Module):
+    def __init__(self, hidden_size: int, num_labels: int):
+        super().__init__()
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.out = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, cls_state: torch.Tensor) -> torch.Tensor:
+        return self.out(torch.tanh(self.dense(cls_state)))
+
+    @classmethod
+    def from_model(cls, model) -> "ExitHead":
+        """Start from the model's pooler + classifier: the layers are shared, so their states look alike."""
+        head = cls(model.config.hidden_size, model.config.num_labels)
+        head.dense.load_state_dict(model.albert.pooler.state_dict())
+        head.out.load_state_dict(model.classifier.state_dict())
+        return head
+
+
+class _StopForward(Exception):
+    pass
+
+
+def _entropy(probs: torch.Tensor) -> torch.Tensor:
+    return -(probs * torch.log(probs.clamp_min(1e-12))).sum(dim=-1)
+
+
+def _layer_groups(model) -> List[nn.Module]:
+    return list(model.albert.encoder.albert_layer_groups)
+
+
+class EarlyExitRunner:
+    """
+    Runs AlbertForSequenceClassification with entropy-based early exit.
+    Layer-group outputs are observed through forward hooks, so this works with
+    the stock model class (and across transformers versions) without copying
+    its forward pass. The hooks are registered once and only act on the calling
+    thread's forward pass, so concurrent callers (and other users of the same
+    layers, e.g. the hierarchical encoder) never see each other's exits.
+    """
+
+    def __init__(self, model, heads: nn.ModuleDict, entropy_threshold: float):
+        self.model = model
+        self.heads = heads.eval()
+        self.exit_layers = sorted(int(k) for k in heads.keys())
+        self.entropy_threshold = float(entropy_threshold)
+        self.num_layers = int(model.config.num_hidden_layers)
+        self._stats = {"rows": 0, "batches": 0, "exit_layer_sum": 0, "layers_evaluated": 0}
+        self._stats_lock = threading.Lock()
+        self._local = threading.local()
+        self._handles = [g.register_forward_hook(self._hook) for g in _layer_groups(model)]
+
+    def _hook(self, _module, _inputs, output):
+        call = getattr(self._local, "call", None)
+        if call is None:
+            return  # a forward pass that is not ours (another thread, or a plain model call)
+        call["n"] += 1
+        n = call["n"]
+        if str(n) not in self.heads:
+            return
+        hidden = output[0] if isinstance(output, tuple) else output
+        head_logits = self.heads[str(n)](hidden[:, 0])
+        done = call["done"]   # on the model's device; call["logits"] is on the CPU
+        confident = (_entropy(torch.softmax(head_logits, dim=-1)) < self.entropy_threshold) & ~done
+        rows = confident.nonzero(as_tuple=True)[0]
+        if len(rows):
+            call["logits"][rows.cpu()] = head_logits[rows].float().cpu()
+            for i in rows.tolist():
+                call["exit_at"][i] = n
+        done.logical_or_(confident)
+        if bool(done.all()):
+            raise _StopForward()
+
+    def forward_logits(self, input_ids: torch.Tensor, attention_mask: torch.Tensor) -> Tuple[torch.Tensor, List[int]]:
+        """Returns (logits [B, num_labels], exit layer per row)."""
+        batch = input_ids.shape[0]
+        call = {
+            "n": 0,
+            "logits": torch.empty(batch, self.model.config.num_labels),
+            "exit_at": [self.num_layers] * batch,
+            "done": torch.zeros(batch, dtype=torch.bool, device=input_ids.device),
+        }
+        logits, done = call["logits"], call["done"]
+        self._local.call = call
+        try:
+            with torch.no_grad():
+                out = self.model(input_ids=input_ids, attention_mask=attention_mask)
+            remaining = ~done
+            logits[remaining.cpu()] = out.logits[remaining].float().cpu()
+        except _StopForward:
+            pass
+        finally:
+            self._local.call = None
+
+        with self._stats_lock:
+            self._stats["rows"] += batch
+            self._stats["batches"] += 1
+            self._stats["exit_layer_sum"] += sum(call["exit_at"])
+            self._stats["layers_evaluated"] += call["n"]
+        return logits, call["exit_at"]
+
+    def close(self):
+        """Remove the hooks from the model."""
+        for h in self._handles:
+            h.remove()
+        self._handles = []
+
+    def stats(self) -> Dict[str, float]:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["avg_exit_layer"] = (s["exit_layer_sum"] / s["rows"]) if s["rows"] else None
+        s["avg_layers_evaluated_per_batch"] = (s["layers_evaluated"] / s["batches"]) if s["batches"] else None
+        s["entropy_threshold"] = self.entropy_threshold
+        s["exit_layers"] = self.exit_layers
+        return s
+
+
+# ----------------------
+# persistence
+# ----------------------
+def save_exit_heads(heads: nn.ModuleDict, path: Path):
+    torch.save({"exit_layers": sorted(int(k) for k in heads.keys()), "state_dict": heads.state_dict()}, str(path))
+
+
+def load_exit_heads(model_dir: Path, model) -> nn.ModuleDict:
+    """Load <model_dir>/exit_heads.pt; returns None if the heads have not been trained."""
+    path = Path(model_dir) / EXIT_HEADS_FILENAME
+    if not path.exists():
+        return None
+    ckpt = torch.load(str(path), map_location="cpu")
+    heads = nn.ModuleDict({str(n): ExitHead(model.config.hidden_size, model.config.num_labels) for n in ckpt["exit_layers"]})
+    heads.load_state_dict(ckpt["state_dict"])
+    print(f"[early-exit] Loaded exit heads {ckpt['exit_layers']} from {path}")
+    return heads.eval()
+
+
+# ----------------------
+# training (CPU)
+# ----------------------
+def collect_cls_states(wrapper, texts: Sequence[str], exit_layers: Sequence[int], batch_size: int = 32):
+    """[CLS] state after each exit layer plus the full model's probabilities (the distillation target)."""
+    model = wrapper.model
+    states = {n: [] for n in exit_layers}
+    teacher = []
+    for start in range(0, len(texts), batch_size):
+        enc = wrapper.tokenizer(list(texts[start:start + batch_size]), truncation=True, padding=True,
+                                max_length=wrapper.max_len, return_tensors="pt")
+        layer = {"n": 0}
+
+        def hook(_module, _inputs, output):
+            layer["n"] += 1
+            if layer["n"] in states:
+                hidden = output[0] if isinstance(output, tuple) else output
+                states[layer["n"]].append(hidden[:, 0].detach().float().cpu())
+
+        handles = [g.register_forward_hook(hook) for g in _layer_groups(model)]
+        try:
+            with torch.no_grad():
+                out = model(input_ids=enc["input_ids"].to(wrapper.device), attention_mask=enc["attention_mask"].to(wrapper.device))
+        finally:
+            for h in handles:
+                h.remove()
+        teacher.append(torch.softmax(out.logits.float().cpu(), dim=-1))
+    return {n: torch.cat(v) for n, v in states.items()}, torch.cat(teacher)
+
+
+def train_exit_heads(wrapper, texts: Sequence[str], exit_layers: Sequence[int] = DEFAULT_EXIT_LAYERS,
+                     epochs: int = 200, lr: float = 1e-3) -> nn.ModuleDict:
+    """Distill each exit head towards the full model's output distribution (backbone frozen)."""
+    states, teacher = collect_cls_states(wrapper, texts, exit_layers)
+    heads = nn.ModuleDict({str(n): ExitHead.from_model(wrapper.model) for n in exit_layers})
+    opt = torch.optim.Adam(heads.parameters(), lr=lr)
+    kl = nn.KLDivLoss(reduction="batchmean")
+    for _ in range(epochs):
+        opt.zero_grad()
+        loss = sum(kl(torch.log_softmax(heads[str(n)](states[n]), dim=-1), teacher) for n in exit_layers)
+        loss.backward()
+        opt.step()
+    print(f"[early-exit] distillation loss after {epochs} epochs: {loss.item():.4f}")
+    return heads.eval()
+
+
+def main(argv=None) -> int:
+    from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+    from infer import DELIMITER
+    from model import DEFAULT_MODEL_DIR, PHQ9ModelWrapper
+
+    parser = argparse.ArgumentParser(description="Train early-exit heads for the PHQ-9 ALBERT model.")
+    parser.add_argument("--train", action="store_true", required=True)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--exit-layers", default=",".join(map(str, DEFAULT_EXIT_LAYERS)))
+    parser.add_argument("--epochs", type=int, default=200)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    args = parser.parse_args(argv)
+
+    # early_exit_entropy=None: the reference predictions below must come from all layers
+    wrapper = PHQ9ModelWrapper(args.model_dir, device=torch.device("cpu"), backend="torch", early_exit_entropy=None)
+    exit_layers = [int(x) for x in args.exit_layers.split(",")]
+    texts = [DELIMITER.join(answers) for answers, _ in iter_csv_answers(args.csv)]
+
+    heads = train_exit_heads(wrapper, texts, exit_layers, epochs=args.epochs, lr=args.lr)
+    save_exit_heads(heads, wrapper.model_dir / EXIT_HEADS_FILENAME)
+    print(f"[early-exit] Saved exit heads to {wrapper.model_dir / EXIT_HEADS_FILENAME}")
+
+    # accuracy / depth trade-off against the full model
+    full = np.array([r["pred_idx"] for r in wrapper.predict_raw(texts, top_k=1)])  # batched, all layers
+    for threshold in (0.05, 0.1, 0.2, 0.4):
+        runner = EarlyExitRunner(wrapper.model, heads, threshold)
+        preds, started = [], time.perf_counter()
+        for text in texts:  # one unpadded row at a time, as served
+            enc = wrapper.tokenizer([text], truncation=True, max_length=wrapper.max_len, return_tensors="pt")
+            logits, _ = runner.forward_logits(enc["input_ids"], enc["attention_mask"])
+            preds.append(int(logits.argmax(-1)))
+        runner.close()
+        agree = float(np.mean(np.array(preds) == full))
+        ms = (time.perf_counter() - started) / len(texts) * 1000
+        print(f"[early-exit] entropy<{threshold:.2f}: agreement={agree:.3f}  "
+              f"avg_exit_layer={runner.stats()['avg_exit_layer']:.2f}  ms/row={ms:.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
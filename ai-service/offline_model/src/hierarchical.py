@@ -0,0 +1,264 @@
+# src/hierarchical.py
+"""
+Hierarchical (per-item) encoding mode for the PHQ-9 ALBERT classifier.
+
+The default "concat" mode joins the nine answers with " ||| " into one sequence
+of up to 256 tokens: attention cost grows with the square of that length, a long
+answer can push Q9 past the truncation point, and nothing is reused between
+requests. In "hierarchical" mode (PHQ9_ENCODING=hierarchical) each answer is
+encoded on its own as a short sequence ("Q<n>: <answer>", at most
+PHQ9_ITEM_MAX_LEN tokens) through the same ALBERT encoder, and a small head pools
+the nine pooled [CLS] vectors into the label logits.
+
+Item embeddings are cached per (item index, normalized answer) in a bounded LRU
+(PHQ9_ITEM_EMBED_CACHE_SIZE entries), so a repeated or canonical answer costs a
+lookup; only the cache misses of a request (or of a whole batch) go through the
+encoder, as one length-bucketed batch of short rows.
+
+The head is trained on the PHQ-9 CSV labels on CPU with the encoder frozen:
+  python hierarchical.py --train
+which also reports accuracy, agreement with the concat model and ms/row for both
+modes. Torch backends only; without a trained head the concat mode is used.
+"""
+import argparse
+import os
+import pickle
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+
+from cache import LRUCache
+from metrics import timed
+from model import build_prediction, softmax
+from prediction_table import CANONICAL_PHRASES, NUM_ITEMS, normalize_text
+
+# ----------------------
+# CONFIG
+# ----------------------
+HIER_HEAD_FILENAME = "hier_head.pt"
+ITEM_TEMPLATE = "Q{n}: {answer}"
+ITEM_MAX_LEN = int(os.environ.get("PHQ9_ITEM_MAX_LEN", 64))
+ITEM_EMBED_CACHE_SIZE = int(os.environ.get("PHQ9_ITEM_EMBED_CACHE_SIZE", 16384))  # 0 disables the cache
+
+
+class HierarchicalHead(nn.Module):
+    """
+    Per-item embeddings [B, 9, H] -> logits [B, num_labels].
+    A learned item embedding tells the head which question each vector answers;
+    items are transformed separately and mean-pooled, which matches the additive
+    way PHQ-9 item scores make up the total.
+    """
+
+    def __init__(self, hidden_size: int, num_labels: int, num_items: int = NUM_ITEMS):
+        super().__init__()
+        self.item_embed = nn.Parameter(torch.zeros(num_items, hidden_size))
+        self.dense = nn.Linear(hidden_size, hidden_size)
+        self.out = nn.Linear(hidden_size, num_labels)
+
+    def forward(self, item_states: torch.Tensor) -> torch.Tensor:
+        pooled = torch.tanh(self.dense(item_states + self.item_embed)).mean(dim=1)
+        return self.out(pooled)
+
+    @classmethod
+    def from_model(cls, model) -> "HierarchicalHead":
+        """Start the output layer from the model's own classifier."""
+        head = cls(model.config.hidden_size, model.config.num_labels)
+        head.out.load_state_dict(model.classifier.state_dict())
+        return head
+
+
+class HierarchicalEncoder:
+    """Scores answer sets with the per-item encoder + HierarchicalHead, caching item embeddings."""
+
+    def __init__(self, wrapper, head: HierarchicalHead, cache_size: int = ITEM_EMBED_CACHE_SIZE,
+                 item_max_len: int = ITEM_MAX_LEN):
+        self.wrapper = wrapper
+        self.head = head.to(wrapper.device).eval()
+        self.item_max_len = int(item_max_len)
+        self.cache = LRUCache(cache_size)
+        self._stats = {"rows": 0, "items_encoded": 0, "encoder_batches": 0}
+        self._stats_lock = threading.Lock()   # request threads score concurrently
+
+    @staticmethod
+    def item_key(idx: int, answer: str) -> Tuple[int, str]:
+        return idx, normalize_text(answer)
+
+    def _encode(self, keys: Sequence[Tuple[int, str]]) -> np.ndarray:
+        """Pooled [CLS] vector per (item, normalized answer): float32 [len(keys), hidden]."""
+        w = self.wrapper
+        texts = [ITEM_TEMPLATE.format(n=idx + 1, answer=answer) for idx, answer in keys]
+        ids = w.tokenizer(texts, truncation=True, padding=False, max_length=self.item_max_len)["input_ids"]
+        out = np.empty((len(keys), w.config.hidden_size), dtype=np.float32)
+        batches = 0
+        for bucket in w._length_buckets(ids, w.max_batch_tokens):
+            input_ids, attention_mask = w._pad([ids[i] for i in bucket])
+            with torch.no_grad():
+                pooled = w.model.albert(
+                    input_ids=torch.from_numpy(input_ids).to(w.device),
+                    attention_mask=torch.from_numpy(attention_mask).to(w.device),
+                ).pooler_output
+            out[bucket] = pooled.float().cpu().numpy()
+            batches += 1
+        with self._stats_lock:
+            self._stats["encoder_batches"] += batches
+            self._stats["items_encoded"] += len(keys)
+        return out
+
+    def embed(self, answer_sets: Sequence[Sequence[str]]) -> np.ndarray:
+        """Item embeddings [len(answer_sets), 9, hidden]; cache misses are encoded in one pass."""
+        keys = [[self.item_key(i, a) for i, a in enumerate(answers)] for answers in answer_sets]
+        found: Dict[Tuple[int, str], np.ndarray] = {}
+        with timed("item_cache"):
+            for key in {k for row in keys for k in row}:
+                vec = self.cache.get(key)
+                if vec is not None:
+                    found[key] = vec
+        missing = sorted({k for row in keys for k in row} - found.keys())
+        if missing:
+            with timed("encode_items"):
+                vecs = self._encode(missing)
+            for key, vec in zip(missing, vecs):
+                self.cache.put(key, vec)
+                found[key] = vec
+        return np.stack([np.stack([found[k] for k in row]) for row in keys])
+
+    def logits(self, answer_sets: Sequence[Sequence[str]]) -> np.ndarray:
+        states = self.embed(answer_sets)
+        with timed("pool_head"), torch.no_grad():
+            logits = self.head(torch.from_numpy(states).to(self.wrapper.device))
+        with self._stats_lock:
+            self._stats["rows"] += len(answer_sets)
+        return logits.float().cpu().numpy()
+
+    def predict_raw(self, answer_sets: Sequence[Sequence[str]], top_k: int = 3) -> List[Dict]:
+        """Same result dicts as PHQ9ModelWrapper.predict_raw, one per answer set (9 answers each)."""
+        if not answer_sets:
+            return []
+        logits = self.logits(answer_sets)
+        probs = softmax(logits)
+        return [build_prediction(logits[i], probs[i], self.wrapper.label_map, top_k) for i in range(len(answer_sets))]
+
+    def warm(self):
+        """Encode every canonical phrase for every item (36 short rows)."""
+        self.embed([[phrase] * NUM_ITEMS for phrase in CANONICAL_PHRASES])
+
+    def stats(self) -> Dict:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["embedding_cache"] = self.cache.stats()
+        s["avg_items_encoded_per_row"] = (s["items_encoded"] / s["rows"]) if s["rows"] else None
+        s["item_max_len"] = self.item_max_len
+        return s
+
+
+# ----------------------
+# persistence
+# ----------------------
+def save_hier_head(head: HierarchicalHead, path: Path, item_max_len: int = ITEM_MAX_LEN):
+    torch.save({"item_max_len": item_max_len, "state_dict": head.state_dict()}, str(path))
+
+
+def load_hier_head(model_dir: Path, model) -> Optional[HierarchicalHead]:
+    """Load <model_dir>/hier_head.pt; returns None if the head has not been trained."""
+    path = Path(model_dir) / HIER_HEAD_FILENAME
+    if not path.exists():
+        return None
+    ckpt = torch.load(str(path), map_location="cpu")
+    head = HierarchicalHead(model.config.hidden_size, model.config.num_labels)
+    head.load_state_dict(ckpt["state_dict"])
+    if ckpt.get("item_max_len") != ITEM_MAX_LEN:
+        print(f"[hier] Warning: head trained with item_max_len={ckpt.get('item_max_len')}, "
+              f"serving with {ITEM_MAX_LEN}")
+    print(f"[hier] Loaded hierarchical head from {path}")
+    return head.eval()
+
+
+# ----------------------
+# training (CPU)
+# ----------------------
+def train_hier_head(states: torch.Tensor, y: torch.Tensor, model, epochs: int = 300, lr: float = 1e-3) -> HierarchicalHead:
+    """Fit the head on precomputed item embeddings [N, 9, H] (encoder frozen)."""
+    head = HierarchicalHead.from_model(model)
+    opt = torch.optim.Adam(head.parameters(), lr=lr)
+    loss_fn = nn.CrossEntropyLoss()
+    for _ in range(epochs):
+        opt.zero_grad()
+        loss = loss_fn(head(states), y)
+        loss.backward()
+        opt.step()
+    print(f"[hier] training loss after {epochs} epochs: {loss.item():.4f}")
+    return head.eval()
+
+
+def _accuracy(head: HierarchicalHead, states: torch.Tensor, y: torch.Tensor) -> float:
+    with torch.no_grad():
+        return float((head(states).argmax(-1) == y).float().mean())
+
+
+def main(argv=None) -> int:
+    from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+    from infer import DELIMITER
+    from model import DEFAULT_MODEL_DIR, PHQ9ModelWrapper
+
+    parser = argparse.ArgumentParser(description="Train the hierarchical (per-item) head for the PHQ-9 ALBERT model.")
+    parser.add_argument("--train", action="store_true", required=True)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--val-fraction", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+
+    wrapper = PHQ9ModelWrapper(args.model_dir, device=torch.device("cpu"), backend="torch")
+    with open(wrapper.model_dir / "label_map.pkl", "rb") as f:
+        name_to_idx = {v: k for k, v in pickle.load(f).items()}
+    rows = [(answers, name_to_idx[level]) for answers, level in iter_csv_answers(args.csv) if level in name_to_idx]
+    answer_sets = [answers for answers, _ in rows]
+    y = torch.tensor([label for _, label in rows])
+
+    # the frozen encoder only sees each distinct (item, answer) once
+    encoder = HierarchicalEncoder(wrapper, HierarchicalHead.from_model(wrapper.model), cache_size=max(ITEM_EMBED_CACHE_SIZE, 1))
+    started = time.perf_counter()
+    states = torch.from_numpy(encoder.embed(answer_sets))
+    print(f"[hier] Encoded {encoder.stats()['items_encoded']} distinct items for {len(rows)} rows "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    order = np.random.default_rng(args.seed).permutation(len(rows))
+    n_val = int(len(rows) * args.val_fraction)
+    val, tr = torch.from_numpy(order[:n_val]), torch.from_numpy(order[n_val:])
+    head = train_hier_head(states[tr], y[tr], wrapper.model, epochs=args.epochs, lr=args.lr)
+    print(f"[hier] train accuracy={_accuracy(head, states[tr], y[tr]):.3f}"
+          + (f"  val accuracy={_accuracy(head, states[val], y[val]):.3f}" if n_val else ""))
+
+    # final head on all rows
+    head = train_hier_head(states, y, wrapper.model, epochs=args.epochs, lr=args.lr)
+    save_hier_head(head, wrapper.model_dir / HIER_HEAD_FILENAME, encoder.item_max_len)
+    print(f"[hier] Saved hierarchical head to {wrapper.model_dir / HIER_HEAD_FILENAME}")
+
+    # agreement and per-row cost against the concat model, one row at a time as served
+    sample = answer_sets[:200]
+    started = time.perf_counter()
+    concat = [wrapper.predict_raw([DELIMITER.join(a)], top_k=1)[0]["pred_idx"] for a in sample]
+    concat_ms = (time.perf_counter() - started) / len(sample) * 1000
+    for label, cache_size in (("cold", 0), ("warm", ITEM_EMBED_CACHE_SIZE)):
+        served = HierarchicalEncoder(wrapper, head, cache_size=cache_size)
+        if cache_size:
+            served.warm()
+        started = time.perf_counter()
+        hier = [served.predict_raw([a], top_k=1)[0]["pred_idx"] for a in sample]
+        ms = (time.perf_counter() - started) / len(sample) * 1000
+        agree = float(np.mean(np.array(hier) == np.array(concat)))
+        print(f"[hier] {label} cache: agreement_with_concat={agree:.3f}  ms/row={ms:.2f} (concat {concat_ms:.2f})  "
+              f"hit_rate={served.cache.stats()['hit_rate']:.3f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
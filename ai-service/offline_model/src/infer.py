@@ -1,14 +1,37 @@
 # src/infer.py
+import os
 import re
-import json
-from datetime import datetime
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import List, Dict, Any
 
-from model import PHQ9ModelWrapper
+from model import (PHQ9ModelWrapper, DEFAULT_BACKEND, DEFAULT_MODEL_DIR, DEFAULT_EARLY_EXIT_ENTROPY, TORCH_BACKENDS,
+                   build_prediction, softmax)
+from batcher import MicroBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from cache import LRUCache
+from worker_pool import InferencePool
+from prediction_table import PredictionTable, normalize_text, scorer_key
+from cascade import CascadeClassifier, DEFAULT_THRESHOLD as CASCADE_THRESHOLD
+from early_exit import EXIT_HEADS_FILENAME
+from hierarchical import HIER_HEAD_FILENAME, HierarchicalEncoder, load_hier_head
+from metrics import REGISTRY, timed
 
 # === Config / constants ===
 DELIMITER = " ||| "       # must match training notebook / train script
 TOP_K_DEFAULT = 5
+USE_PREDICTION_TABLE = os.environ.get("PHQ9_USE_PREDICTION_TABLE", "1") != "0"
+ANSWER_CACHE_SIZE = int(os.environ.get("PHQ9_ANSWER_CACHE_SIZE", 4096))  # 0 disables the LRU
+USE_CASCADE = os.environ.get("PHQ9_USE_CASCADE", "1") != "0"
+# fraction of cascade-answered requests also scored by ALBERT to measure agreement
+# (small by default so agreement is always measured; 0 turns shadowing off)
+CASCADE_SHADOW_RATE = float(os.environ.get("PHQ9_CASCADE_SHADOW_RATE", 0.02))
+# shadow passes run in the background; samples are dropped while this many are queued
+SHADOW_MAX_PENDING = 16
+# model-stage input encoding: "concat" (one " ||| "-joined sequence) or "hierarchical"
+# (per-item sequences with cached embeddings, see hierarchical.py)
+ENCODING = os.environ.get("PHQ9_ENCODING", "concat")
 
 # simple suicidal keyword detector for Q9 (basic safety net)
 _SUICIDAL_RE = re.compile(
@@ -18,15 +41,316 @@ _SUICIDAL_RE = re.compile(
 
 # instantiate model wrapper once (module-level)
 _model_wrapper = None
+_wrapper_lock = threading.Lock()
+# requested worker pool as (num_workers, pool_kwargs); the pool itself is started lazily,
+# in the process that serves requests (see enable_worker_pool)
+_pool_config = None
+# optional request-coalescing batcher (see enable_batching)
+_batcher = None
+# canonical-answer prediction table (loaded lazily; False = looked for it and found none)
+_table = None
+_table_lock = threading.Lock()
+# free-text fallback: normalized concat_text -> logits
+_answer_cache = LRUCache(ANSWER_CACHE_SIZE)
+# guards _table_hits and _cascade_stats (requests update them from several threads)
+_stats_lock = threading.Lock()
+_table_hits = 0
+# first-stage cascade classifier (loaded lazily like the table)
+_cascade = None
+_cascade_stats = {"answered": 0, "escalated": 0, "escalated_agree": 0, "shadowed": 0, "shadow_agree": 0,
+                  "shadow_dropped": 0}
+# runs the cascade shadow passes off the request path (created on first use, see _shadow)
+_shadow_executor = None
+_shadow_pending = 0
+# per-item encoder (loaded lazily like the table)
+_hierarchical = None
+_predictions = REGISTRY.counter("phq9_predictions_total", "predict_from_answers calls by answering stage.", ("source",))
 
 
 def _get_wrapper() -> PHQ9ModelWrapper:
+    # may also be an InferencePool (see enable_worker_pool); both expose predict_raw / label_map
     global _model_wrapper
     if _model_wrapper is None:
-        _model_wrapper = PHQ9ModelWrapper()  # uses the DEFAULT_MODEL_DIR in model.py
+        with _wrapper_lock:
+            if _model_wrapper is None:
+                if _pool_config is not None:
+                    num_workers, pool_kwargs = _pool_config
+                    _model_wrapper = InferencePool(num_workers, **pool_kwargs)
+                else:
+                    _model_wrapper = PHQ9ModelWrapper()  # uses the DEFAULT_MODEL_DIR in model.py
     return _model_wrapper
 
 
+def enable_batching(max_batch_size: int = DEFAULT_MAX_BATCH_SIZE, max_wait_ms: float = DEFAULT_MAX_WAIT_MS) -> MicroBatcher:
+    """
+    Route single-text predictions through a MicroBatcher so concurrent callers
+    (e.g. Flask request threads) share one forward pass. Safe to call twice;
+    the existing batcher is replaced with one using the new limits.
+    With a worker pool, one batch per worker can be in flight at a time.
+    """
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+    in_flight = _pool_config[0] if _pool_config is not None else 1
+    _batcher = MicroBatcher(_get_wrapper, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms,
+                            max_in_flight=in_flight)
+    return _batcher
+
+
+def enable_worker_pool(num_workers: int, **pool_kwargs):
+    """
+    Serve inference from `num_workers` dedicated processes instead of this one.
+    The pool replaces the in-process wrapper (it has the same predict_raw surface)
+    and is started on first use, not here: importing the app must not spawn
+    processes (spawned children re-import __main__), and a pool started in a
+    gunicorn master would hand the same pipes to every forked worker.
+    An active batcher is rebuilt so it keeps every worker busy.
+    """
+    global _model_wrapper, _pool_config
+    if num_workers < 1:
+        raise ValueError("num_workers must be >= 1")
+    with _wrapper_lock:
+        if isinstance(_model_wrapper, InferencePool):
+            _model_wrapper.close()
+        _model_wrapper = None
+        _pool_config = (int(num_workers), dict(pool_kwargs))
+    if _batcher is not None:
+        enable_batching(_batcher.max_batch_size, _batcher.max_wait_s * 1000.0)
+
+
+def worker_pool_stats() -> Dict[str, Any]:
+    if _pool_config is None:
+        return {"enabled": False}
+    if not isinstance(_model_wrapper, InferencePool):
+        return {"enabled": True, "started": False, "workers": _pool_config[0]}
+    return {"enabled": True, "started": True, **_model_wrapper.stats()}
+
+
+def disable_batching():
+    global _batcher
+    if _batcher is not None:
+        _batcher.stop()
+        _batcher = None
+
+
+def batching_stats() -> Dict[str, Any]:
+    """Return MicroBatcher stats, or {"enabled": False} when batching is off."""
+    if _batcher is None:
+        return {"enabled": False}
+    return {"enabled": True, **_batcher.stats()}
+
+
+def _predict_one(text: str, top_k: int) -> Dict[str, Any]:
+    """Single-text inference, coalesced with concurrent callers when batching is enabled."""
+    if _batcher is not None:
+        return _batcher.predict(text, top_k=top_k)
+    return _get_wrapper().predict_raw([text], top_k=top_k)[0]
+
+
+def _get_table():
+    global _table
+    if _table is None:
+        scorer = _active_scorer() if USE_PREDICTION_TABLE else None
+        with _table_lock:
+            if _table is None:
+                _table = (PredictionTable.load(DEFAULT_MODEL_DIR, scorer=scorer) if USE_PREDICTION_TABLE else None) or False
+    return _table or None
+
+
+def _active_scorer() -> Dict[str, Any]:
+    """
+    What answers at the model stage in this process (backend / encoding / early exit), see scorer_key.
+    Worked out from the configuration and the trained files on disk, so the table can serve its
+    hits before the model (or the worker pool) is loaded; an in-process wrapper that is already
+    loaded reports what it actually runs.
+    """
+    wrapper = _model_wrapper
+    if wrapper is not None and not isinstance(wrapper, InferencePool):
+        runner = getattr(wrapper, "early_exit", None)
+        backend = getattr(wrapper, "backend", "torch")
+        in_process_torch = getattr(wrapper, "model", None) is not None
+        entropy = runner.entropy_threshold if runner is not None else None
+    else:
+        # the pool workers build their wrappers from the same environment
+        pool_kwargs = _pool_config[1] if _pool_config is not None else {}
+        backend = pool_kwargs.get("backend", DEFAULT_BACKEND)
+        model_dir = Path(pool_kwargs.get("model_dir", DEFAULT_MODEL_DIR))
+        has_heads = backend in TORCH_BACKENDS and (model_dir / EXIT_HEADS_FILENAME).exists()
+        entropy = DEFAULT_EARLY_EXIT_ENTROPY if has_heads else None
+        in_process_torch = _pool_config is None and backend in TORCH_BACKENDS
+    if _hierarchical is not None:
+        encoding = "hierarchical" if _hierarchical else "concat"
+    else:
+        # same fallback as _load_hierarchical: needs an in-process torch model and a trained head
+        hier = (ENCODING == "hierarchical" and in_process_torch
+                and (Path(DEFAULT_MODEL_DIR) / HIER_HEAD_FILENAME).exists())
+        encoding = "hierarchical" if hier else "concat"
+    return scorer_key(backend, encoding, entropy)
+
+
+def _get_cascade():
+    global _cascade
+    if _cascade is None:
+        with _table_lock:
+            if _cascade is None:
+                _cascade = (CascadeClassifier.load(DEFAULT_MODEL_DIR) if USE_CASCADE else None) or False
+    return _cascade or None
+
+
+def _get_hierarchical():
+    global _hierarchical
+    if _hierarchical is None:
+        with _table_lock:
+            if _hierarchical is None:
+                _hierarchical = _load_hierarchical() if ENCODING == "hierarchical" else False
+    return _hierarchical or None
+
+
+def _load_hierarchical():
+    wrapper = _get_wrapper()
+    head = load_hier_head(wrapper.model_dir, wrapper.model) if getattr(wrapper, "model", None) is not None else None
+    if head is None:
+        print("[hier] Warning: PHQ9_ENCODING=hierarchical needs an in-process torch backend and a trained head "
+              "(`python hierarchical.py --train`). Using the concat encoding.")
+        return False
+    return HierarchicalEncoder(wrapper, head)
+
+
+def hierarchical_stats() -> Dict[str, Any]:
+    """Embedding-cache hit rate and items encoded per row when the hierarchical encoding is active."""
+    if not _hierarchical:
+        return {"enabled": False, "encoding": ENCODING}
+    return {"enabled": True, **_hierarchical.stats()}
+
+
+def cascade_stats() -> Dict[str, Any]:
+    """
+    Which stage answered, and how often the cheap model agreed with ALBERT:
+    on escalated requests (always measured) and on a shadow sample of the
+    requests it answered itself (PHQ9_CASCADE_SHADOW_RATE, scored in the background;
+    shadow_dropped counts samples skipped while the background queue was full).
+    """
+    with _stats_lock:
+        s = dict(_cascade_stats)
+    s["loaded"] = bool(_cascade)
+    s["threshold"] = CASCADE_THRESHOLD
+    s["escalated_agreement"] = (s["escalated_agree"] / s["escalated"]) if s["escalated"] else None
+    s["shadow_agreement"] = (s["shadow_agree"] / s["shadowed"]) if s["shadowed"] else None
+    return s
+
+
+def early_exit_stats() -> Dict[str, Any]:
+    """Average exit layer etc. when the in-process wrapper runs in adaptive-depth mode."""
+    runner = getattr(_model_wrapper, "early_exit", None)
+    if runner is None:
+        return {"enabled": False}
+    return {"enabled": True, **runner.stats()}
+
+
+def cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the prediction table and the normalized-answer LRU cache."""
+    with _stats_lock:
+        table_hits = _table_hits
+    return {
+        "table_loaded": bool(_table),
+        "table_hits": table_hits,
+        "answer_cache": _answer_cache.stats(),
+    }
+
+
+def _score_cheap(answers: List[str], concat_text: str, top_k: int):
+    """
+    The stages in front of the model: prediction table -> normalized-text LRU -> cascade.
+    Returns (raw_out, source, cascade_idx); raw_out is None when the model has to answer.
+    """
+    global _table_hits
+    table = _get_table()
+    if table is not None:
+        logits = table.lookup(answers)
+        if logits is not None:
+            with _stats_lock:
+                _table_hits += 1
+            return build_prediction(logits, softmax(logits), table.label_map, top_k), "table", None
+
+    logits = _answer_cache.get(normalize_text(concat_text))
+    if logits is not None:
+        return build_prediction(logits, softmax(logits), _get_wrapper().label_map, top_k), "cache", None
+
+    cascade = _get_cascade()
+    cascade_idx = None
+    if cascade is not None:
+        c_logits = cascade.logits(answers)
+        c_probs = softmax(c_logits)
+        cascade_idx = int(c_probs.argmax())
+        if c_probs[cascade_idx] >= CASCADE_THRESHOLD:
+            with _stats_lock:
+                _cascade_stats["answered"] += 1
+            if CASCADE_SHADOW_RATE and random.random() < CASCADE_SHADOW_RATE:
+                _shadow(answers, concat_text, cascade_idx)
+            return build_prediction(c_logits, c_probs, cascade.label_map, top_k), "cascade", cascade_idx
+    return None, None, cascade_idx
+
+
+def _shadow(answers: List[str], concat_text: str, cascade_idx: int):
+    """
+    Score a cascade-answered request with the model in the background and record whether the
+    two agree; the request itself does not wait for it. Returns the Future, or None when the
+    sample was dropped because SHADOW_MAX_PENDING passes are already queued.
+    """
+    global _shadow_executor, _shadow_pending
+    with _stats_lock:
+        if _shadow_pending >= SHADOW_MAX_PENDING:
+            _cascade_stats["shadow_dropped"] += 1
+            return None
+        _shadow_pending += 1
+        if _shadow_executor is None:
+            _shadow_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phq9-shadow")
+    return _shadow_executor.submit(_run_shadow, answers, concat_text, cascade_idx)
+
+
+def _run_shadow(answers: List[str], concat_text: str, cascade_idx: int):
+    global _shadow_pending
+    try:
+        agree = _predict_model(answers, concat_text, 1)["pred_idx"] == cascade_idx
+    except Exception as e:
+        print(f"[cascade] shadow pass failed: {e}")
+        agree = None
+    with _stats_lock:
+        _shadow_pending -= 1
+        if agree is not None:
+            _cascade_stats["shadowed"] += 1
+            _cascade_stats["shadow_agree"] += int(agree)
+
+
+def _predict_model(answers: List[str], concat_text: str, top_k: int) -> Dict[str, Any]:
+    """The model stage for one answer set, in the configured encoding."""
+    hier = _get_hierarchical()
+    if hier is not None:
+        return hier.predict_raw([answers], top_k=top_k)[0]
+    return _predict_one(concat_text, top_k)
+
+
+def _record_model_result(concat_text: str, raw_out: Dict[str, Any], cascade_idx):
+    _answer_cache.put(normalize_text(concat_text), raw_out["logits"])
+    if cascade_idx is not None:
+        with _stats_lock:
+            _cascade_stats["escalated"] += 1
+            _cascade_stats["escalated_agree"] += int(raw_out["pred_idx"] == cascade_idx)
+
+
+def _score_answers(answers: List[str], concat_text: str, top_k: int):
+    """
+    Resolve one answer set: prediction table -> normalized-text LRU -> cascade -> model.
+    Returns (raw_out, source) with source in {"table", "cache", "cascade", "model"}.
+    """
+    raw_out, source, cascade_idx = _score_cheap(answers, concat_text, top_k)
+    if raw_out is not None:
+        return raw_out, source
+    raw_out = _predict_model(answers, concat_text, top_k)
+    _record_model_result(concat_text, raw_out, cascade_idx)
+    return raw_out, "model"
+
+
 def q9_suicidal_flag(q9_text: str) -> bool:
     """Return True if q9_text contains obvious suicidal keywords (case-insensitive)."""
     if not q9_text:
@@ -45,13 +369,55 @@ def predict_from_answers(answers: List[str], top_k: int = TOP_K_DEFAULT, allow_s
         "probs": [float,...],
         "topk": [(idx, prob, label_name), ...],
         "q9_suicidal_flag": bool,
-        "raw_model_output": {...}   # optional raw outputs from wrapper
+        "raw_model_output": {...},  # optional raw outputs from wrapper
+        "source": str               # "table" | "cache" | "cascade" | "model" - what answered the request
       }
     Parameters:
       - answers: list of 9 strings (if fewer and allow_short=True, missing entries will be filled with "")
       - top_k: number of top predictions to return
       - allow_short: if True, will pad answers to length 9 with empty strings; otherwise will raise on length != 9
     """
+    answers = _prepare_answers(answers, allow_short)
+    concat_text = DELIMITER.join(answers)
+
+    with timed("score"):
+        raw_out, source = _score_answers(answers, concat_text, top_k)
+    _predictions.inc(source=source)
+    return _build_result(answers, concat_text, raw_out, source)
+
+
+def predict_batch_from_answers(answer_sets: List[List[str]], top_k: int = TOP_K_DEFAULT,
+                               allow_short: bool = False) -> List[Dict[str, Any]]:
+    """
+    predict_from_answers for many answer sets: the table / cache / cascade stages run per
+    row, and the rows left for the model go through one predict_raw call (length-bucketed;
+    in the hierarchical encoding, one pass over the batch's uncached item answers).
+    Results are in input order.
+    """
+    prepared = [_prepare_answers(a, allow_short) for a in answer_sets]
+    texts = [DELIMITER.join(a) for a in prepared]
+    scored = [_score_cheap(a, t, top_k) for a, t in zip(prepared, texts)]
+
+    pending = [i for i, (raw_out, _, _) in enumerate(scored) if raw_out is None]
+    if pending:
+        with timed("score_batch"):
+            hier = _get_hierarchical()
+            if hier is not None:
+                outs = hier.predict_raw([prepared[i] for i in pending], top_k=top_k)
+            else:
+                outs = _get_wrapper().predict_raw([texts[i] for i in pending], top_k=top_k)
+        for i, raw_out in zip(pending, outs):
+            _record_model_result(texts[i], raw_out, scored[i][2])
+            scored[i] = (raw_out, "model", None)
+
+    results = []
+    for answers, text, (raw_out, source, _) in zip(prepared, texts, scored):
+        _predictions.inc(source=source)
+        results.append(_build_result(answers, text, raw_out, source))
+    return results
+
+
+def _prepare_answers(answers: List[str], allow_short: bool = False) -> List[str]:
     if not isinstance(answers, (list, tuple)):
         raise ValueError("answers must be a list/tuple of 9 strings (Q1..Q9).")
 
@@ -63,13 +429,10 @@ def predict_from_answers(answers: List[str], top_k: int = TOP_K_DEFAULT, allow_s
             raise ValueError(f"answers must have length 9. Got length {len(answers)}.")
 
     # ensure strings
-    answers = ["" if a is None else str(a).strip() for a in answers]
+    return ["" if a is None else str(a).strip() for a in answers]
 
-    concat_text = DELIMITER.join(answers)
-
-    wrapper = _get_wrapper()
-    raw_out = wrapper.predict_raw([concat_text], top_k=top_k)[0]
 
+def _build_result(answers: List[str], concat_text: str, raw_out: Dict[str, Any], source: str) -> Dict[str, Any]:
     label_idx = int(raw_out["pred_idx"])
     label = raw_out["pred_label"]
     probs = raw_out["probs"].tolist() if hasattr(raw_out["probs"], "tolist") else list(raw_out["probs"])
@@ -84,7 +447,8 @@ def predict_from_answers(answers: List[str], top_k: int = TOP_K_DEFAULT, allow_s
         "probs": probs,
         "topk": topk,
         "q9_suicidal_flag": q9_flag,
-        "raw_model_output": raw_out
+        "raw_model_output": raw_out,
+        "source": source
     }
     return result
 
@@ -98,8 +462,7 @@ def predict_text(text: str, top_k: int = TOP_K_DEFAULT) -> Dict[str, Any]:
     if text is None:
         raise ValueError("text must be a non-empty string")
 
-    wrapper = _get_wrapper()
-    raw_out = wrapper.predict_raw([text], top_k=top_k)[0]
+    raw_out = _predict_one(text, top_k)
     label_idx = int(raw_out["pred_idx"])
     label = raw_out["pred_label"]
     probs = raw_out["probs"].tolist() if hasattr(raw_out["probs"], "tolist") else list(raw_out["probs"])
@@ -144,20 +507,12 @@ def _interactive_cli():
     print("\nConcatenated text (truncated):", out["concat_text"][:300])
 
     # optional: save quick session to logs
-    save = input("\nSave this session to logs/phq9_results_concatenated.csv? (y/N): ").strip().lower()
+    save = input("\nSave this session to logs/phq9_results_concatenated? (y/N): ").strip().lower()
     if save == "y":
-        import csv, os
-        os.makedirs("logs", exist_ok=True)
-        fname = "logs/phq9_results_concatenated.csv"
-        header = ["timestamp", "age", "gender"] + [f"Q{i}" for i in range(1,10)] + ["pred_label", "pred_idx", "probs", "q9_flag"]
-        write_header = not os.path.exists(fname)
-        with open(fname, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            if write_header:
-                writer.writerow(header)
-            row = [datetime.utcnow().isoformat(), age, gender] + answers + [out["label"], out["label_idx"], json.dumps(out["probs"]), out["q9_suicidal_flag"]]
-            writer.writerow(row)
-        print(f"Saved to {fname}")
+        from session_log import get_session_logger, make_record
+        session_log = get_session_logger("phq9_results_concatenated")
+        session_log.log(make_record(out, answers, age, gender))
+        print(f"Saved to {session_log.path}")
 
 if __name__ == "__main__":
     _interactive_cli()
@@ -1,6 +1,7 @@
 # src/model.py
 import os
 import sys
+import json
 import pickle
 from pathlib import Path
 from typing import List, Tuple, Dict, Any
@@ -8,7 +9,11 @@ from typing import List, Tuple, Dict, Any
 import numpy as np
 import torch
 
-from transformers import AlbertTokenizerFast, AlbertForSequenceClassification
+from transformers import AlbertConfig, AlbertTokenizerFast, AlbertForSequenceClassification
+
+from early_exit import EarlyExitRunner, load_exit_heads
+from metrics import timed
+from prediction_table import weights_fingerprint
 
 
 # ----------------------
@@ -16,15 +21,77 @@ from transformers import AlbertTokenizerFast, AlbertForSequenceClassification
 # ----------------------
 DEFAULT_MODEL_DIR = os.path.join(os.path.dirname(__file__), "..", "models", "phq9_albert_concat")
 DEFAULT_MAX_LEN = 256
+# Padded-token budget per forward pass for length-bucketed batching (rows x padded length).
+# 0 disables bucketing: the whole input list is padded to its longest row.
+DEFAULT_MAX_BATCH_TOKENS = int(os.environ.get("PHQ9_MAX_BATCH_TOKENS", 4096))
+
+# Inference backends:
+#   torch       - float32 eager PyTorch (reference)
+#   torch-int8  - PyTorch with dynamic int8 quantization of the Linear layers (CPU only)
+#   onnx        - ONNX export run through ONNX Runtime
+#   onnx-int8   - ONNX export with dynamic int8 weight quantization, run through ONNX Runtime
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+TORCH_BACKENDS = ("torch", "torch-int8")   # keep an in-process nn.Module (needed by early exit / hierarchical)
+DEFAULT_BACKEND = os.environ.get("PHQ9_BACKEND", "torch")
+# Entropy (nats) below which an early-exit head may answer; unset = always run all layers.
+# Requires exit heads trained with `python early_exit.py --train` (torch backends only).
+DEFAULT_EARLY_EXIT_ENTROPY = float(os.environ["PHQ9_EARLY_EXIT_ENTROPY"]) if os.environ.get("PHQ9_EARLY_EXIT_ENTROPY") else None
+ONNX_SUBDIR = "onnx"
+ONNX_OPSET = 17
+# fingerprint of the weights an ONNX export was made from (see prediction_table.weights_fingerprint)
+ONNX_META_FILENAME = "export.json"
+
+
+def softmax(logits: np.ndarray) -> np.ndarray:
+    z = logits - logits.max(axis=-1, keepdims=True)
+    e = np.exp(z)
+    return e / e.sum(axis=-1, keepdims=True)
+
+
+def build_prediction(logits: np.ndarray, probs: np.ndarray, label_map: Dict[int, str], top_k: int) -> Dict[str, Any]:
+    """Shape one row of logits/probs into the predict_raw result dict."""
+    pred_idx = int(np.argmax(probs))
+    pred_label = label_map.get(pred_idx, str(pred_idx))
+    # top-k
+    topk_idx = list(np.argsort(probs)[-top_k:][::-1])
+    topk = [(int(ii), float(probs[ii]), label_map.get(int(ii), str(ii))) for ii in topk_idx]
+    return {
+        "logits": logits,
+        "probs": probs,
+        "pred_idx": pred_idx,
+        "pred_label": pred_label,
+        "topk": topk
+    }
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Export shim: plain (input_ids, attention_mask) -> logits signature for torch.onnx."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
 
 # ----------------------
 # Wrapper
 # ----------------------
 class PHQ9ModelWrapper:
-    def __init__(self, model_dir: Path = DEFAULT_MODEL_DIR, device: torch.device = None, max_len: int = DEFAULT_MAX_LEN):
+    def __init__(self, model_dir: Path = DEFAULT_MODEL_DIR, device: torch.device = None, max_len: int = DEFAULT_MAX_LEN,
+                 backend: str = DEFAULT_BACKEND, max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+                 early_exit_entropy: float = DEFAULT_EARLY_EXIT_ENTROPY):
         self.model_dir = Path(model_dir).resolve()
         self.max_len = int(max_len)
-        self.device = device or (torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu"))
+        self.max_batch_tokens = int(max_batch_tokens)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+        self.backend = backend
+        if backend == "torch":
+            self.device = device or (torch.device("cuda") if torch.cuda.is_available() else torch.device("cpu"))
+        else:
+            # quantized torch kernels and the ONNX Runtime CPU provider are CPU-only
+            self.device = torch.device("cpu")
 
         # sanity checks
         if not self.model_dir.exists() or not self.model_dir.is_dir():
@@ -32,7 +99,7 @@ class PHQ9ModelWrapper:
 
         # show files for debugging
         files = sorted([p.name for p in self.model_dir.iterdir()])
-        print(f"[model] Loading model from: {self.model_dir}")
+        print(f"[model] Loading model from: {self.model_dir} (backend={self.backend})")
         print(f"[model] Files found: {files}")
 
         # load tokenizer
@@ -46,17 +113,29 @@ class PHQ9ModelWrapper:
             ) from e
 
         # load model
-        try:
-            self.model = AlbertForSequenceClassification.from_pretrained(str(self.model_dir), local_files_only=True)
-        except Exception as e:
-            raise RuntimeError(
-                f"Failed to load model weights from '{self.model_dir}'.\n"
-                f"Ensure model files (pytorch_model.bin or model.safetensors and config.json) exist in that folder.\n"
-                f"Original error: {e}"
-            ) from e
+        self.model = None
+        self.ort_session = None
+        if self.backend in ("onnx", "onnx-int8"):
+            self.config = AlbertConfig.from_pretrained(str(self.model_dir), local_files_only=True)
+            self.ort_session = self._load_onnx_session(quantized=(self.backend == "onnx-int8"))
+        else:
+            self.model = self._load_torch_model()
+            self.config = self.model.config
+            if self.backend == "torch-int8":
+                self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+                print("[model] Applied dynamic int8 quantization to Linear layers")
+            self.model.to(self.device)
+            self.model.eval()
 
-        self.model.to(self.device)
-        self.model.eval()
+        # optional adaptive-depth inference
+        self.early_exit = None
+        if early_exit_entropy is not None:
+            heads = load_exit_heads(self.model_dir, self.model) if self.model is not None else None
+            if heads is None:
+                print(f"[model] Warning: early exit requested but unavailable for backend={self.backend} "
+                      f"(train heads with `python early_exit.py --train`). Running all layers.")
+            else:
+                self.early_exit = EarlyExitRunner(self.model, heads.to(self.device), early_exit_entropy)
 
         # load label_map (optional) - maps index -> human-readable label
         label_map_path = self.model_dir / "label_map.pkl"
@@ -70,10 +149,64 @@ class PHQ9ModelWrapper:
                 self.label_map = self._build_fallback_label_map()
         else:
             self.label_map = self._build_fallback_label_map()
+        self.num_labels = int(getattr(self.config, "num_labels", len(self.label_map)))
+
+    def _load_torch_model(self) -> AlbertForSequenceClassification:
+        try:
+            return AlbertForSequenceClassification.from_pretrained(str(self.model_dir), local_files_only=True)
+        except Exception as e:
+            raise RuntimeError(
+                f"Failed to load model weights from '{self.model_dir}'.\n"
+                f"Ensure model files (pytorch_model.bin or model.safetensors and config.json) exist in that folder.\n"
+                f"Original error: {e}"
+            ) from e
+
+    def _load_onnx_session(self, quantized: bool):
+        """
+        Build an ONNX Runtime session, exporting (and quantizing) the PyTorch weights
+        into <model_dir>/onnx/ on first use. Later loads reuse the exported files and
+        never materialize the PyTorch model.
+        """
+        try:
+            import onnxruntime as ort
+        except ImportError as e:
+            raise RuntimeError(
+                f"Backend '{self.backend}' requires onnxruntime (pip install onnxruntime).\n"
+                f"Original error: {e}"
+            ) from e
+
+        onnx_dir = self.model_dir / ONNX_SUBDIR
+        fp32_path = onnx_dir / "model.onnx"
+        meta_path = onnx_dir / ONNX_META_FILENAME
+        fingerprint = weights_fingerprint(self.model_dir)
+        if fp32_path.exists() and _read_onnx_meta(meta_path).get("weights") != fingerprint:
+            # exported from other weights (e.g. before a retrain): drop it and the int8 copy
+            print(f"[model] {onnx_dir} was exported from different weights; re-exporting")
+            for stale in onnx_dir.glob("model*.onnx*"):
+                stale.unlink()
+        if not fp32_path.exists():
+            onnx_dir.mkdir(parents=True, exist_ok=True)
+            export_onnx(self._load_torch_model(), self.tokenizer, fp32_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"weights": fingerprint, "opset": ONNX_OPSET}, f, indent=2)
+            print(f"[model] Exported ONNX model to {fp32_path}")
+
+        path = fp32_path
+        if quantized:
+            path = onnx_dir / "model.int8.onnx"
+            if not path.exists():
+                from onnxruntime.quantization import QuantType, quantize_dynamic
+                quantize_dynamic(str(fp32_path), str(path), weight_type=QuantType.QInt8)
+                print(f"[model] Wrote int8-quantized ONNX model to {path}")
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = int(os.environ.get("PHQ9_ORT_THREADS", torch.get_num_threads()))
+        return ort.InferenceSession(str(path), sess_options=opts, providers=["CPUExecutionProvider"])
 
     def _build_fallback_label_map(self) -> Dict[int, str]:
-        n = getattr(self.model.config, "num_labels", None)
-        if n is None:
+        n = getattr(self.config, "num_labels", None)
+        if n is None and self.model is not None:
             # guess from weights
             try:
                 n = int(self.model.classifier.out_features)
@@ -81,9 +214,12 @@ class PHQ9ModelWrapper:
                 n = 2
         return {i: f"label_{i}" for i in range(n)}
 
-    def predict_raw(self, texts: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
+    def predict_raw(self, texts: List[str], top_k: int = 3, max_batch_tokens: int = None) -> List[Dict[str, Any]]:
         """
         Run inference on a list of texts (batch).
+        Inputs are sorted by token length and run in buckets of at most
+        `max_batch_tokens` padded tokens (defaults to self.max_batch_tokens), so a
+        single long answer no longer pads every row; results keep the input order.
         Returns a list of dicts, one per input:
           {
             "logits": np.ndarray (num_labels,),
@@ -98,41 +234,109 @@ class PHQ9ModelWrapper:
         if not isinstance(texts, (list, tuple)):
             raise ValueError("texts must be a string or list/tuple of strings")
 
-        enc = self.tokenizer(
-            list(texts),
-            truncation=True,
-            padding=True,
-            max_length=self.max_len,
-            return_tensors="pt"
-        )
+        if not texts:
+            return []
+        budget = self.max_batch_tokens if max_batch_tokens is None else int(max_batch_tokens)
+
+        # tokenize unpadded, then pad each length bucket only to its own longest row
+        with timed("tokenize"):
+            enc = self.tokenizer(
+                list(texts),
+                truncation=True,
+                padding=False,
+                max_length=self.max_len,
+            )
+        ids = enc["input_ids"]
 
-        input_ids = enc["input_ids"].to(self.device)
-        attention_mask = enc["attention_mask"].to(self.device)
+        logits = np.empty((len(texts), self.num_labels), dtype=np.float32)
+        with timed("forward"):
+            for bucket in self._length_buckets(ids, budget):
+                input_ids, attention_mask = self._pad([ids[i] for i in bucket])
+                logits[bucket] = self._forward_logits(input_ids, attention_mask)  # [b, num_labels]
+
+        with timed("softmax_topk"):
+            probs = softmax(logits)
+            return [build_prediction(logits[i], probs[i], self.label_map, top_k) for i in range(len(texts))]
+
+    @staticmethod
+    def _length_buckets(ids: List[List[int]], budget: int) -> List[List[int]]:
+        """Group row indices, sorted by length, so that rows x longest row <= budget (0 = one bucket)."""
+        order = sorted(range(len(ids)), key=lambda i: len(ids[i]))
+        if budget <= 0:
+            return [order]
+        buckets, current = [], []
+        for i in order:
+            # order is ascending, so row i sets the padded length of the bucket
+            if current and (len(current) + 1) * len(ids[i]) > budget:
+                buckets.append(current)
+                current = []
+            current.append(i)
+        if current:
+            buckets.append(current)
+        return buckets
+
+    def _pad(self, rows: List[List[int]]) -> Tuple[np.ndarray, np.ndarray]:
+        width = max(len(r) for r in rows)
+        input_ids = np.full((len(rows), width), self.tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(rows), width), dtype=np.int64)
+        for j, r in enumerate(rows):
+            input_ids[j, :len(r)] = r
+            attention_mask[j, :len(r)] = 1
+        return input_ids, attention_mask
+
+    def _forward_logits(self, input_ids: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+        """Backend-specific forward pass. Inputs are int arrays [B, L]; returns float32 logits [B, num_labels]."""
+        if self.ort_session is not None:
+            (logits,) = self.ort_session.run(
+                ["logits"],
+                {"input_ids": input_ids.astype(np.int64), "attention_mask": attention_mask.astype(np.int64)},
+            )
+            return logits.astype(np.float32, copy=False)
+
+        if self.early_exit is not None:
+            logits, _ = self.early_exit.forward_logits(
+                torch.from_numpy(input_ids).to(self.device), torch.from_numpy(attention_mask).to(self.device)
+            )
+            return logits.numpy()
 
         with torch.no_grad():
-            outputs = self.model(input_ids=input_ids, attention_mask=attention_mask)
-            logits_t = outputs.logits  # torch tensor [B, num_labels]
-            probs_t = torch.softmax(logits_t, dim=-1)
-
-        logits = logits_t.cpu().numpy()
-        probs = probs_t.cpu().numpy()
-
-        results = []
-        for i in range(len(texts)):
-            p = probs[i]
-            pred_idx = int(np.argmax(p))
-            pred_label = self.label_map.get(pred_idx, str(pred_idx))
-            # top-k
-            topk_idx = list(np.argsort(p)[-top_k:][::-1])
-            topk = [(int(ii), float(p[ii]), self.label_map.get(ii, str(ii))) for ii in topk_idx]
-            results.append({
-                "logits": logits[i],
-                "probs": p,
-                "pred_idx": pred_idx,
-                "pred_label": pred_label,
-                "topk": topk
-            })
-        return results
+            outputs = self.model(
+                input_ids=torch.from_numpy(input_ids).to(self.device),
+                attention_mask=torch.from_numpy(attention_mask).to(self.device),
+            )
+        return outputs.logits.float().cpu().numpy()
+
+
+# ----------------------
+# ONNX export
+# ----------------------
+def _read_onnx_meta(meta_path: Path) -> Dict[str, Any]:
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def export_onnx(model: AlbertForSequenceClassification, tokenizer, out_path: Path, opset: int = ONNX_OPSET):
+    """Export `model` to ONNX with dynamic batch and sequence axes (inputs: input_ids, attention_mask)."""
+    model = model.cpu().eval()
+    sample = tokenizer(["Not at all ||| Several days"], return_tensors="pt")
+    with torch.no_grad():
+        torch.onnx.export(
+            _LogitsOnly(model),
+            (sample["input_ids"], sample["attention_mask"]),
+            str(out_path),
+            input_names=["input_ids", "attention_mask"],
+            output_names=["logits"],
+            dynamic_axes={
+                "input_ids": {0: "batch", 1: "sequence"},
+                "attention_mask": {0: "batch", 1: "sequence"},
+                "logits": {0: "batch"},
+            },
+            opset_version=opset,
+            dynamo=False,
+        )
 
 
 # ----------------------
@@ -0,0 +1,74 @@
+# src/parity.py
+"""
+Parity check for the alternative inference backends.
+
+Scores every row of Updated_PHQ9_Student_Dataset.csv with the float32 PyTorch
+reference and with the candidate backend, then reports probability drift,
+argmax agreement and per-row latency. Exits non-zero if the drift exceeds --atol
+or agreement falls below --min-agreement.
+
+Usage (from inside src/):
+  python parity.py --backend onnx-int8
+"""
+import argparse
+import sys
+import time
+from typing import List
+
+import numpy as np
+import torch
+
+from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+from infer import DELIMITER
+from model import BACKENDS, DEFAULT_MODEL_DIR, PHQ9ModelWrapper
+
+
+def _score(wrapper: PHQ9ModelWrapper, texts: List[str], batch_size: int):
+    probs, elapsed = [], 0.0
+    for i in range(0, len(texts), batch_size):
+        chunk = texts[i:i + batch_size]
+        t0 = time.perf_counter()
+        out = wrapper.predict_raw(chunk, top_k=1)
+        elapsed += time.perf_counter() - t0
+        probs.extend(o["probs"] for o in out)
+    return np.stack(probs), elapsed
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compare a PHQ9ModelWrapper backend against the fp32 torch reference.")
+    parser.add_argument("--backend", choices=[b for b in BACKENDS if b != "torch"], required=True)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--atol", type=float, default=0.05, help="max allowed absolute probability difference")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="min fraction of rows with the same argmax")
+    args = parser.parse_args(argv)
+
+    texts = [DELIMITER.join(answers) for answers, _ in iter_csv_answers(args.csv)]
+    print(f"[parity] {len(texts)} rows from {args.csv}")
+
+    reference = PHQ9ModelWrapper(args.model_dir, device=torch.device("cpu"), backend="torch")
+    ref_probs, ref_time = _score(reference, texts, args.batch_size)
+    del reference
+
+    candidate = PHQ9ModelWrapper(args.model_dir, backend=args.backend)
+    cand_probs, cand_time = _score(candidate, texts, args.batch_size)
+
+    diff = np.abs(ref_probs - cand_probs)
+    agreement = float(np.mean(ref_probs.argmax(axis=1) == cand_probs.argmax(axis=1)))
+    n = len(texts)
+
+    print(f"[parity] backend={args.backend}")
+    print(f"  {'max |dp|':22s}: {diff.max():.6f}")
+    print(f"  {'mean |dp|':22s}: {diff.mean():.6f}")
+    print(f"  {'argmax agreement':22s}: {agreement:.4f}")
+    print(f"  {'torch ms/row':22s}: {ref_time / n * 1000:.3f}")
+    print(f"  {args.backend + ' ms/row':22s}: {cand_time / n * 1000:.3f}")
+
+    ok = diff.max() <= args.atol and agreement >= args.min_agreement
+    print("[parity] PASS" if ok else "[parity] FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
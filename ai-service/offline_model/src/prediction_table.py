@@ -0,0 +1,222 @@
+# src/prediction_table.py
+"""
+Precomputed prediction table for canonical PHQ-9 answer combinations.
+
+Nearly every real input uses the four canonical phrases from the training CSV,
+so there are only 4**9 = 262,144 distinct concatenated texts. The offline build
+step scores all of them once and stores their logits in a memory-mapped .npy
+file ([4**9, num_labels] float32, ~5 MB); lookups are then a base-4 index into it.
+
+The table is only served to the scorer that built it (backend, encoding and
+early-exit threshold, see scorer_key): by default the fp32 torch concat model.
+
+Build (from inside src/, takes a while on CPU):
+  python prediction_table.py --build
+  python prediction_table.py --build --backend onnx-int8
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# ----------------------
+# CONFIG
+# ----------------------
+CANONICAL_PHRASES = ("Not at all", "Several days", "More than half the days", "Nearly every day")
+NUM_ITEMS = 9
+TABLE_ROWS = len(CANONICAL_PHRASES) ** NUM_ITEMS
+TABLE_FILENAME = "prediction_table.npy"
+META_FILENAME = "prediction_table.json"
+WEIGHT_FILES = ("model.safetensors", "pytorch_model.bin")
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold and collapse whitespace. The ALBERT tokenizer lowercases and
+    collapses spaces itself, so this never changes what the model sees."""
+    if not text:
+        return ""
+    return _WS_RE.sub(" ", str(text)).strip().casefold()
+
+
+_PHRASE_TO_CODE = {normalize_text(p): i for i, p in enumerate(CANONICAL_PHRASES)}
+
+
+def canonical_code(answer: str) -> Optional[int]:
+    """
+    0..3 if `answer` is one of the canonical phrases (ignoring case and spacing, the same
+    normalization as the answer-cache key), else None. Punctuation is not stripped: the
+    model sees "Several days." as different text, so it must not be answered from the table.
+    """
+    return _PHRASE_TO_CODE.get(normalize_text(answer))
+
+
+def canonical_index(answers: Sequence[str]) -> Optional[int]:
+    """Row index into the table for 9 canonical answers (Q1 is the most significant digit), else None."""
+    if len(answers) != NUM_ITEMS:
+        return None
+    idx = 0
+    for a in answers:
+        code = canonical_code(a)
+        if code is None:
+            return None
+        idx = idx * len(CANONICAL_PHRASES) + code
+    return idx
+
+
+def canonical_answers(index: int) -> List[str]:
+    """Inverse of canonical_index."""
+    base = len(CANONICAL_PHRASES)
+    codes = []
+    for _ in range(NUM_ITEMS):
+        index, code = divmod(index, base)
+        codes.append(code)
+    return [CANONICAL_PHRASES[c] for c in reversed(codes)]
+
+
+def scorer_key(backend: str = "torch", encoding: str = "concat", early_exit_entropy: Optional[float] = None) -> Dict:
+    """What produced a table's logits; a table is only served to the same scorer."""
+    return {"backend": backend, "encoding": encoding, "early_exit_entropy": early_exit_entropy}
+
+
+def weights_fingerprint(model_dir: Path) -> Optional[Dict[str, float]]:
+    """Size + mtime of the weight file, used to detect a table built from different weights."""
+    for name in WEIGHT_FILES:
+        p = Path(model_dir) / name
+        if p.exists():
+            st = p.stat()
+            return {"file": name, "size": st.st_size, "mtime": int(st.st_mtime)}
+    return None
+
+
+# ----------------------
+# Lookup
+# ----------------------
+class PredictionTable:
+    def __init__(self, table_path: Path, meta: Dict):
+        self.table_path = Path(table_path)
+        self.logits = np.load(str(self.table_path), mmap_mode="r")
+        self.label_map = {int(k): v for k, v in meta["label_map"].items()}
+        if self.logits.shape != (TABLE_ROWS, int(meta["num_labels"])):
+            raise ValueError(f"Unexpected prediction table shape {self.logits.shape} in {self.table_path}")
+
+    @classmethod
+    def load(cls, model_dir: Path, table_path: Optional[Path] = None,
+             scorer: Optional[Dict] = None) -> Optional["PredictionTable"]:
+        """
+        Open the table next to the model (or at table_path). Returns None when it
+        does not exist, was built from different weights than those in model_dir,
+        or (if `scorer` is given, see scorer_key) by a different backend / encoding.
+        """
+        model_dir = Path(model_dir).resolve()
+        table_path = Path(table_path) if table_path else model_dir / TABLE_FILENAME
+        meta_path = table_path.with_name(META_FILENAME)
+        if not table_path.exists() or not meta_path.exists():
+            return None
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("weights") != weights_fingerprint(model_dir):
+            print(f"[table] Ignoring {table_path}: built from different model weights. Rebuild with --build.")
+            return None
+        built_by = meta.get("scorer") or scorer_key(meta.get("backend", "torch"))
+        if scorer is not None and built_by != scorer:
+            print(f"[table] Ignoring {table_path}: built by {built_by}, serving with {scorer}. "
+                  f"Rebuild with --build --backend/--encoding to match.")
+            return None
+        table = cls(table_path, meta)
+        print(f"[table] Loaded prediction table from {table_path}")
+        return table
+
+    def lookup(self, answers: Sequence[str]) -> Optional[np.ndarray]:
+        """Logits row for 9 canonical answers, or None if any answer is free text."""
+        idx = canonical_index(answers)
+        if idx is None:
+            return None
+        return np.array(self.logits[idx], dtype=np.float32)
+
+
+# ----------------------
+# Offline build
+# ----------------------
+def build_table(wrapper, table_path: Path, batch_size: int = 256, delimiter: str = " ||| ", encoder=None):
+    """
+    Score every canonical combination with `wrapper` (or, for the hierarchical encoding,
+    with `encoder`, a hierarchical.HierarchicalEncoder) and write the table + meta file.
+    """
+    table_path = Path(table_path)
+    tmp_path = table_path.with_name(table_path.stem + ".partial.npy")
+    num_labels = len(wrapper.label_map)
+    out = np.lib.format.open_memmap(str(tmp_path), mode="w+", dtype=np.float32, shape=(TABLE_ROWS, num_labels))
+
+    started = time.perf_counter()
+    for start in range(0, TABLE_ROWS, batch_size):
+        stop = min(start + batch_size, TABLE_ROWS)
+        answer_sets = [canonical_answers(i) for i in range(start, stop)]
+        if encoder is not None:
+            results = encoder.predict_raw(answer_sets, top_k=1)
+        else:
+            results = wrapper.predict_raw([delimiter.join(a) for a in answer_sets], top_k=1)
+        out[start:stop] = np.stack([r["logits"] for r in results])
+        if (start // batch_size) % 50 == 0:
+            rate = stop / max(time.perf_counter() - started, 1e-9)
+            print(f"[table] {stop}/{TABLE_ROWS} rows ({rate:.0f} rows/s)")
+    out.flush()
+    del out
+    os.replace(tmp_path, table_path)
+
+    meta = {
+        "num_labels": num_labels,
+        "label_map": {str(k): v for k, v in wrapper.label_map.items()},
+        "phrases": list(CANONICAL_PHRASES),
+        "delimiter": delimiter,
+        "backend": getattr(wrapper, "backend", "torch"),
+        "scorer": scorer_key(getattr(wrapper, "backend", "torch"), "hierarchical" if encoder is not None else "concat",
+                             wrapper.early_exit.entropy_threshold if getattr(wrapper, "early_exit", None) else None),
+        "weights": weights_fingerprint(wrapper.model_dir),
+        "created": datetime.now(timezone.utc).isoformat(),
+    }
+    with open(table_path.with_name(META_FILENAME), "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    print(f"[table] Wrote {TABLE_ROWS} rows to {table_path} in {time.perf_counter() - started:.1f}s")
+
+
+def main(argv=None) -> int:
+    from infer import DELIMITER
+    from model import BACKENDS, DEFAULT_MODEL_DIR, PHQ9ModelWrapper
+
+    parser = argparse.ArgumentParser(description="Precompute the canonical-answer prediction table.")
+    parser.add_argument("--build", action="store_true", required=True)
+    parser.add_argument("--model-dir", default=DEFAULT_MODEL_DIR)
+    parser.add_argument("--out", default=None, help=f"table path (default: <model-dir>/{TABLE_FILENAME})")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--backend", default="torch", choices=BACKENDS,
+                        help="score with the backend that will serve (the table is only used with it)")
+    parser.add_argument("--encoding", default="concat", choices=["concat", "hierarchical"])
+    parser.add_argument("--early-exit-entropy", type=float, default=None)
+    args = parser.parse_args(argv)
+
+    wrapper = PHQ9ModelWrapper(args.model_dir, backend=args.backend, early_exit_entropy=args.early_exit_entropy)
+    encoder = None
+    if args.encoding == "hierarchical":
+        from hierarchical import HierarchicalEncoder, load_hier_head
+        head = load_hier_head(wrapper.model_dir, wrapper.model) if wrapper.model is not None else None
+        if head is None:
+            print("[table] The hierarchical encoding needs a torch backend and a trained head "
+                  "(`python hierarchical.py --train`).")
+            return 1
+        encoder = HierarchicalEncoder(wrapper, head)
+    build_table(wrapper, Path(args.out) if args.out else wrapper.model_dir / TABLE_FILENAME,
+                batch_size=args.batch_size, delimiter=DELIMITER, encoder=encoder)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
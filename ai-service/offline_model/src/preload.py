@@ -0,0 +1,110 @@
+# src/preload.py
+"""
+Preload mode for multi-worker deployments (gunicorn + UvicornWorker).
+
+The model is loaded ONCE in the gunicorn master (preload_app = True), its weights
+are moved to shared memory and the heap is frozen, then workers are forked.
+Every worker maps the same weight pages instead of loading its own copy, and
+the post_fork hook sizes the intra-op thread pool and warms the worker up
+before it accepts requests. See ../gunicorn.conf.py.
+
+Only the torch / torch-int8 backends share weights; ONNX Runtime sessions are
+rebuilt per worker after the fork (their thread pools do not survive it).
+"""
+import gc
+import os
+import threading
+import time
+
+import torch
+
+import infer
+
+# number of workers the preloaded model will be forked into (set by gunicorn.conf.py)
+WORKERS_ENV = "PHQ9_WORKERS"
+THREADS_ENV = "PHQ9_THREADS_PER_WORKER"
+
+_preloaded = False
+
+
+def preload_model():
+    """
+    Load the wrapper (and the prediction table) in the current - master - process
+    and make the weights shareable. No forward pass is run here: the OpenMP pool
+    used by torch is not fork-safe once it has been started.
+    """
+    global _preloaded
+    if _preloaded:
+        return infer._get_wrapper()
+
+    started = time.perf_counter()
+    wrapper = infer._get_wrapper()
+    infer._get_table()
+    infer._get_hierarchical()
+
+    if wrapper.model is not None:
+        try:
+            wrapper.model.share_memory()
+        except Exception as e:
+            # quantized packed params cannot always be moved; fork COW still shares the pages
+            print(f"[preload] share_memory() not supported for backend={wrapper.backend}: {e}")
+
+    # keep the refcount/GC bookkeeping of the preloaded objects from dirtying shared pages
+    gc.collect()
+    gc.freeze()
+
+    _preloaded = True
+    print(f"[preload] Model preloaded in pid {os.getpid()} in {time.perf_counter() - started:.2f}s")
+    return wrapper
+
+
+def threads_per_worker(workers: int = None) -> int:
+    if os.environ.get(THREADS_ENV):
+        return max(1, int(os.environ[THREADS_ENV]))
+    workers = workers or int(os.environ.get(WORKERS_ENV, 1))
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def configure_worker_threads(workers: int = None) -> int:
+    """Split the cores between workers so N workers x intra-op threads does not oversubscribe."""
+    n = threads_per_worker(workers)
+    torch.set_num_threads(n)
+    wrapper = infer._model_wrapper
+    if wrapper is not None and wrapper.ort_session is not None:
+        os.environ["PHQ9_ORT_THREADS"] = str(n)
+        wrapper.ort_session = wrapper._load_onnx_session(quantized=(wrapper.backend == "onnx-int8"))
+    print(f"[preload] pid {os.getpid()}: intra-op threads = {n}")
+    return n
+
+
+def warmup():
+    """One forward pass so the first user request does not pay for lazy kernel / allocator setup."""
+    started = time.perf_counter()
+    infer._get_wrapper().predict_raw([infer.DELIMITER.join(["Not at all"] * 9)], top_k=1)
+    hier = infer._get_hierarchical()
+    if hier is not None:
+        hier.warm()
+    print(f"[preload] pid {os.getpid()}: warm-up done in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def _reinit_in_child():
+    # Locks and threads held by the master are not usable in a forked child.
+    infer._wrapper_lock = threading.Lock()
+    infer._table_lock = threading.Lock()
+    infer._stats_lock = threading.Lock()
+    infer._shadow_executor = None   # its thread did not survive the fork
+    infer._shadow_pending = 0
+    if isinstance(infer._model_wrapper, infer.InferencePool):
+        # its pipes belong to the parent; this process starts its own pool on first use
+        infer._model_wrapper = None
+    infer._answer_cache = infer.LRUCache(infer.ANSWER_CACHE_SIZE)
+    if infer._hierarchical:
+        infer._hierarchical.cache = infer.LRUCache(infer._hierarchical.cache.maxsize)
+        infer._hierarchical._stats_lock = threading.Lock()
+    if infer._batcher is not None:
+        limits = infer._batcher
+        infer._batcher = None
+        infer.enable_batching(limits.max_batch_size, limits.max_wait_s * 1000.0)
+
+
+os.register_at_fork(after_in_child=_reinit_in_child)
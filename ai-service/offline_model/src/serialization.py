@@ -0,0 +1,60 @@
+# src/serialization.py
+"""
+Response shaping + fast JSON serialization for /api/predict.
+
+predict_from_answers returns everything (probs, topk, echoed concat_text and the
+wrapper's raw_model_output, which repeats logits/probs as NumPy arrays).
+shape_result() picks only the requested fields, and dumps() serializes NumPy
+values directly - with orjson when it is installed, otherwise with the stdlib
+encoder and a `default` hook - instead of walking the result recursively.
+"""
+import json
+from typing import Any, Dict, Iterable, Optional
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+ALL_FIELDS = ("label_idx", "label", "probs", "topk", "q9_suicidal_flag", "source", "concat_text", "raw_model_output")
+# what a client needs to render a result; drops the echoed input and the duplicated raw output
+COMPACT_FIELDS = ("label_idx", "label", "probs", "topk", "q9_suicidal_flag", "source")
+
+
+def parse_fields(fields) -> Optional[tuple]:
+    """Accept a list or a comma-separated string; returns None for 'all fields'. Raises ValueError on unknown names."""
+    if fields is None or fields == "" or fields == []:
+        return None
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(",") if f.strip()]
+    if not isinstance(fields, (list, tuple)):
+        raise ValueError("fields must be a list or a comma-separated string")
+    unknown = [f for f in fields if f not in ALL_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(map(str, unknown))}. Allowed: {', '.join(ALL_FIELDS)}")
+    return tuple(fields)
+
+
+def shape_result(result: Dict[str, Any], fields: Optional[Iterable[str]] = None, compact: bool = False) -> Dict[str, Any]:
+    """Select the response fields. Explicit `fields` win over `compact`; neither means all fields."""
+    if fields is None:
+        fields = COMPACT_FIELDS if compact else ALL_FIELDS
+    return {k: result[k] for k in fields if k in result}
+
+
+def _default(obj):
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(payload: Any) -> bytes:
+    """Serialize a payload that may contain NumPy arrays/scalars, without pre-converting it."""
+    if orjson is not None:
+        # orjson hands what it cannot take natively (non-contiguous arrays, float16) to _default
+        return orjson.dumps(payload, default=_default, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=_default, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
@@ -0,0 +1,262 @@
+# src/session_log.py
+"""
+Buffered, process-safe session logging for the PHQ-9 CLIs and services.
+
+log() only puts the record on an in-memory queue (and drops it if the queue is
+full), so logging never adds latency to a prediction. A background thread
+batches records and writes them out:
+
+  csv      one append per flush under an exclusive flock, header written only
+           into an empty file, rotated to <name>.<timestamp>.csv past a size limit
+  parquet  (needs pyarrow) every flush writes a new part file
+           <name>/part-<time>-<pid>-<seq>.parquet with session_schema(), so
+           processes never share a file; read the directory as one dataset:
+             pyarrow.dataset.dataset("logs/phq9_chatbot_sessions").to_table()
+
+Pending records are flushed at interpreter exit; flush() waits for them earlier
+(e.g. before telling a user their session was saved).
+"""
+import atexit
+import csv
+import io
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are not locked
+    fcntl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency, only needed for format="parquet"
+    pa = pq = None
+
+# ----------------------
+# CONFIG
+# ----------------------
+LOG_DIR = os.path.join(os.path.dirname(__file__), "..", "logs")
+DEFAULT_FORMAT = os.environ.get("PHQ9_SESSION_LOG_FORMAT", "csv")
+FORMATS = ("csv", "parquet")
+DEFAULT_FLUSH_INTERVAL_S = float(os.environ.get("PHQ9_SESSION_LOG_FLUSH_S", 2.0))
+DEFAULT_MAX_BUFFER_ROWS = 512          # flush early once this many records are waiting
+DEFAULT_QUEUE_SIZE = 10000             # records beyond this are dropped, never blocked on
+DEFAULT_ROTATE_BYTES = int(float(os.environ.get("PHQ9_SESSION_LOG_ROTATE_MB", 64)) * 1024 * 1024)
+
+CSV_HEADER = ["timestamp", "age", "gender"] + [f"Q{i}" for i in range(1, 10)] + ["pred_label", "pred_idx", "probs", "q9_flag"]
+
+
+def session_schema():
+    return pa.schema([
+        ("timestamp", pa.timestamp("us", tz="UTC")),
+        ("age", pa.string()),
+        ("gender", pa.string()),
+        ("answers", pa.list_(pa.string())),
+        ("pred_label", pa.string()),
+        ("pred_idx", pa.int8()),
+        ("probs", pa.list_(pa.float32())),
+        ("q9_flag", pa.bool_()),
+        ("source", pa.string()),
+    ])
+
+
+def make_record(result: Dict[str, Any], answers: Sequence[str], age: str = "", gender: str = "") -> Dict[str, Any]:
+    """Session record from a predict_from_answers() result."""
+    return {
+        "timestamp": datetime.now(timezone.utc),
+        "age": age,
+        "gender": gender,
+        "answers": list(answers),
+        "pred_label": result["label"],
+        "pred_idx": int(result["label_idx"]),
+        "probs": [float(p) for p in result["probs"]],
+        "q9_flag": bool(result["q9_suicidal_flag"]),
+        "source": result.get("source"),
+    }
+
+
+class _FlushRequest:
+    """Queue marker: the writer flushes what it has buffered, then sets `done`."""
+    __slots__ = ("done", "ok")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.ok = False
+
+
+class SessionLogger:
+    def __init__(self, name: str, fmt: str = DEFAULT_FORMAT, log_dir: str = LOG_DIR,
+                 flush_interval_s: float = DEFAULT_FLUSH_INTERVAL_S, max_buffer_rows: int = DEFAULT_MAX_BUFFER_ROWS,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, rotate_bytes: int = DEFAULT_ROTATE_BYTES):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown session log format '{fmt}'. Choose one of: {', '.join(FORMATS)}")
+        if fmt == "parquet" and pa is None:
+            raise ImportError("Session log format 'parquet' requires pyarrow (pip install pyarrow).")
+        self.name = name
+        self.fmt = fmt
+        self.log_dir = Path(log_dir).resolve()
+        self.path = self.log_dir / (f"{name}.csv" if fmt == "csv" else name)
+        self.flush_interval_s = flush_interval_s
+        self.max_buffer_rows = max_buffer_rows
+        self.rotate_bytes = rotate_bytes
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=queue_size)
+        self._seq = 0
+        self._stats = {"logged": 0, "written": 0, "dropped": 0, "flushes": 0, "errors": 0}
+        self._stats_lock = threading.Lock()   # updated by request threads and the writer thread
+        self._last_write_ok = True
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name=f"session-log-{name}", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    # ----------------------
+    # producer side (hot path)
+    # ----------------------
+    def log(self, record: Dict[str, Any]) -> bool:
+        """Queue one record; returns False (and counts a drop) instead of blocking when the queue is full."""
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._stats_lock:
+                self._stats["dropped"] += 1
+            return False
+        with self._stats_lock:
+            self._stats["logged"] += 1
+        return True
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Wait until everything queued so far is written. Returns True once it is on disk,
+        False if the last write failed, the logger is closed or `timeout` passed.
+        """
+        if self._closed:
+            return False
+        request = _FlushRequest()
+        try:
+            self._queue.put(request, timeout=timeout)
+        except queue.Full:
+            return False
+        return request.done.wait(timeout) and request.ok
+
+    def close(self, timeout: float = 10.0):
+        """Flush everything queued so far and stop the writer thread."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            counts = dict(self._stats)
+        return {**counts, "queued": self._queue.qsize(), "format": self.fmt, "path": str(self.path)}
+
+    # ----------------------
+    # writer thread
+    # ----------------------
+    def _loop(self):
+        buffer: List[dict] = []
+        deadline = time.monotonic() + self.flush_interval_s
+        while True:
+            try:
+                record = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = False  # timer tick
+            stop = record is None
+            flush_request = record if isinstance(record, _FlushRequest) else None
+            if isinstance(record, dict):
+                buffer.append(record)
+            if buffer and (stop or flush_request or len(buffer) >= self.max_buffer_rows
+                           or time.monotonic() >= deadline):
+                self._flush(buffer)
+                buffer = []
+            if flush_request is not None:
+                flush_request.ok = self._last_write_ok
+                flush_request.done.set()
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval_s
+            if stop:
+                return
+
+    def _flush(self, records: List[dict]):
+        try:
+            self.log_dir.mkdir(parents=True, exist_ok=True)
+            if self.fmt == "csv":
+                self._write_csv(records)
+            else:
+                self._write_parquet(records)
+            ok = True
+        except Exception as e:
+            ok = False
+            print(f"[session-log] Failed to write {len(records)} record(s) to {self.path}: {e}")
+        self._last_write_ok = ok
+        with self._stats_lock:
+            if ok:
+                self._stats["written"] += len(records)
+                self._stats["flushes"] += 1
+            else:
+                self._stats["errors"] += 1
+
+    def _write_csv(self, records: List[dict]):
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        for r in records:
+            writer.writerow([r["timestamp"].isoformat(), r["age"], r["gender"]] + list(r["answers"])
+                            + [r["pred_label"], r["pred_idx"], json.dumps(r["probs"]), r["q9_flag"]])
+        rows = buf.getvalue()
+
+        while True:
+            with open(self.path, "a", newline="", encoding="utf-8") as f:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    if not self._is_current_file(f):
+                        continue  # another process rotated the file between our open() and the lock
+                    if os.fstat(f.fileno()).st_size == 0:
+                        rows = ",".join(CSV_HEADER) + "\r\n" + rows
+                    f.write(rows)
+                    f.flush()
+                    if os.fstat(f.fileno()).st_size >= self.rotate_bytes:
+                        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+                        os.replace(self.path, self.path.with_name(f"{self.name}.{stamp}.csv"))
+                    return
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def _is_current_file(self, f) -> bool:
+        try:
+            return os.fstat(f.fileno()).st_ino == os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return False
+
+    def _write_parquet(self, records: List[dict]):
+        self.path.mkdir(parents=True, exist_ok=True)
+        schema = session_schema()
+        table = pa.Table.from_pylist([{k: r.get(k) for k in schema.names} for r in records], schema=schema)
+        self._seq += 1
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        final = self.path / f"part-{stamp}-{os.getpid()}-{self._seq:05d}.parquet"
+        tmp = final.with_suffix(".parquet.tmp")
+        pq.write_table(table, str(tmp), compression="zstd")
+        os.replace(tmp, final)  # readers never see a half-written part
+
+
+_loggers: Dict[str, SessionLogger] = {}
+_loggers_lock = threading.Lock()
+
+
+def get_session_logger(name: str, fmt: str = DEFAULT_FORMAT) -> SessionLogger:
+    """Shared logger per (name, format) so every caller in the process feeds one writer thread."""
+    with _loggers_lock:
+        key = f"{name}:{fmt}"
+        if key not in _loggers:
+            _loggers[key] = SessionLogger(name, fmt=fmt)
+        return _loggers[key]
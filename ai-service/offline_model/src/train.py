@@ -0,0 +1,375 @@
+# src/train.py
+"""
+Scripted, CPU-friendly training pipeline for the PHQ-9 ALBERT classifier
+(replaces the manual notebook run). Steps, each usable on its own:
+
+  prepare   stream Updated_PHQ9_Student_Dataset.csv into data/train.jsonl + data/val.jsonl
+            ({"text": "<Q1> ||| ... ||| <Q9>", "label": int, "label_name": str})
+  tokenize  pre-tokenize the JSONL files into a memory-mapped token cache that later runs
+            reuse as long as the data, tokenizer and max_len are unchanged
+  train     fine-tune with multi-worker data loading, dynamic padding, gradient accumulation
+            and resumable checkpoints (--resume)
+  export    write the exact models/phq9_albert_concat layout (config, weights, tokenizer, label_map.pkl)
+            into <run-dir>/export; pass --out-dir ../models/phq9_albert_concat to replace the shipped model
+  all       all of the above
+
+Usage (from inside src/):
+  python train.py all --init albert-base-v2 --epochs 4
+  python train.py train --resume          # continue an interrupted run
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from dataset import DEFAULT_CSV_PATH, iter_csv_answers
+from infer import DELIMITER
+from model import DEFAULT_MAX_LEN, DEFAULT_MODEL_DIR
+
+# ----------------------
+# CONFIG
+# ----------------------
+SRC_DIR = Path(__file__).resolve().parent
+DATA_DIR = SRC_DIR.parent / "data"
+CACHE_DIR = DATA_DIR / "token_cache"
+RUN_DIR = SRC_DIR.parent / "runs" / "phq9_albert_concat"
+
+# same index -> name mapping as the shipped label_map.pkl (alphabetical, as LabelEncoder produced it)
+LABEL_NAMES = ["Mild", "Minimal", "Moderate", "Moderately Severe", "Severe"]
+LABEL_MAP: Dict[int, str] = dict(enumerate(LABEL_NAMES))
+TOKENIZER_FILES = ("spiece.model", "tokenizer.json", "tokenizer_config.json", "special_tokens_map.json")
+
+
+# ----------------------
+# prepare: CSV -> JSONL
+# ----------------------
+def prepare(csv_path: str = DEFAULT_CSV_PATH, out_dir: Path = DATA_DIR, val_fraction: float = 0.1, seed: int = 42) -> Dict[str, int]:
+    """Stream the CSV row by row into train/val JSONL with a seeded split (no full load into memory)."""
+    name_to_idx = {v: k for k, v in LABEL_MAP.items()}
+    rng = random.Random(seed)
+    counts = {"train": 0, "val": 0, "skipped": 0}
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / "train.jsonl", "w", encoding="utf-8") as ftrain, \
+            open(out_dir / "val.jsonl", "w", encoding="utf-8") as fval:
+        for answers, level in iter_csv_answers(csv_path):
+            if level not in name_to_idx:
+                counts["skipped"] += 1
+                continue
+            split = "val" if rng.random() < val_fraction else "train"
+            record = {"text": DELIMITER.join(answers), "label": name_to_idx[level], "label_name": level}
+            (fval if split == "val" else ftrain).write(json.dumps(record, ensure_ascii=False) + "\n")
+            counts[split] += 1
+    print(f"[prepare] wrote {counts['train']} train / {counts['val']} val rows to {out_dir} (skipped {counts['skipped']})")
+    return counts
+
+
+# ----------------------
+# tokenize: JSONL -> memory-mapped token cache
+# ----------------------
+def _file_digest(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def tokenize_split(tokenizer, jsonl_path: Path, cache_dir: Path, split: str, max_len: int, tokenizer_digest: str,
+                   chunk_size: int = 1024) -> Path:
+    """
+    Tokenize `jsonl_path` into <cache_dir>/<split>.ids.npy (int32 [N, max_len], zero padded),
+    <split>.lengths.npy and <split>.labels.npy. Skipped when the cache matches the inputs.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    meta_path = cache_dir / f"{split}.meta.json"
+    meta = {"source": _file_digest(jsonl_path), "tokenizer": tokenizer_digest, "max_len": max_len}
+    if meta_path.exists() and json.loads(meta_path.read_text()) == meta:
+        print(f"[tokenize] {split}: cache up to date ({cache_dir})")
+        return cache_dir
+
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        n = sum(1 for line in f if line.strip())
+    ids = np.lib.format.open_memmap(str(cache_dir / f"{split}.ids.npy"), mode="w+", dtype=np.int32, shape=(n, max_len))
+    lengths = np.zeros(n, dtype=np.int32)
+    labels = np.zeros(n, dtype=np.int64)
+
+    def flush(rows: List[dict], start: int):
+        enc = tokenizer([r["text"] for r in rows], truncation=True, padding=False, max_length=max_len)
+        for j, row_ids in enumerate(enc["input_ids"]):
+            ids[start + j, :len(row_ids)] = row_ids
+            ids[start + j, len(row_ids):] = tokenizer.pad_token_id
+            lengths[start + j] = len(row_ids)
+            labels[start + j] = rows[j]["label"]
+
+    i, pending = 0, []
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            pending.append(json.loads(line))
+            if len(pending) == chunk_size:
+                flush(pending, i)
+                i += len(pending)
+                pending = []
+    if pending:
+        flush(pending, i)
+
+    ids.flush()
+    del ids
+    np.save(cache_dir / f"{split}.lengths.npy", lengths)
+    np.save(cache_dir / f"{split}.labels.npy", labels)
+    meta_path.write_text(json.dumps(meta))
+    print(f"[tokenize] {split}: cached {n} rows (mean length {lengths.mean() if n else 0:.1f} tokens)")
+    return cache_dir
+
+
+class TokenCacheDataset:
+    """torch Dataset over the memmap cache; the arrays are opened lazily so DataLoader workers map them themselves."""
+
+    def __init__(self, cache_dir: Path, split: str):
+        self.cache_dir = Path(cache_dir)
+        self.split = split
+        self.lengths = np.load(self.cache_dir / f"{split}.lengths.npy")
+        self.labels = np.load(self.cache_dir / f"{split}.labels.npy")
+        self._ids = None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __getitem__(self, i):
+        if self._ids is None:
+            self._ids = np.load(self.cache_dir / f"{self.split}.ids.npy", mmap_mode="r")
+        n = int(self.lengths[i])
+        return np.array(self._ids[i, :n], dtype=np.int64), int(self.labels[i])
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_ids"] = None  # never pickle the mapped array into workers
+        return state
+
+
+def collate(batch, pad_id: int = 0):
+    """Dynamic padding: pad only to the longest row of the batch."""
+    import torch
+    width = max(len(ids) for ids, _ in batch)
+    input_ids = torch.full((len(batch), width), pad_id, dtype=torch.long)
+    attention_mask = torch.zeros((len(batch), width), dtype=torch.long)
+    for j, (ids, _) in enumerate(batch):
+        input_ids[j, :len(ids)] = torch.from_numpy(ids)
+        attention_mask[j, :len(ids)] = 1
+    labels = torch.tensor([label for _, label in batch], dtype=torch.long)
+    return {"input_ids": input_ids, "attention_mask": attention_mask, "labels": labels}
+
+
+# ----------------------
+# train
+# ----------------------
+def _save_checkpoint(run_dir: Path, model, optimizer, scheduler, state: dict, keep: int = 2):
+    import torch
+    ckpt_dir = run_dir / "checkpoints"
+    ckpt_dir.mkdir(parents=True, exist_ok=True)
+    path = ckpt_dir / f"step-{state['step']:07d}.pt"
+    tmp = path.with_suffix(".tmp")
+    torch.save({
+        "model": model.state_dict(),
+        "optimizer": optimizer.state_dict(),
+        "scheduler": scheduler.state_dict(),
+        "state": state,
+        "rng": {"python": random.getstate(), "numpy": np.random.get_state(), "torch": torch.get_rng_state()},
+    }, str(tmp))
+    os.replace(tmp, path)
+    (ckpt_dir / "latest").write_text(path.name)
+    for old in sorted(ckpt_dir.glob("step-*.pt"))[:-keep]:
+        old.unlink()
+    print(f"[train] checkpoint {path.name}")
+
+
+def _load_latest_checkpoint(run_dir: Path):
+    import torch
+    latest = run_dir / "checkpoints" / "latest"
+    if not latest.exists():
+        return None
+    return torch.load(str(run_dir / "checkpoints" / latest.read_text().strip()), map_location="cpu", weights_only=False)
+
+
+def _evaluate(model, loader) -> float:
+    import torch
+    model.eval()
+    correct = total = 0
+    with torch.no_grad():
+        for batch in loader:
+            logits = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"]).logits
+            correct += int((logits.argmax(-1) == batch["labels"]).sum())
+            total += len(batch["labels"])
+    model.train()
+    return correct / total if total else float("nan")
+
+
+def train(args) -> Path:
+    import torch
+    from functools import partial
+    from torch.utils.data import DataLoader
+    from transformers import AlbertForSequenceClassification, get_linear_schedule_with_warmup
+
+    torch.manual_seed(args.seed)
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    run_dir = Path(args.run_dir)
+    train_ds = TokenCacheDataset(args.cache_dir, "train")
+    val_ds = TokenCacheDataset(args.cache_dir, "val")
+    pad_id = args.pad_id
+    loader_kwargs = dict(batch_size=args.batch_size, collate_fn=partial(collate, pad_id=pad_id),
+                         num_workers=args.num_workers, persistent_workers=args.num_workers > 0)
+    train_loader = DataLoader(train_ds, shuffle=True, **loader_kwargs)
+    val_loader = DataLoader(val_ds, shuffle=False, **loader_kwargs)
+
+    model = AlbertForSequenceClassification.from_pretrained(
+        args.init, num_labels=len(LABEL_MAP),
+        id2label={i: n for i, n in LABEL_MAP.items()}, label2id={n: i for i, n in LABEL_MAP.items()},
+        ignore_mismatched_sizes=True,
+    )
+    model.train()
+
+    # the last accumulation group of an epoch may be short; it still gets an optimizer step
+    num_batches = len(train_loader)
+    steps_per_epoch = max(1, -(-num_batches // args.grad_accum))
+    last_group_start = num_batches - (num_batches % args.grad_accum or args.grad_accum)
+    total_steps = steps_per_epoch * args.epochs
+    optimizer = torch.optim.AdamW(model.parameters(), lr=args.lr, weight_decay=args.weight_decay)
+    scheduler = get_linear_schedule_with_warmup(optimizer, int(total_steps * args.warmup), total_steps)
+
+    state = {"step": 0, "epoch": 0, "batches_done_in_epoch": 0, "best_val_acc": -1.0}
+    if args.resume:
+        ckpt = _load_latest_checkpoint(run_dir)
+        if ckpt is None:
+            print(f"[train] --resume: no checkpoint in {run_dir}, starting fresh")
+        else:
+            model.load_state_dict(ckpt["model"])
+            optimizer.load_state_dict(ckpt["optimizer"])
+            scheduler.load_state_dict(ckpt["scheduler"])
+            state = ckpt["state"]
+            random.setstate(ckpt["rng"]["python"])
+            np.random.set_state(ckpt["rng"]["numpy"])
+            torch.set_rng_state(ckpt["rng"]["torch"])
+            print(f"[train] resumed at step {state['step']} (epoch {state['epoch']})")
+
+    started = time.perf_counter()
+    for epoch in range(state["epoch"], args.epochs):
+        # reseed per epoch so a resumed run reproduces the shuffle order it was interrupted in
+        torch.manual_seed(args.seed + epoch)
+        skip = state["batches_done_in_epoch"]
+        optimizer.zero_grad()
+        for b, batch in enumerate(train_loader):
+            if b < skip:
+                continue
+            out = model(input_ids=batch["input_ids"], attention_mask=batch["attention_mask"], labels=batch["labels"])
+            group = args.grad_accum if b < last_group_start else num_batches - last_group_start
+            (out.loss / group).backward()
+            state["batches_done_in_epoch"] = b + 1
+            if (b + 1) % args.grad_accum != 0 and b + 1 != num_batches:
+                continue
+            torch.nn.utils.clip_grad_norm_(model.parameters(), args.max_grad_norm)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad()
+            state["step"] += 1
+            if state["step"] % args.log_every == 0:
+                print(f"[train] epoch {epoch} step {state['step']}/{total_steps} loss={out.loss.item():.4f} "
+                      f"({time.perf_counter() - started:.0f}s)")
+            if args.checkpoint_every and state["step"] % args.checkpoint_every == 0:
+                _save_checkpoint(run_dir, model, optimizer, scheduler, dict(state, epoch=epoch))
+
+        val_acc = _evaluate(model, val_loader) if len(val_ds) else float("nan")
+        print(f"[train] epoch {epoch} done: val_acc={val_acc:.4f}")
+        state.update(epoch=epoch + 1, batches_done_in_epoch=0)
+        if len(val_ds) == 0 or val_acc > state["best_val_acc"]:
+            state["best_val_acc"] = val_acc
+            model.save_pretrained(str(run_dir / "best"))
+        _save_checkpoint(run_dir, model, optimizer, scheduler, dict(state))
+
+    return run_dir / "best"
+
+
+# ----------------------
+# export: exact phq9_albert_concat layout
+# ----------------------
+def export(weights_dir: Path, tokenizer_dir: Path, out_dir: Path):
+    """Copy the trained weights plus tokenizer files and label_map.pkl into `out_dir`."""
+    from transformers import AlbertForSequenceClassification
+    out_dir.mkdir(parents=True, exist_ok=True)
+    model = AlbertForSequenceClassification.from_pretrained(str(weights_dir))
+    model.save_pretrained(str(out_dir))
+    if Path(tokenizer_dir).resolve() != out_dir.resolve():
+        for name in TOKENIZER_FILES:
+            src = Path(tokenizer_dir) / name
+            if src.exists():
+                shutil.copy2(src, out_dir / name)
+    with open(out_dir / "label_map.pkl", "wb") as f:
+        pickle.dump(LABEL_MAP, f)
+    print(f"[export] wrote {sorted(p.name for p in out_dir.iterdir())} to {out_dir}")
+
+
+def _tokenize_all(args):
+    from transformers import AlbertTokenizerFast
+    tokenizer = AlbertTokenizerFast.from_pretrained(args.tokenizer_dir, local_files_only=True)
+    args.pad_id = tokenizer.pad_token_id
+    digest = _file_digest(Path(args.tokenizer_dir) / "tokenizer.json")
+    for split in ("train", "val"):
+        tokenize_split(tokenizer, Path(args.data_dir) / f"{split}.jsonl", Path(args.cache_dir), split, args.max_len, digest)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PHQ-9 ALBERT training pipeline.")
+    parser.add_argument("step", choices=["prepare", "tokenize", "train", "export", "all"])
+    parser.add_argument("--csv", default=DEFAULT_CSV_PATH)
+    parser.add_argument("--data-dir", default=str(DATA_DIR))
+    parser.add_argument("--cache-dir", default=str(CACHE_DIR))
+    parser.add_argument("--run-dir", default=str(RUN_DIR))
+    parser.add_argument("--tokenizer-dir", default=DEFAULT_MODEL_DIR, help="directory with the shipped tokenizer files")
+    parser.add_argument("--out-dir", default=None,
+                        help=f"export destination (default: <run-dir>/export; the shipped model is {DEFAULT_MODEL_DIR})")
+    parser.add_argument("--init", default="albert-base-v2", help="pretrained checkpoint (hub name or local dir)")
+    parser.add_argument("--val-fraction", type=float, default=0.1)
+    parser.add_argument("--max-len", type=int, default=DEFAULT_MAX_LEN)
+    parser.add_argument("--epochs", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--grad-accum", type=int, default=2)
+    parser.add_argument("--lr", type=float, default=3e-5)
+    parser.add_argument("--weight-decay", type=float, default=0.01)
+    parser.add_argument("--warmup", type=float, default=0.1, help="fraction of steps used for LR warm-up")
+    parser.add_argument("--max-grad-norm", type=float, default=1.0)
+    parser.add_argument("--num-workers", type=int, default=min(4, os.cpu_count() or 1))
+    parser.add_argument("--threads", type=int, default=0, help="torch intra-op threads (0 = torch default)")
+    parser.add_argument("--checkpoint-every", type=int, default=50, help="optimizer steps between checkpoints")
+    parser.add_argument("--log-every", type=int, default=10)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    args.pad_id = 0
+
+    if args.step in ("prepare", "all"):
+        prepare(args.csv, Path(args.data_dir), args.val_fraction, args.seed)
+    if args.step in ("tokenize", "train", "all"):
+        _tokenize_all(args)  # no-op when the cache is current
+    best = Path(args.run_dir) / "best"
+    if args.step in ("train", "all"):
+        best = train(args)
+    if args.step in ("export", "all"):
+        export(best, Path(args.tokenizer_dir), Path(args.out_dir or Path(args.run_dir) / "export"))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,258 @@
+# src/worker_pool.py
+"""
+Multi-process inference worker pool.
+
+Each worker is a separate (spawned) process holding its own PHQ9ModelWrapper,
+pinned to its own slice of CPU cores and connected to the web process over a
+Unix socketpair (multiprocessing.Pipe). The web process only dispatches texts
+and waits for results, so HTTP handling and the model no longer compete for the
+same cores and GIL.
+
+InferencePool exposes the same predict_raw / label_map surface as
+PHQ9ModelWrapper, so infer.py can use it as a drop-in replacement
+(see infer.enable_worker_pool). A health-check thread pings idle workers and
+restarts any that died; a crash during a request fails only that request.
+
+The pipes belong to the process that started the pool: a forked child (e.g. a
+gunicorn worker) must start its own pool instead of sharing them.
+"""
+import multiprocessing as mp
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List
+
+from model import DEFAULT_BACKEND, DEFAULT_MODEL_DIR
+
+# ----------------------
+# CONFIG
+# ----------------------
+STARTUP_TIMEOUT_S = 300.0        # model load in a fresh process
+REQUEST_TIMEOUT_S = 60.0
+HEALTH_INTERVAL_S = 5.0
+PING_TIMEOUT_S = 5.0
+
+
+def _worker_main(conn, cores: List[int], model_dir: str, backend: str):
+    """Entry point of a worker process: load the model, then serve requests until 'stop'."""
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+
+    import torch
+    from model import PHQ9ModelWrapper
+
+    torch.set_num_threads(max(1, len(cores)))
+    os.environ["PHQ9_ORT_THREADS"] = str(max(1, len(cores)))
+    try:
+        wrapper = PHQ9ModelWrapper(model_dir, backend=backend)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+    conn.send(("ready", {"label_map": wrapper.label_map, "num_labels": wrapper.num_labels}))
+
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            return  # parent went away
+        op = msg[0]
+        if op == "predict":
+            _, texts, top_k = msg
+            try:
+                conn.send(("ok", wrapper.predict_raw(texts, top_k=top_k)))
+            except Exception as e:
+                conn.send(("error", f"{type(e).__name__}: {e}"))
+        elif op == "ping":
+            conn.send(("pong", os.getpid()))
+        elif op == "stop":
+            return
+
+
+class _Worker:
+    __slots__ = ("index", "cores", "process", "conn", "restarts")
+
+    def __init__(self, index: int, cores: List[int]):
+        self.index = index
+        self.cores = cores
+        self.process = None
+        self.conn = None
+        self.restarts = 0
+
+
+class InferencePool:
+    def __init__(self, num_workers: int, model_dir: str = DEFAULT_MODEL_DIR, backend: str = DEFAULT_BACKEND,
+                 pin_cores: bool = True, request_timeout: float = REQUEST_TIMEOUT_S,
+                 health_interval: float = HEALTH_INTERVAL_S):
+        if num_workers < 1:
+            raise ValueError("num_workers must be >= 1")
+        self.num_workers = int(num_workers)
+        self.model_dir = str(model_dir)
+        self.backend = backend
+        self.request_timeout = float(request_timeout)
+        self.health_interval = float(health_interval)
+
+        # attributes read by infer.py / preload.py when the pool stands in for the wrapper
+        self.model = None
+        self.ort_session = None
+        self.label_map: Dict[int, str] = {}
+        self.num_labels = 0
+
+        # spawn, not fork: workers start from a clean interpreter (no inherited OpenMP/ORT state)
+        self._ctx = mp.get_context("spawn")
+        self._idle: "queue.Queue[_Worker]" = queue.Queue()
+        self._workers = [_Worker(i, cores) for i, cores in enumerate(self._partition_cores(pin_cores))]
+        self._stopped = threading.Event()
+        self._owner_pid = os.getpid()
+
+        for w in self._workers:
+            self._start(w)
+            self._idle.put(w)
+
+        self._health_thread = threading.Thread(target=self._health_loop, name="phq9-pool-health", daemon=True)
+        self._health_thread.start()
+
+    # ----------------------
+    # public API
+    # ----------------------
+    def predict_raw(self, texts: List[str], top_k: int = 3) -> List[Dict[str, Any]]:
+        """Dispatch to the next idle worker and wait for its result (same contract as PHQ9ModelWrapper.predict_raw)."""
+        if os.getpid() != self._owner_pid:
+            raise RuntimeError("InferencePool was started in another process; "
+                               "a forked process must start its own pool")
+        if isinstance(texts, str):
+            texts = [texts]
+        try:
+            worker = self._idle.get(timeout=self.request_timeout)
+        except queue.Empty:
+            raise RuntimeError(f"No inference worker became available within {self.request_timeout:.0f}s")
+
+        try:
+            worker.conn.send(("predict", list(texts), int(top_k)))
+            if not worker.conn.poll(self.request_timeout):
+                raise TimeoutError(f"worker {worker.index} did not answer within {self.request_timeout:.0f}s")
+            status, payload = worker.conn.recv()
+        except (EOFError, OSError, TimeoutError) as e:
+            # fail this request now; the worker restarts in the background (loading the model can
+            # take up to STARTUP_TIMEOUT_S) and the other workers keep serving meanwhile
+            threading.Thread(target=self._restart_and_release, args=(worker, str(e) or type(e).__name__),
+                             name=f"phq9-pool-restart-{worker.index}", daemon=True).start()
+            raise RuntimeError(f"Inference worker {worker.index} failed: {e}") from e
+
+        self._idle.put(worker)
+        if status != "ok":
+            raise RuntimeError(f"Inference worker {worker.index} error: {payload}")
+        return payload
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": self.num_workers,
+            "idle": self._idle.qsize(),
+            "per_worker": [
+                {
+                    "index": w.index,
+                    "pid": w.process.pid if w.process else None,
+                    "alive": bool(w.process and w.process.is_alive()),
+                    "cores": w.cores,
+                    "restarts": w.restarts,
+                }
+                for w in self._workers
+            ],
+        }
+
+    def close(self, timeout: float = 5.0):
+        self._stopped.set()
+        if os.getpid() != self._owner_pid:
+            return  # the workers belong to the parent; leave them running
+        for w in self._workers:
+            try:
+                w.conn.send(("stop",))
+            except Exception:
+                pass
+        for w in self._workers:
+            w.process.join(timeout)
+            if w.process.is_alive():
+                w.process.kill()
+
+    # ----------------------
+    # process management
+    # ----------------------
+    def _partition_cores(self, pin_cores: bool) -> List[List[int]]:
+        if not pin_cores or not hasattr(os, "sched_getaffinity"):
+            return [[] for _ in range(self.num_workers)]
+        cores = sorted(os.sched_getaffinity(0))
+        if self.num_workers >= len(cores):
+            return [[cores[i % len(cores)]] for i in range(self.num_workers)]
+        per = len(cores) // self.num_workers
+        return [cores[i * per:(i + 1) * per] for i in range(self.num_workers)]
+
+    def _start(self, worker: _Worker):
+        parent_conn, child_conn = self._ctx.Pipe(duplex=True)
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(child_conn, worker.cores, self.model_dir, self.backend),
+            name=f"phq9-infer-{worker.index}",
+            daemon=True,
+        )
+        proc.start()
+        child_conn.close()
+
+        if not parent_conn.poll(STARTUP_TIMEOUT_S):
+            proc.kill()
+            raise RuntimeError(f"Inference worker {worker.index} did not start within {STARTUP_TIMEOUT_S:.0f}s")
+        try:
+            status, payload = parent_conn.recv()
+        except EOFError:
+            proc.join(1.0)
+            raise RuntimeError(f"Inference worker {worker.index} exited during startup (exit code {proc.exitcode})")
+        if status != "ready":
+            proc.join(1.0)
+            raise RuntimeError(f"Inference worker {worker.index} failed to load the model: {payload}")
+
+        self.label_map = payload["label_map"]
+        self.num_labels = payload["num_labels"]
+        worker.process, worker.conn = proc, parent_conn
+        print(f"[pool] worker {worker.index} ready (pid={proc.pid}, cores={worker.cores or 'any'})")
+
+    def _restart(self, worker: _Worker, reason: str):
+        print(f"[pool] restarting worker {worker.index}: {reason}")
+        if worker.process is not None and worker.process.is_alive():
+            worker.process.kill()
+        if worker.process is not None:
+            worker.process.join(1.0)
+        try:
+            worker.conn.close()
+        except Exception:
+            pass
+        worker.restarts += 1
+        self._start(worker)
+
+    def _restart_and_release(self, worker: _Worker, reason: str):
+        """Restart a worker off the request path and return it to the idle queue."""
+        try:
+            self._restart(worker, reason)
+        except Exception as restart_error:
+            # leave it to the health check to retry; the dead pipe makes its ping fail
+            print(f"[pool] worker {worker.index} restart failed: {restart_error}")
+        self._idle.put(worker)
+
+    def _health_loop(self):
+        while not self._stopped.wait(self.health_interval):
+            # check each currently idle worker once; busy workers are checked by the request path
+            for _ in range(self._idle.qsize()):
+                try:
+                    worker = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                try:
+                    worker.conn.send(("ping",))
+                    if not worker.conn.poll(PING_TIMEOUT_S):
+                        raise TimeoutError("ping timeout")
+                    worker.conn.recv()
+                except Exception as e:
+                    try:
+                        self._restart(worker, reason=f"health check failed ({e or type(e).__name__})")
+                    except Exception as restart_error:
+                        print(f"[pool] worker {worker.index} restart failed: {restart_error}")
+                        time.sleep(self.health_interval)
+                self._idle.put(worker)
@@ -0,0 +1,45 @@
+# tests/conftest.py
+"""
+Shared fixtures for the offline service tests (run from ai-service/offline_model):
+  python -m pytest -q tests
+
+The trained weights are not in the repository, so model tests use the tiny random
+ALBERT that benchmark.py builds from the shipped tokenizer and label map.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+REPO_MODEL_DIR = SRC_DIR.parent / "models" / "phq9_albert_concat"
+sys.path.insert(0, str(SRC_DIR))
+
+SAMPLE_ANSWERS = [
+    "Not at all", "Several days", "More than half the days", "Nearly every day", "Not at all",
+    "Several days", "Not at all", "Not at all", "Several days",
+]
+
+
+@pytest.fixture(scope="session")
+def tiny_model_dir(tmp_path_factory) -> Path:
+    from benchmark import build_tiny_model
+    return build_tiny_model(REPO_MODEL_DIR, tmp_path_factory.mktemp("tiny_albert"))
+
+
+@pytest.fixture(scope="session")
+def tiny_wrapper(tiny_model_dir):
+    from model import PHQ9ModelWrapper
+    return PHQ9ModelWrapper(tiny_model_dir, backend="torch")
+
+
+@pytest.fixture
+def src_env():
+    """Environment for running src/ modules in a subprocess."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = str(SRC_DIR) + os.pathsep + env.get("PYTHONPATH", "")
+    for key in list(env):
+        if key.startswith("PHQ9_"):
+            del env[key]
+    return env
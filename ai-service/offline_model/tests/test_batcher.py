@@ -0,0 +1,47 @@
+# tests/test_batcher.py
+import threading
+import time
+
+from batcher import MicroBatcher
+
+
+class _SlowWrapper:
+    """predict_raw stand-in that records batch sizes and takes `delay` seconds per call."""
+
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.sizes = []
+        self._lock = threading.Lock()
+
+    def predict_raw(self, texts, top_k=3):
+        with self._lock:
+            self.sizes.append(len(texts))
+        time.sleep(self.delay)
+        return [{"text": t, "topk": [(0, 1.0, "x")] * top_k} for t in texts]
+
+
+def test_solo_request_does_not_wait_for_the_window():
+    wrapper = _SlowWrapper(0.0)
+    batcher = MicroBatcher(lambda: wrapper, max_batch_size=16, max_wait_ms=500)
+    try:
+        batcher.predict("warm-up")
+        started = time.perf_counter()
+        assert batcher.predict("hello", top_k=1)["text"] == "hello"
+        assert time.perf_counter() - started < 0.25
+    finally:
+        batcher.stop()
+
+
+def test_requests_arriving_during_a_forward_pass_are_batched():
+    wrapper = _SlowWrapper(0.1)
+    batcher = MicroBatcher(lambda: wrapper, max_batch_size=16, max_wait_ms=5)
+    try:
+        first = batcher.submit("first")
+        time.sleep(0.02)  # first is now running alone
+        rest = [batcher.submit(f"t{i}") for i in range(8)]
+        assert first.result(timeout=5)["text"] == "first"
+        assert [f.result(timeout=5)["text"] for f in rest] == [f"t{i}" for i in range(8)]
+        assert wrapper.sizes[0] == 1
+        assert max(wrapper.sizes[1:]) > 1
+    finally:
+        batcher.stop()
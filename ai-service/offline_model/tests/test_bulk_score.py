@@ -0,0 +1,82 @@
+# tests/test_bulk_score.py
+import json
+
+import bulk_score
+import infer
+from conftest import SAMPLE_ANSWERS
+
+HEADER = "Age,Gender,Q1,Q2,Q3,Q4,Q5,Q6,Q7,Q8,Q9,PHQ-9 Total Score,Depression Level\n"
+
+
+def _csv_row(answers, level="Minimal"):
+    quoted = ",".join('"' + a.replace('"', '""') + '"' for a in answers)
+    return f"20,Male,{quoted},3,{level}\n"
+
+
+def _chunks(path, fmt, chunk_size=100, **kw):
+    return list(bulk_score.read_chunks(path, fmt, chunk_size, **kw))
+
+
+def test_malformed_jsonl_rows_become_row_errors(tmp_path):
+    path = tmp_path / "in.jsonl"
+    lines = [
+        json.dumps({"answers": SAMPLE_ANSWERS}),
+        json.dumps({"answers": SAMPLE_ANSWERS[:8]}),                    # 8 answers
+        json.dumps({"answers": SAMPLE_ANSWERS[:8] + [None]}),           # null answer -> blank
+        json.dumps({"answers": SAMPLE_ANSWERS[:8] + [3]}),              # non-string answer
+        json.dumps({"answers": "Not at all"}),                          # not a list
+        json.dumps({"text": " ||| ".join(SAMPLE_ANSWERS[:5])}),         # 5 answers
+        json.dumps(["not", "an", "object"]),
+        "{not json",
+        "",
+        json.dumps({"text": " ||| ".join(SAMPLE_ANSWERS)}),
+    ]
+    path.write_text("\n".join(lines) + "\n")
+    (chunk,) = _chunks(path, "jsonl")
+    rows = chunk.rows
+    assert len(rows) == 9
+    assert rows[0] == (SAMPLE_ANSWERS, None)
+    assert rows[2] == (SAMPLE_ANSWERS[:8] + [""], None)
+    assert rows[8] == (SAMPLE_ANSWERS, None)
+    for i in (1, 3, 4, 5, 6, 7):
+        assert rows[i][0] is None and rows[i][1], f"row {i} should be an error"
+    assert "got 8" in rows[1][1]
+
+    unique, inverse = bulk_score.dedupe(rows)
+    assert len(unique) == 2
+    assert inverse == [0, None, 1, None, None, None, None, None, 0]
+
+
+def test_csv_quoted_newlines_and_resume_offsets(tmp_path):
+    path = tmp_path / "in.csv"
+    multi = ["line one\nline two"] + SAMPLE_ANSWERS[1:]
+    path.write_text(HEADER + _csv_row(SAMPLE_ANSWERS) + _csv_row(multi) + "20,Male,short\n" + _csv_row(SAMPLE_ANSWERS))
+    first, second = _chunks(path, "csv", chunk_size=2)
+    assert first.rows == [(SAMPLE_ANSWERS, None), (multi, None)]
+    assert second.rows[0][0] is None and "columns" in second.rows[0][1]
+    assert second.rows[1] == (SAMPLE_ANSWERS, None)
+
+    # resuming at a chunk boundary continues with the next record, even after a multi-line one
+    (resumed,) = _chunks(path, "csv", chunk_size=2, start_offset=first.end_offset, start_row=2)
+    assert resumed.first_row == 2 and resumed.rows == second.rows
+
+
+def test_bad_rows_do_not_abort_the_run(tmp_path, tiny_model_dir, monkeypatch):
+    # --workers 0 scores in-process and points infer's module globals at the tiny model
+    for name in ("DEFAULT_MODEL_DIR", "_model_wrapper", "_table", "_cascade", "_hierarchical"):
+        monkeypatch.setattr(infer, name, getattr(infer, name))
+    monkeypatch.setattr(infer, "_answer_cache", infer.LRUCache(infer.ANSWER_CACHE_SIZE))
+    inp, out = tmp_path / "in.jsonl", tmp_path / "out.jsonl"
+    inp.write_text("\n".join([
+        json.dumps({"answers": SAMPLE_ANSWERS}),
+        json.dumps({"answers": SAMPLE_ANSWERS[:8]}),
+        json.dumps({"answers": SAMPLE_ANSWERS[:8] + [{"x": 1}]}),
+        json.dumps({"answers": SAMPLE_ANSWERS}),
+    ]) + "\n")
+    code = bulk_score.main([str(inp), str(out), "--workers", "0", "--model-dir", str(tiny_model_dir),
+                            "--backend", "torch"])
+    assert code == 0
+    records = [json.loads(line) for line in out.read_text().splitlines()]
+    assert [r["row"] for r in records] == [0, 1, 2, 3]
+    assert "label" in records[0] and "label" in records[3]
+    assert "error" in records[1] and "error" in records[2]
@@ -0,0 +1,84 @@
+# tests/test_early_exit.py
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import torch
+
+from early_exit import EarlyExitRunner, _entropy, collect_cls_states, train_exit_heads
+
+WORDS = ("tired", "sad", "sleep", "never", "often", "days", "hopeless", "fine", "worried", "every", "not", "really")
+
+
+@pytest.fixture(scope="module")
+def texts():
+    rng = random.Random(0)
+    return [" ||| ".join(" ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 6))) for _ in range(9))
+            for _ in range(40)]
+
+
+@pytest.fixture(scope="module")
+def runner(tiny_wrapper, texts):
+    heads = train_exit_heads(tiny_wrapper, texts, exit_layers=(3, 6, 9), epochs=20)
+    # threshold at the median entropy of the first exit head, so rows exit at different layers
+    states, _ = collect_cls_states(tiny_wrapper, texts, (3,))
+    with torch.no_grad():
+        entropy = _entropy(torch.softmax(heads["3"](states[3]), dim=-1))
+    r = EarlyExitRunner(tiny_wrapper.model, heads, float(entropy.median()))
+    yield r
+    r.close()
+
+
+def _one(runner, wrapper, text):
+    enc = wrapper.tokenizer([text], return_tensors="pt")
+    logits, exit_at = runner.forward_logits(enc["input_ids"], enc["attention_mask"])
+    return logits.numpy(), exit_at[0]
+
+
+def test_concurrent_calls_match_serial(runner, tiny_wrapper, texts):
+    serial = [_one(runner, tiny_wrapper, t) for t in texts]
+    assert len({e for _, e in serial}) > 1, "threshold should make rows exit at different layers"
+
+    work = texts * 10
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        concurrent = list(pool.map(lambda t: _one(runner, tiny_wrapper, t), work))
+
+    expected = serial * 10
+    for (logits, exit_at), (ref_logits, ref_exit) in zip(concurrent, expected):
+        assert exit_at == ref_exit
+        np.testing.assert_allclose(logits, ref_logits, rtol=1e-5, atol=1e-5)
+    assert runner.stats()["avg_layers_evaluated_per_batch"] <= runner.num_layers
+
+
+def test_other_forward_passes_are_not_interrupted(runner, tiny_wrapper, texts):
+    # a plain model call on the same (hooked) layers runs all layers untouched
+    enc = tiny_wrapper.tokenizer(texts[:4], padding=True, return_tensors="pt")
+    before = runner.stats()["batches"]
+    with torch.no_grad():
+        out = tiny_wrapper.model(**enc)
+    assert out.logits.shape == (4, tiny_wrapper.num_labels)
+    assert runner.stats()["batches"] == before
+
+
+def test_train_cli_reports_against_batched_full_predictions(tiny_model_dir, texts, tmp_path, monkeypatch, capsys):
+    import shutil
+
+    import early_exit
+    from model import PHQ9ModelWrapper
+
+    model_dir = tmp_path / "model"
+    shutil.copytree(tiny_model_dir, model_dir)
+    csv_path = tmp_path / "train.csv"
+    rows = ["Age,Gender,Q1,Q2,Q3,Q4,Q5,Q6,Q7,Q8,Q9,PHQ-9 Total Score,Depression Level"]
+    rows += ["20,Male," + ",".join(t.split(" ||| ")) + ",3,Minimal" for t in texts]
+    csv_path.write_text("\n".join(rows) + "\n")
+
+    batch_sizes = []
+    real_predict = PHQ9ModelWrapper.predict_raw
+    monkeypatch.setattr(PHQ9ModelWrapper, "predict_raw",
+                        lambda self, t, **kw: batch_sizes.append(len(t)) or real_predict(self, t, **kw))
+    assert early_exit.main(["--train", "--model-dir", str(model_dir), "--csv", str(csv_path), "--epochs", "2"]) == 0
+    assert (model_dir / early_exit.EXIT_HEADS_FILENAME).exists()
+    assert batch_sizes == [len(texts)]
+    assert capsys.readouterr().out.count("agreement=") == 4
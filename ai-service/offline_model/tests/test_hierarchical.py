@@ -0,0 +1,49 @@
+# tests/test_hierarchical.py
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import SAMPLE_ANSWERS
+from hierarchical import HierarchicalEncoder, HierarchicalHead
+
+PHRASES = ("Not at all", "Several days", "More than half the days", "Nearly every day",
+           "sometimes", "pretty tired most days", "never really", "every single night")
+
+
+@pytest.fixture(scope="module")
+def head(tiny_wrapper):
+    torch.manual_seed(0)
+    return HierarchicalHead.from_model(tiny_wrapper.model)
+
+
+@pytest.fixture(scope="module")
+def answer_sets():
+    rng = random.Random(1)
+    return [SAMPLE_ANSWERS] + [[rng.choice(PHRASES) for _ in range(9)] for _ in range(30)]
+
+
+def test_cache_hits_and_misses_give_the_same_scores(tiny_wrapper, head, answer_sets):
+    uncached = HierarchicalEncoder(tiny_wrapper, head, cache_size=0).logits(answer_sets)
+
+    encoder = HierarchicalEncoder(tiny_wrapper, head, cache_size=1024)
+    cold = encoder.logits(answer_sets)          # all misses
+    warm = encoder.logits(answer_sets)          # all hits
+    partly = encoder.logits(answer_sets[:5] + [["brand new answer"] * 9])[:5]   # hits + one miss
+
+    np.testing.assert_allclose(cold, uncached, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(warm, cold, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(partly, cold[:5], rtol=1e-6, atol=1e-6)
+    assert encoder.cache.stats()["hits"] > 0
+    assert encoder.stats()["items_encoded"] == len({(i, a.lower()) for s in answer_sets for i, a in enumerate(s)}) + 9   # new answer on each item
+
+
+def test_stats_are_exact_under_threads(tiny_wrapper, head, answer_sets):
+    encoder = HierarchicalEncoder(tiny_wrapper, head, cache_size=1024)
+    encoder.warm()
+    before = encoder.stats()["rows"]
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda rows: encoder.predict_raw(rows, top_k=1), [answer_sets[i:i + 3] for i in range(0, 30, 3)] * 8))
+    assert encoder.stats()["rows"] - before == 30 * 8
@@ -0,0 +1,96 @@
+# tests/test_infer_stats.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import infer
+from conftest import SAMPLE_ANSWERS
+
+LABELS = {0: "Minimal", 1: "Mild", 2: "Severe"}
+
+
+class _FakeTable:
+    label_map = LABELS
+
+    def lookup(self, answers):
+        return np.array([3.0, 0.0, 0.0]) if answers[0] == "table" else None
+
+
+class _FakeCascade:
+    label_map = LABELS
+
+    def logits(self, answers):
+        # confident on "cheap" rows, unsure otherwise
+        return np.array([0.0, 9.0, 0.0]) if answers[0] == "cheap" else np.array([0.0, 0.1, 0.0])
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    monkeypatch.setattr(infer, "_table", _FakeTable())
+    monkeypatch.setattr(infer, "_cascade", _FakeCascade())
+    monkeypatch.setattr(infer, "_answer_cache", infer.LRUCache(0))
+    monkeypatch.setattr(infer, "_table_hits", 0)
+    monkeypatch.setattr(infer, "_cascade_stats", {k: 0 for k in infer._cascade_stats})
+    monkeypatch.setattr(infer, "_predict_model", lambda answers, text, top_k: {"pred_idx": 1})
+    monkeypatch.setattr(infer, "_shadow_executor", None)
+    monkeypatch.setattr(infer, "_shadow_pending", 0)
+    yield
+    if infer._shadow_executor is not None:
+        infer._shadow_executor.shutdown(wait=True)
+
+
+def test_sampled_request_records_agreement_off_the_request_path(stages, monkeypatch):
+    assert 0 < infer.CASCADE_SHADOW_RATE < 0.1   # on by default, at a small rate
+    monkeypatch.setattr(infer, "CASCADE_SHADOW_RATE", 1.0)
+    release = threading.Event()
+
+    def slow_model(answers, text, top_k):
+        release.wait(5)
+        return {"pred_idx": 1}   # same class as the cascade
+
+    monkeypatch.setattr(infer, "_predict_model", slow_model)
+    raw_out, source, _ = infer._score_cheap(["cheap"] + SAMPLE_ANSWERS[1:], "cheap", 1)
+    assert source == "cascade" and raw_out["pred_idx"] == 1
+    assert infer.cascade_stats()["shadowed"] == 0   # the request did not wait for the shadow pass
+
+    release.set()
+    infer._shadow_executor.submit(lambda: None).result(timeout=5)
+    stats = infer.cascade_stats()
+    assert stats["shadowed"] == 1 and stats["shadow_agreement"] == 1.0
+
+
+def test_shadow_samples_are_dropped_when_the_queue_is_full(stages, monkeypatch):
+    monkeypatch.setattr(infer, "CASCADE_SHADOW_RATE", 1.0)
+    monkeypatch.setattr(infer, "SHADOW_MAX_PENDING", 2)
+    release = threading.Event()
+    monkeypatch.setattr(infer, "_predict_model", lambda a, t, k: release.wait(5) and {"pred_idx": 0})
+    for _ in range(5):
+        infer._score_cheap(["cheap"] + SAMPLE_ANSWERS[1:], "cheap", 1)
+    assert infer.cascade_stats()["shadow_dropped"] == 3
+    release.set()
+    infer._shadow_executor.submit(lambda: None).result(timeout=5)
+    stats = infer.cascade_stats()
+    assert stats["shadowed"] == 2 and stats["shadow_agreement"] == 0.0
+
+
+def test_stage_counters_are_exact_under_threads(stages, monkeypatch):
+    monkeypatch.setattr(infer, "CASCADE_SHADOW_RATE", 0.5)
+    rows = [["table"] + SAMPLE_ANSWERS[1:], ["cheap"] + SAMPLE_ANSWERS[1:], SAMPLE_ANSWERS] * 300
+
+    def score(answers):
+        raw_out, source, cascade_idx = infer._score_cheap(answers, " ||| ".join(answers), 1)
+        if raw_out is None:
+            infer._record_model_result(" ||| ".join(answers), {"pred_idx": 1, "logits": None}, cascade_idx)
+        return source
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        sources = list(pool.map(score, rows))
+    infer._shadow_executor.submit(lambda: None).result(timeout=5)   # let queued shadow passes finish
+
+    assert sources.count("table") == infer.cache_stats()["table_hits"] == 300
+    stats = infer.cascade_stats()
+    assert stats["answered"] == 300 and stats["escalated"] == 300
+    assert 0 < stats["shadowed"] + stats["shadow_dropped"] < 300 and stats["shadow_agree"] == stats["shadowed"]
+    assert stats["shadow_agreement"] == 1.0
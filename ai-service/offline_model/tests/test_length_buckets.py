@@ -0,0 +1,39 @@
+# tests/test_length_buckets.py
+import numpy as np
+
+from conftest import SAMPLE_ANSWERS
+from infer import DELIMITER
+from model import PHQ9ModelWrapper
+
+# lengths deliberately out of order, so sorting into buckets reorders the rows
+TEXTS = [
+    DELIMITER.join(SAMPLE_ANSWERS),
+    "Not at all",
+    DELIMITER.join(SAMPLE_ANSWERS[:4]),
+    "Nearly every day, I can barely get out of bed and nothing feels worth doing anymore",
+    "Several days",
+    DELIMITER.join(SAMPLE_ANSWERS * 2),
+    "More than half the days",
+]
+
+
+def test_buckets_cover_every_row_within_the_budget(tiny_wrapper):
+    ids = tiny_wrapper.tokenizer(TEXTS, truncation=True, max_length=tiny_wrapper.max_len)["input_ids"]
+    buckets = PHQ9ModelWrapper._length_buckets(ids, 96)
+    assert len(buckets) > 1
+    assert sorted(i for b in buckets for i in b) == list(range(len(TEXTS)))
+    for b in buckets:
+        assert len(b) == 1 or len(b) * max(len(ids[i]) for i in b) <= 96
+    assert PHQ9ModelWrapper._length_buckets(ids, 0) == [sorted(range(len(TEXTS)), key=lambda i: len(ids[i]))]
+
+
+def test_bucketed_results_keep_input_order_and_match_unbucketed_logits(tiny_wrapper):
+    bucketed = tiny_wrapper.predict_raw(TEXTS, max_batch_tokens=96)
+    unbucketed = tiny_wrapper.predict_raw(TEXTS, max_batch_tokens=0)   # one batch padded to the longest row
+    one_by_one = [tiny_wrapper.predict_raw([t], max_batch_tokens=0)[0] for t in TEXTS]
+
+    assert len(bucketed) == len(TEXTS)
+    for b, u, single in zip(bucketed, unbucketed, one_by_one):
+        np.testing.assert_allclose(b["logits"], u["logits"], rtol=1e-4, atol=1e-5)
+        np.testing.assert_allclose(b["logits"], single["logits"], rtol=1e-4, atol=1e-5)
+        assert b["pred_idx"] == single["pred_idx"]
@@ -0,0 +1,33 @@
+# tests/test_metrics.py
+import re
+
+import metrics
+from conftest import SRC_DIR
+
+ONLINE_METRICS = SRC_DIR.parent.parent / "online_model" / "src" / "metrics.py"
+SERVICE_BLOCK = re.compile(r"^ENV_PREFIX = .*\nSTAGE_METRIC = .*\n", re.M)
+
+
+def test_online_and_offline_copies_are_in_sync():
+    offline = (SRC_DIR / "metrics.py").read_text()
+    online = ONLINE_METRICS.read_text()
+    assert SERVICE_BLOCK.search(offline) and SERVICE_BLOCK.search(online)
+    assert SERVICE_BLOCK.sub("", offline) == SERVICE_BLOCK.sub("", online), \
+        "online_model/src/metrics.py and offline_model/src/metrics.py differ outside the SERVICE block"
+    # each service reads its own knobs (PHQ9_METRICS_SAMPLE_RATE vs PHQ_CHAT_METRICS_SAMPLE_RATE)
+    prefixes = {re.search(r'^ENV_PREFIX = "(.*)"$', text, re.M).group(1) for text in (offline, online)}
+    assert prefixes == {"PHQ9_", "PHQ_CHAT_"}
+
+
+def test_registry_renders_counters_gauges_and_histograms():
+    registry = metrics.Registry()
+    registry.counter("t_requests_total", "Requests.", ("route",)).inc(route="/a")
+    gauge = registry.gauge("t_queue_depth", "Queue depth.")
+    gauge.set(5)
+    gauge.set(2)
+    registry.histogram("t_seconds", "Latency.", buckets=(0.1, 1.0)).observe(0.5)
+    lines = registry.render()
+    assert 't_requests_total{route="/a"} 1' in lines
+    assert "# TYPE t_queue_depth gauge" in lines and "t_queue_depth 2" in lines
+    assert 't_seconds_bucket{le="0.1"} 0' in lines and 't_seconds_bucket{le="1"} 1' in lines
+    assert metrics.STAGE_SECONDS.name == "phq9_stage_seconds"
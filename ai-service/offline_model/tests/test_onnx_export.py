@@ -0,0 +1,44 @@
+# tests/test_onnx_export.py
+import os
+import shutil
+
+import numpy as np
+import pytest
+import torch
+
+from conftest import SAMPLE_ANSWERS
+
+pytest.importorskip("onnxruntime")
+
+TEXT = " ||| ".join(SAMPLE_ANSWERS)
+
+
+def _logits(model_dir, backend):
+    from model import PHQ9ModelWrapper
+    return PHQ9ModelWrapper(model_dir, backend=backend).predict_raw([TEXT])[0]["logits"]
+
+
+def test_onnx_export_follows_retrained_weights(tiny_model_dir, tmp_path):
+    from transformers import AlbertForSequenceClassification
+
+    model_dir = tmp_path / "model"
+    shutil.copytree(tiny_model_dir, model_dir)
+    first = _logits(model_dir, "onnx")
+    _logits(model_dir, "onnx-int8")
+    np.testing.assert_allclose(first, _logits(model_dir, "torch"), atol=1e-4)
+
+    # "retrain": new weights in place, as train.py would leave them
+    model = AlbertForSequenceClassification.from_pretrained(str(model_dir))
+    with torch.no_grad():
+        model.classifier.bias += 1.0
+        model.classifier.weight.mul_(-1.0)
+    model.save_pretrained(str(model_dir))
+    weights = model_dir / "model.safetensors"
+    st = weights.stat()
+    os.utime(weights, (st.st_atime, st.st_mtime + 10))
+
+    retrained = _logits(model_dir, "torch")
+    assert not np.allclose(first, retrained, atol=1e-3)
+    np.testing.assert_allclose(_logits(model_dir, "onnx"), retrained, atol=1e-4)
+    # the int8 copy was dropped with the stale export and is rebuilt from the new one
+    assert np.argmax(_logits(model_dir, "onnx-int8")) == np.argmax(retrained)
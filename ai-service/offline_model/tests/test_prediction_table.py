@@ -0,0 +1,86 @@
+# tests/test_prediction_table.py
+import json
+import shutil
+
+import numpy as np
+import pytest
+
+import infer
+from conftest import SAMPLE_ANSWERS
+from prediction_table import (META_FILENAME, TABLE_FILENAME, TABLE_ROWS, PredictionTable, canonical_code,
+                              canonical_index, scorer_key, weights_fingerprint)
+
+
+@pytest.mark.parametrize("answer, code", [
+    ("Not at all", 0), ("  several   DAYS ", 1), ("nearly every day", 3),
+    ("Several days.", None), ("Nearly every day!!", None), ("most days", None),
+])
+def test_canonical_code_uses_the_cache_normalization(answer, code):
+    assert canonical_code(answer) == code
+
+
+@pytest.fixture
+def table_dir(tiny_model_dir, tmp_path):
+    model_dir = tmp_path / "model"
+    shutil.copytree(tiny_model_dir, model_dir)
+    logits = np.zeros((TABLE_ROWS, 5), dtype=np.float32)
+    logits[canonical_index(SAMPLE_ANSWERS), 2] = 5.0
+    np.save(model_dir / TABLE_FILENAME, logits)
+    return model_dir
+
+
+def _write_meta(model_dir, **extra):
+    meta = {"num_labels": 5, "label_map": {str(i): f"L{i}" for i in range(5)},
+            "weights": weights_fingerprint(model_dir), **extra}
+    (model_dir / META_FILENAME).write_text(json.dumps(meta))
+
+
+def test_table_is_only_served_to_the_scorer_that_built_it(table_dir):
+    _write_meta(table_dir, scorer=scorer_key("torch", "concat", None))
+    assert PredictionTable.load(table_dir, scorer=scorer_key("torch", "concat", None)) is not None
+    assert PredictionTable.load(table_dir, scorer=scorer_key("onnx-int8", "concat", None)) is None
+    assert PredictionTable.load(table_dir, scorer=scorer_key("torch", "hierarchical", None)) is None
+    assert PredictionTable.load(table_dir, scorer=scorer_key("torch", "concat", 0.3)) is None
+
+
+def test_tables_without_scorer_meta_count_as_fp32_concat(table_dir):
+    _write_meta(table_dir, backend="torch")
+    assert PredictionTable.load(table_dir, scorer=scorer_key()) is not None
+    assert PredictionTable.load(table_dir, scorer=scorer_key("torch-int8")) is None
+
+
+def test_infer_bypasses_a_table_built_for_another_backend(table_dir, monkeypatch):
+    from model import PHQ9ModelWrapper
+    _write_meta(table_dir, scorer=scorer_key())
+    monkeypatch.setattr(infer, "DEFAULT_MODEL_DIR", str(table_dir))
+    monkeypatch.setattr(infer, "USE_CASCADE", False)
+    monkeypatch.setattr(infer, "_cascade", None)
+    infer._answer_cache.clear()
+
+    for backend, expected in (("torch", "table"), ("torch-int8", "model")):
+        monkeypatch.setattr(infer, "_model_wrapper", PHQ9ModelWrapper(table_dir, backend=backend))
+        monkeypatch.setattr(infer, "_table", None)
+        assert infer.predict_from_answers(SAMPLE_ANSWERS)["source"] == expected
+        # punctuation keeps a canonical-looking answer away from the table
+        punctuated = SAMPLE_ANSWERS[:8] + [SAMPLE_ANSWERS[8] + "."]
+        assert infer.predict_from_answers(punctuated)["source"] == "model"
+        infer._answer_cache.clear()
+
+
+def test_table_hits_do_not_load_the_model(table_dir, monkeypatch):
+    _write_meta(table_dir, scorer=scorer_key())
+    monkeypatch.setattr(infer, "DEFAULT_MODEL_DIR", str(table_dir))
+    monkeypatch.setattr(infer, "DEFAULT_BACKEND", "torch")
+    monkeypatch.setattr(infer, "DEFAULT_EARLY_EXIT_ENTROPY", None)
+    monkeypatch.setattr(infer, "ENCODING", "concat")
+    monkeypatch.setattr(infer, "USE_CASCADE", False)
+    for name in ("_model_wrapper", "_pool_config", "_table", "_cascade", "_hierarchical"):
+        monkeypatch.setattr(infer, name, None)
+
+    def no_model(*args, **kwargs):
+        raise AssertionError("the model was loaded for a table hit")
+
+    monkeypatch.setattr(infer, "PHQ9ModelWrapper", no_model)
+    monkeypatch.setattr(infer, "InferencePool", no_model)
+    assert infer.predict_from_answers(SAMPLE_ANSWERS)["source"] == "table"
+    assert infer._model_wrapper is None
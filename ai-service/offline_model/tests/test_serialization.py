@@ -0,0 +1,100 @@
+# tests/test_serialization.py
+import json
+
+import numpy as np
+import pytest
+
+import serialization
+from serialization import ALL_FIELDS, COMPACT_FIELDS, dumps, parse_fields, shape_result
+
+
+def _result():
+    probs = np.array([[0.1, 0.2, 0.3, 0.25, 0.15]], dtype=np.float32)[0]
+    return {
+        "label_idx": np.int64(2),
+        "label": "moderate",
+        "probs": probs,
+        "topk": [(np.int64(2), np.float32(0.3), "moderate")],
+        "q9_suicidal_flag": np.bool_(False),
+        "source": "model",
+        "concat_text": "Not at all [SEP] Several days",
+        "raw_model_output": {"logits": np.arange(10, dtype=np.float32).reshape(2, 5).T[0], "probs": probs},
+    }
+
+
+@pytest.fixture(params=["orjson", "json"])
+def json_path(request, monkeypatch):
+    """Run a test against both encoders."""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(serialization, "orjson", None)
+    return request.param
+
+
+@pytest.mark.parametrize("fields,expected", [
+    (None, None),
+    ("", None),
+    ([], None),
+    ("label, probs,", ("label", "probs")),
+    (["label_idx", "source"], ("label_idx", "source")),
+])
+def test_parse_fields(fields, expected):
+    assert parse_fields(fields) == expected
+
+
+@pytest.mark.parametrize("fields", ["label,bogus", ["probs", "logits"], [1]])
+def test_parse_fields_rejects_unknown_names(fields):
+    with pytest.raises(ValueError, match="Unknown field"):
+        parse_fields(fields)
+
+
+def test_parse_fields_rejects_other_types():
+    with pytest.raises(ValueError, match="list or a comma-separated string"):
+        parse_fields({"label": True})
+
+
+def test_shape_result_modes():
+    result = _result()
+    assert tuple(shape_result(result)) == ALL_FIELDS
+    assert tuple(shape_result(result, compact=True)) == COMPACT_FIELDS
+    # explicit fields win over compact and keep the requested order
+    assert tuple(shape_result(result, fields=("source", "label"), compact=True)) == ("source", "label")
+    del result["concat_text"]
+    assert "concat_text" not in shape_result(result, fields=("label", "concat_text"))
+
+
+def test_dumps_numpy_values(json_path):
+    body = dumps({"success": True, "result": shape_result(_result())})
+    assert isinstance(body, bytes)
+    out = json.loads(body)["result"]
+    assert out["label_idx"] == 2
+    assert out["q9_suicidal_flag"] is False
+    assert out["probs"] == pytest.approx([0.1, 0.2, 0.3, 0.25, 0.15])
+    assert out["topk"][0][0] == 2 and out["topk"][0][1] == pytest.approx(0.3)
+    assert out["raw_model_output"]["logits"] == [0.0, 5.0]   # a non-contiguous view
+
+
+def _rounded(obj):
+    # orjson writes float32 with float32 precision, the stdlib encoder widens it to float64
+    if isinstance(obj, float):
+        return round(obj, 6)
+    if isinstance(obj, list):
+        return [_rounded(v) for v in obj]
+    if isinstance(obj, dict):
+        return {k: _rounded(v) for k, v in obj.items()}
+    return obj
+
+
+def test_dumps_is_the_same_on_both_paths(monkeypatch):
+    pytest.importorskip("orjson")
+    payload = {"result": shape_result(_result()), "half": np.float16(0.5),
+               "halves": np.ones(2, dtype=np.float16), 3: "int key"}
+    fast = json.loads(dumps(payload))
+    monkeypatch.setattr(serialization, "orjson", None)
+    assert _rounded(json.loads(dumps(payload))) == _rounded(fast)
+
+
+def test_dumps_rejects_unknown_objects(json_path):
+    with pytest.raises(TypeError):
+        dumps({"x": object()})
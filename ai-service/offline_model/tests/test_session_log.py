@@ -0,0 +1,52 @@
+# tests/test_session_log.py
+import csv
+from concurrent.futures import ThreadPoolExecutor
+
+from conftest import SAMPLE_ANSWERS
+from session_log import SessionLogger, make_record
+
+RESULT = {"label": "Mild", "label_idx": 1, "probs": [0.1, 0.7, 0.1, 0.05, 0.05], "q9_suicidal_flag": False,
+          "source": "model"}
+
+
+def _logger(log_dir, **kw) -> SessionLogger:
+    # long interval: only flush() / close() write
+    return SessionLogger("sessions", fmt="csv", log_dir=str(log_dir), flush_interval_s=60, **kw)
+
+
+def test_flush_returns_once_the_record_is_on_disk(tmp_path):
+    logger = _logger(tmp_path)
+    try:
+        assert logger.log(make_record(RESULT, SAMPLE_ANSWERS, "20", "Male"))
+        assert logger.flush()
+        with open(logger.path, newline="") as f:
+            rows = list(csv.reader(f))
+        assert len(rows) == 2 and rows[1][3:12] == SAMPLE_ANSWERS
+        assert logger.stats()["written"] == 1
+    finally:
+        logger.close()
+
+
+def test_flush_reports_a_failed_write(tmp_path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("")
+    logger = _logger(blocker)
+    try:
+        assert logger.log(make_record(RESULT, SAMPLE_ANSWERS))
+        assert logger.flush() is False
+        assert logger.stats()["errors"] == 1
+    finally:
+        logger.close()
+
+
+def test_counters_are_exact_under_threads(tmp_path):
+    logger = _logger(tmp_path, max_buffer_rows=50)
+    record = make_record(RESULT, SAMPLE_ANSWERS)
+    try:
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda _: logger.log(record), range(1600)))
+        assert logger.flush()
+        stats = logger.stats()
+        assert stats["logged"] == stats["written"] == 1600 and stats["dropped"] == 0
+    finally:
+        logger.close()
@@ -0,0 +1,29 @@
+# tests/test_train.py
+import train
+from conftest import SAMPLE_ANSWERS
+
+HEADER = "Age,Gender,Q1,Q2,Q3,Q4,Q5,Q6,Q7,Q8,Q9,PHQ-9 Total Score,Depression Level"
+
+
+def test_short_last_accumulation_group_is_stepped_and_export_stays_in_the_run(tiny_model_dir, tmp_path):
+    levels = list(train.LABEL_MAP.values())
+    rows = [HEADER] + [f"20,Male,{','.join(SAMPLE_ANSWERS)},3,{levels[i % len(levels)]}" for i in range(20)]
+    csv_path = tmp_path / "phq9.csv"
+    csv_path.write_text("\n".join(rows) + "\n")
+    run_dir = tmp_path / "run"
+
+    assert train.main([
+        "all", "--csv", str(csv_path), "--data-dir", str(tmp_path / "data"), "--cache-dir", str(tmp_path / "cache"),
+        "--run-dir", str(run_dir), "--tokenizer-dir", str(tiny_model_dir), "--init", str(tiny_model_dir),
+        "--val-fraction", "0.2", "--epochs", "2", "--batch-size", "2", "--grad-accum", "3", "--num-workers", "0",
+        "--checkpoint-every", "0", "--seed", "1",
+    ]) == 0
+
+    train_rows = sum(1 for _ in open(tmp_path / "data" / "train.jsonl"))
+    batches = -(-train_rows // 2)
+    assert batches % 3, "the split should leave a short last accumulation group"
+    state = train._load_latest_checkpoint(run_dir)["state"]
+    assert state["step"] == 2 * -(-batches // 3)
+
+    assert (run_dir / "export" / "label_map.pkl").exists()
+    assert not (tiny_model_dir / "best").exists()
@@ -0,0 +1,106 @@
+# tests/test_worker_pool.py
+import subprocess
+import sys
+import textwrap
+
+from conftest import SAMPLE_ANSWERS, SRC_DIR
+
+
+def _run(code: str, env, tmp_path, name="script.py", timeout=300):
+    # run as a __main__ script: spawned pool workers re-import __main__, as with `python app.py`
+    script = tmp_path / name
+    script.write_text(textwrap.dedent(code))
+    return subprocess.run([sys.executable, str(script)], cwd=str(SRC_DIR), env=env,
+                          capture_output=True, text=True, timeout=timeout)
+
+
+def test_import_app_with_workers_starts_nothing(src_env, tmp_path):
+    src_env["PHQ9_INFERENCE_WORKERS"] = "2"
+    proc = _run("""
+        import multiprocessing as mp
+        import app, infer
+        assert infer._model_wrapper is None
+        assert not mp.active_children()
+        print(infer.worker_pool_stats())
+    """, src_env, tmp_path)
+    assert proc.returncode == 0, proc.stderr
+    assert "'started': False" in proc.stdout
+
+
+def test_preload_with_workers_is_refused(src_env, tmp_path):
+    src_env["PHQ9_INFERENCE_WORKERS"] = "1"
+    src_env["PHQ9_PRELOAD"] = "1"
+    proc = _run("import app\n", src_env, tmp_path)
+    assert proc.returncode != 0
+    assert "cannot be combined with PHQ9_PRELOAD" in proc.stderr
+
+
+def test_pool_serves_from_main_script_and_is_not_shared_after_fork(src_env, tiny_model_dir, tmp_path):
+    src_env.update(PHQ9_INFERENCE_WORKERS="1", PHQ9_USE_PREDICTION_TABLE="0", PHQ9_USE_CASCADE="0")
+    proc = _run(f"""
+        import os
+        import app, infer, preload
+        from worker_pool import InferencePool
+
+        def main():
+            infer.enable_worker_pool(1, model_dir={str(tiny_model_dir)!r}, pin_cores=False)
+            answers = {SAMPLE_ANSWERS!r}
+            first = infer.predict_from_answers(answers)
+            pool = infer._model_wrapper
+            assert isinstance(pool, InferencePool)
+
+            pid = os.fork()
+            if pid == 0:
+                ok = infer._model_wrapper is None
+                try:
+                    pool.predict_raw(["x"])
+                    ok = False
+                except RuntimeError:
+                    pass
+                os._exit(0 if ok else 1)
+            _, status = os.waitpid(pid, 0)
+            assert os.WEXITSTATUS(status) == 0, "forked child could use the parent's pool"
+
+            # the parent's pool still works after the child went away
+            infer._answer_cache.clear()
+            second = infer.predict_from_answers(answers)
+            assert first["label_idx"] == second["label_idx"]
+            infer._model_wrapper.close()
+            print("ok", first["source"])
+
+        if __name__ == "__main__":
+            main()
+    """, src_env, tmp_path)
+    assert proc.returncode == 0, proc.stdout + proc.stderr
+    assert "ok model" in proc.stdout
+
+
+def test_dead_worker_fails_fast_and_restarts_in_the_background(tiny_model_dir):
+    import time
+
+    from worker_pool import InferencePool
+
+    pool = InferencePool(2, model_dir=str(tiny_model_dir), backend="torch", pin_cores=False, health_interval=3600)
+    try:
+        dead = pool._workers[0]
+        dead.process.kill()
+        dead.process.join(5)
+
+        started = time.monotonic()
+        try:
+            pool.predict_raw(["x"])   # the idle queue hands out worker 0 first
+            assert False, "a request to the dead worker should fail"
+        except RuntimeError as e:
+            assert "worker 0" in str(e)
+        assert time.monotonic() - started < 1.0, "the request waited for the restart"
+
+        # the other worker keeps serving while worker 0 reloads the model
+        assert len(pool.predict_raw(["Not at all ||| Several days"], top_k=1)) == 1
+
+        deadline = time.monotonic() + 120
+        while pool.stats()["idle"] < 2 and time.monotonic() < deadline:
+            time.sleep(0.2)
+        assert dead.restarts == 1 and dead.process.is_alive()
+        assert len(pool.predict_raw(["a", "b"], top_k=1)) == 2
+    finally:
+        pool.close()
@@ -7,16 +7,28 @@ except Exception:
 
 import os
 import json
-from flask import Flask, request, jsonify, session, render_template
+import queue
+import threading
+import time
+from flask import Flask, Response, request, jsonify, session, render_template, stream_with_context
 from typing import Dict
 from phq_items import PHQ_ITEMS, ANSWER_HINTS
 from scoring import score_to_level, level_label
-from llm_client import generate_conversational_question, map_reply_to_score, generate_soothing_and_question
+from llm_client import (generate_conversational_question, map_reply_to_score, generate_soothing_and_question,
+                        generate_soothing, process_turn, stream_soothing, submit, get_score_cache, fallback_soothing,
+                        breaker, scheduler, TURN_MODE)
+from resilience import TURN_BUDGET_S, remaining, turn_budget
+from question_pool import get_pool
+from reply_mapper import map_reply_locally, has_risk_language, LOCAL_CONFIDENCE_THRESHOLD
+from metrics import REGISTRY, render as render_metrics, timed
 
 app = Flask(__name__, static_folder="../static", template_folder="../templates")
 app.secret_key = os.environ.get("FLASK_SECRET", "dev-secret-change-me")
 SESSION_KEY = "phq_state"
 
+REQUEST_SECONDS = REGISTRY.histogram("phq_chat_request_seconds", "End-to-end request latency.", ("endpoint",))
+ANSWER_SOURCES = REGISTRY.counter("phq_chat_answer_source_total", "How /answer replies were scored.", ("source",))
+
 def init_session():
     session[SESSION_KEY] = {"index": 0, "answers": []}
 
@@ -39,10 +51,21 @@ def start():
 
 @app.route("/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok"}), 200
+    return jsonify({"status": "ok", "score_cache": get_score_cache().stats(), "llm_circuit": breaker.stats(),
+                    "llm_quota": scheduler.stats()}), 200
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
 
 @app.route("/answer", methods=["POST"])
 def answer():
+    # every LLM call of the turn shares one latency budget (LLM_TURN_BUDGET_S)
+    with timed(histogram=REQUEST_SECONDS, endpoint="/answer"), turn_budget():
+        return _answer()
+
+def _begin_turn():
+    """Validate the request; returns (state, idx, user_reply) or an error response tuple."""
     data = request.get_json(silent=True) or {}
     user_reply = (data.get("reply") or "").strip()
     if not user_reply:
@@ -56,16 +79,40 @@ def answer():
     if idx >= len(PHQ_ITEMS):
         clear_state()
         return jsonify({"error": "assessment already completed. Call /start to begin again."}), 400
+    return state, idx, user_reply
 
-    question_text = PHQ_ITEMS[idx]
-
-    # Map reply to score
-    try:
-        mapped = map_reply_to_score(question_text, user_reply)
-    except Exception as e:
-        app.logger.error("map_reply_to_score failed: %s", e)
-        mapped = {"answer": 0, "risk": "none", "explain": "LLM mapping failed", "raw": ""}
+def _score_reply(idx: int, user_reply: str, turn_future=None) -> Dict:
+    """
+    Map reply to score: confident local matches skip the LLM round trip.
+    Q9 and any reply with self-harm language always go to the LLM for the risk decision.
+    `turn_future` is a pending process_turn call (combined mode) that also carries the score.
+    """
+    with timed("local_map"):
+        local = map_reply_locally(user_reply)
+    risky = has_risk_language(user_reply)
+    if idx != 8 and not risky and local["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD:
+        mapped = {"answer": local["answer"], "risk": "none",
+                  "explain": f"matched locally ({local['method']})", "raw": "", "source": "local"}
+    else:
+        try:
+            if turn_future is not None:
+                turn = turn_future.result(timeout=remaining())
+                mapped = {k: turn[k] for k in ("answer", "risk", "explain", "raw")}
+            else:
+                mapped = map_reply_to_score(PHQ_ITEMS[idx], user_reply, item_idx=idx)
+            mapped["source"] = "cache" if mapped.pop("cached", False) else "llm"
+        except Exception as e:
+            app.logger.error("LLM scoring failed: %s", e)
+            mapped = {"answer": local["answer"] or 0, "risk": "suicidal" if risky else "none",
+                      "explain": "LLM mapping failed", "raw": "", "source": "fallback"}
+    ANSWER_SOURCES.inc(source=mapped["source"])
+    return mapped
 
+def _record_answer(state: Dict, idx: int, mapped: Dict):
+    """
+    Save the answer and advance the session. Returns the final payload when the
+    assessment ends here (escalation or last item), else None.
+    """
     answer_val = int(mapped.get("answer", 0))
     risk_flag = (mapped.get("risk", "none") == "suicidal")
 
@@ -83,7 +130,7 @@ def answer():
             "If you are in immediate danger, please call your local emergency number right now. "
             "Would you like me to provide crisis helpline numbers or connect you to someone?"
         )
-        return jsonify({"status": "escalate", "message": escalate_message, "level": 5, "score": total}), 200
+        return {"status": "escalate", "message": escalate_message, "level": 5, "score": total}
 
     # If finished after saving this answer, return final summary with a gentle closing message
     if state["index"] >= len(PHQ_ITEMS):
@@ -98,18 +145,52 @@ def answer():
         }
         clear_state()
         closing = "Thanks for sharing — that was helpful. Based on this quick screening, I've summarized your responses above. Would you like resources or next steps?"
-        return jsonify({"status": "finished", "summary": summary, "bot_message": closing, "mapped": mapped}), 200
+        return {"status": "finished", "summary": summary, "bot_message": closing, "mapped": mapped}
+    return None
+
+def _start_soothing(user_reply: str, next_q_text: str, pooled_question):
+    """Submit the soothing (+ next question) call for the next item."""
+    if pooled_question:
+        return submit(generate_soothing, user_reply)
+    return submit(generate_soothing_and_question, next_q_text, user_reply)
+
+def _answer():
+    begun = _begin_turn()
+    if len(begun) == 2:
+        return begun
+    state, idx, user_reply = begun
+    question_text = PHQ_ITEMS[idx]
+
+    # The soothing reply + next question depend only on the reply and the next item, not on
+    # the score, so start that call now and let it run while the reply is being scored.
+    # In combined mode the same single call also returns the score. A pre-written phrasing
+    # from the question pool means the LLM only has to write the soothing line.
+    # Replies with self-harm language wait for the risk decision before any cosmetic call.
+    next_q_text = PHQ_ITEMS[idx + 1] if idx + 1 < len(PHQ_ITEMS) else None
+    pooled_question = get_pool().get(idx + 1) if next_q_text else None
+    combined = TURN_MODE == "combined" and next_q_text is not None
+    soothing_future = None
+    if combined:
+        soothing_future = submit(process_turn, question_text, user_reply, None if pooled_question else next_q_text)
+    elif next_q_text and not has_risk_language(user_reply):
+        soothing_future = _start_soothing(user_reply, next_q_text, pooled_question)
 
-    # Otherwise, generate soothing reply + next question in one LLM call
-    next_q_text = PHQ_ITEMS[state["index"]]  # next question to ask
+    mapped = _score_reply(idx, user_reply, soothing_future if combined else None)
+    final = _record_answer(state, idx, mapped)
+    if final is not None:
+        return jsonify(final), 200
+    if soothing_future is None:
+        soothing_future = _start_soothing(user_reply, next_q_text, pooled_question)
+
+    # Otherwise, collect the soothing reply + next question started above
     try:
-        so_and_next = generate_soothing_and_question(next_q_text, user_reply)
+        so_and_next = soothing_future.result(timeout=remaining())
         soothing = so_and_next.get("soothing") or "I hear you — thank you for telling me that."
-        next_question = so_and_next.get("next_question") or (f"{next_q_text} ({ANSWER_HINTS})")
+        next_question = pooled_question or so_and_next.get("next_question") or (f"{next_q_text} ({ANSWER_HINTS})")
     except Exception as e:
-        app.logger.error("generate_soothing_and_question failed: %s", e)
-        soothing = "I hear you — thanks for sharing."
-        next_question = f"{next_q_text} ({ANSWER_HINTS})"
+        app.logger.error("soothing / next question call failed: %s", e)
+        soothing = fallback_soothing(user_reply)
+        next_question = pooled_question or f"{next_q_text} ({ANSWER_HINTS})"
 
     return jsonify({
         "status": "continue",
@@ -119,5 +200,96 @@ def answer():
         "mapped": mapped
     }), 200
 
+def _sse(event: str, payload: Dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+@app.route("/answer/stream", methods=["POST"])
+def answer_stream():
+    """
+    Streaming /answer (Server-Sent Events). Same request body; the response is
+      event: soothing   data: {"delta": "..."}   (repeated, as the text is generated)
+      event: done       data: <the JSON /answer would return>
+    The soothing text starts generating while the reply is scored, and the session is
+    updated before the stream starts (the cookie is sent with the headers).
+    """
+    begun = _begin_turn()
+    if len(begun) == 2:
+        return begun
+    state, idx, user_reply = begun
+    started = time.perf_counter()
+    # the body is generated after this function returns, so the stream keeps its own deadline
+    deadline = time.monotonic() + TURN_BUDGET_S
+
+    next_q_text = PHQ_ITEMS[idx + 1] if idx + 1 < len(PHQ_ITEMS) else None
+    pooled_question = get_pool().get(idx + 1) if next_q_text else None
+    chunks, question_future = None, None
+    stop_stream = threading.Event()   # set when the reader gives up or the client goes away
+    with turn_budget():
+        if next_q_text:
+            chunks = queue.Queue()
+            submit(_pump_stream, stream_soothing(user_reply), chunks, deadline, stop_stream)
+            if not pooled_question:
+                question_future = submit(generate_conversational_question, next_q_text)
+
+        mapped = _score_reply(idx, user_reply)
+    final = _record_answer(state, idx, mapped)
+
+    def events():
+        try:
+            yield from _events()
+        finally:
+            stop_stream.set()
+
+    def _events():
+        if final is not None:
+            yield _sse("done", final)
+            return
+        soothing = []
+        while True:
+            try:
+                item = chunks.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                app.logger.error("soothing stream ran past the turn budget")
+                break
+            if item is None:
+                break
+            if isinstance(item, Exception):
+                app.logger.error("soothing stream failed: %s", item)
+                break
+            soothing.append(item)
+            yield _sse("soothing", {"delta": item})
+        text = "".join(soothing).strip()
+        if not text:
+            text = fallback_soothing(user_reply)
+            yield _sse("soothing", {"delta": text})
+        try:
+            next_question = pooled_question or question_future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except Exception as e:
+            app.logger.error("generate_conversational_question failed: %s", e)
+            next_question = f"{next_q_text} ({ANSWER_HINTS})"
+        yield _sse("done", {"status": "continue", "soothing": text, "question": next_question,
+                            "index": state["index"], "mapped": mapped})
+        REQUEST_SECONDS.observe(time.perf_counter() - started, endpoint="/answer/stream")
+
+    return Response(stream_with_context(events()), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _pump_stream(stream, out: "queue.Queue", deadline: float, stop: threading.Event):
+    """
+    Move text chunks from an LLM stream into a queue (None = end, Exception = failure).
+    Stops at `deadline` (time.monotonic()) or once `stop` is set, and closes the stream so
+    the provider request ends with it; a stalled read is bounded by the stream's own timeout.
+    """
+    try:
+        for text in stream:
+            if stop.is_set() or time.monotonic() >= deadline:
+                break
+            out.put(text)
+    except Exception as e:
+        out.put(e)
+    finally:
+        stream.close()
+        out.put(None)
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=os.environ.get("FLASK_ENV") == "development")
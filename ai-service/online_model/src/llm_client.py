@@ -2,57 +2,313 @@
 import os
 import json
 import re
-from typing import Dict
-from google import genai
+import time
+import contextvars
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, Optional
+from metrics import REGISTRY, timed
+from reply_mapper import normalize_reply
+from score_cache import ScoreCache, make_key, CACHE_PATH
+from llm_transport import LLMReply, PromptPrefix, make_transport
+from resilience import (BudgetExceededError, CircuitBreaker, CircuitOpenError, LatencyTracker,
+                        remaining)
+from scheduler import HIGH, LOW, NORMAL, LLMScheduler, Throttled
 
-API_KEY = os.environ.get("GEMINI_API_KEY")
-if not API_KEY:
-    raise RuntimeError("Missing GEMINI_API_KEY in environment/.env")
-
-client = genai.Client(api_key=API_KEY)
+# Gemini by default; LLM_TRANSPORT=fake|record|replay for load tests and offline runs (see llm_transport.py).
+transport = make_transport()
 MODEL = os.environ.get("GEMINI_MODEL", "gemini-1.5-pro")
 
+# "split": score and soothing/next question are separate calls (run concurrently);
+# "combined": one schema-constrained call per turn returns all of it (process_turn).
+TURN_MODE = os.environ.get("LLM_TURN_MODE", "split")
+
+# Independent calls of one turn (scoring, soothing) run side by side on this pool.
+LLM_MAX_CONCURRENCY = int(os.environ.get("LLM_MAX_CONCURRENCY", 8))
+_executor = ThreadPoolExecutor(max_workers=LLM_MAX_CONCURRENCY, thread_name_prefix="llm")
+# The transport requests themselves (including hedges) run here, so a caller can stop
+# waiting when its budget runs out; an abandoned request ends at the transport's own timeout.
+_io_executor = ThreadPoolExecutor(max_workers=2 * LLM_MAX_CONCURRENCY, thread_name_prefix="llm-io")
+# Upper bound for a single call made outside a turn budget (e.g. question_pool.py --generate).
+LLM_CALL_TIMEOUT_S = float(os.environ.get("LLM_CALL_TIMEOUT_S", 20.0))
+
+breaker = CircuitBreaker()
+# shared quota (LLM_RATE_PER_MIN); scoring carries the risk decision and goes first
+scheduler = LLMScheduler()
+CALL_PRIORITY = {"score": HIGH, "turn": HIGH, "soothing": NORMAL, "soothing_stream": NORMAL, "question": LOW}
+_latencies: Dict[str, LatencyTracker] = {}
+
+_score_cache = None
+
+LLM_SECONDS = REGISTRY.histogram("phq_chat_llm_call_seconds", "Gemini generate_content latency.", ("call",))
+LLM_CALLS = REGISTRY.counter("phq_chat_llm_calls_total", "Gemini calls by outcome.", ("call", "outcome"))
+LLM_FIRST_TOKEN_SECONDS = REGISTRY.histogram("phq_chat_llm_first_token_seconds", "Time to the first streamed chunk.", ("call",))
+LLM_TOKENS = REGISTRY.counter("phq_chat_llm_tokens_total", "LLM tokens by kind (prompt includes cached).", ("call", "kind"))
+LLM_PROMPT_TOKENS = REGISTRY.histogram("phq_chat_llm_prompt_tokens", "Input tokens per LLM call.", ("call",),
+                                       buckets=(32, 64, 128, 256, 512, 1024, 2048, 4096))
+LLM_HEDGES = REGISTRY.counter("phq_chat_llm_hedged_total", "Calls that were slow enough to send a hedge request.", ("call",))
+LLM_PARSE_FAILURES = REGISTRY.counter("phq_chat_llm_parse_failures_total", "LLM replies that were not valid JSON.", ("call",))
+
+# Response schemas (structured output): the model is constrained to emit exactly this JSON.
+SCORE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "answer": {"type": "INTEGER", "minimum": 0, "maximum": 3},
+        "risk": {"type": "STRING", "enum": ["none", "suicidal"]},
+        "explain": {"type": "STRING"},
+    },
+    "required": ["answer", "risk", "explain"],
+}
+SOOTHING_ONLY_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"soothing": {"type": "STRING"}},
+    "required": ["soothing"],
+}
+SOOTHING_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {"soothing": {"type": "STRING"}, "next_question": {"type": "STRING"}},
+    "required": ["soothing", "next_question"],
+}
+TURN_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {**SCORE_SCHEMA["properties"], **SOOTHING_SCHEMA["properties"]},
+    "required": SCORE_SCHEMA["required"] + SOOTHING_SCHEMA["required"],
+    "propertyOrdering": ["answer", "risk", "explain", "soothing", "next_question"],
+}
+# turn without 'next_question', for when the question comes from the phrasing pool
+TURN_NO_QUESTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {**SCORE_SCHEMA["properties"], **SOOTHING_ONLY_SCHEMA["properties"]},
+    "required": SCORE_SCHEMA["required"] + SOOTHING_ONLY_SCHEMA["required"],
+    "propertyOrdering": ["answer", "risk", "explain", "soothing"],
+}
+_SOOTHING_RULES = (
+    "1-2 short sentences (15-30 words max) that acknowledge and reflect the user's feelings using\n"
+    "   some of their words. Use phrases like 'That sounds...', 'I can hear...', 'It makes sense you feel...'.\n"
+    "   Avoid 'I hear you' alone and do not give medical advice."
+)
+
+# ----------------------
+# prompts: static, versioned prefixes (cached provider-side, see llm_transport) + short
+# per-call suffixes. Output format is enforced by the response schemas, so the prefixes
+# only carry the task rules. Bump a version whenever its text changes.
+# ----------------------
+QUESTION_PREFIX = PromptPrefix("question", "v1", (
+    "You are a compassionate conversational assistant. "
+    "Rewrite the PHQ-style item you are given into a short, informal one-or-two sentence question "
+    "that encourages a natural reply. Add short answer hints in parentheses such as "
+    "'(rare / a few days / most days / nearly every day)'. Keep it empathetic and <= 2 sentences."
+))
+SCORE_PREFIX = PromptPrefix("score", "v2", (
+    "You are a calm, precise assistant scoring one reply to a PHQ-9 question. "
+    "Map the user's reply about frequency to 'answer': "
+    "0=not at all, 1=several days, 2=more than half the days, 3=nearly every day. "
+    "If the reply indicates suicidal ideation, self-harm intent, or plans, set 'risk' to 'suicidal', else 'none'. "
+    "'explain': a short reason."
+))
+SOOTHING_QUESTION_PREFIX = PromptPrefix("soothing_question", "v2", """\
+You are an empathic, concise counselor-style assistant. Given the user's last message, write:
+ - 'soothing': 1-2 short sentences (15-30 words max) that acknowledge and reflect the user's feelings using some of their words.
+   Use phrases like 'That sounds...', 'I can hear...', 'It makes sense you feel...' Avoid 'I hear you' alone.
+ - 'next_question': a gentle, casual PHQ-style follow-up question (<=2 sentences) that asks the next PHQ item and includes answer hints like '(rare / a few days / most days / nearly every day)'.
+Be specific but brief; avoid giving medical advice or instructions here.
+
+Examples:
+User: 'I'm exhausted and I can't focus on anything lately.'
+JSON: {"soothing":"That sounds really exhausting — it's understandable you're finding it hard to focus right now.", "next_question":"Lately, how often have you had trouble concentrating (rare / a few days / most days / nearly every day)?"}
+
+User: 'I feel hopeless — nothing seems to help.'
+JSON: {"soothing":"I’m so sorry — feeling hopeless can be overwhelming. You’re not alone in this.", "next_question":"Over the last two weeks, how often have you felt down, depressed, or hopeless (rare / a few days / most days / nearly every day)?"}""")
+SOOTHING_PREFIX = PromptPrefix("soothing", "v1", (
+    "You are an empathic, concise counselor-style assistant.\n"
+    f"Write 'soothing' for the user's message: {_SOOTHING_RULES}"
+))
+SOOTHING_TEXT_PREFIX = PromptPrefix("soothing_text", "v1", (
+    "You are an empathic, concise counselor-style assistant.\n"
+    f"Reply to the user's message with the soothing line only (plain text, no JSON, no quotes): {_SOOTHING_RULES}"
+))
+_TURN_RULES = (
+    "You are a calm, empathic, concise counselor-style assistant running a PHQ-9 screening.\n"
+    "Given the current question and the user's reply, write:\n"
+    " - 'answer': the reply mapped to 0=not at all, 1=several days, 2=more than half the days, 3=nearly every day.\n"
+    " - 'risk': 'suicidal' if the reply indicates suicidal ideation, self-harm intent or plans, else 'none'.\n"
+    " - 'explain': a short reason for 'answer'.\n"
+    f" - 'soothing': {_SOOTHING_RULES}\n"
+)
+TURN_PREFIX = PromptPrefix("turn", "v1", _TURN_RULES + (
+    " - 'next_question': a gentle, casual phrasing (<=2 sentences) of the next PHQ item that includes answer\n"
+    "   hints like '(rare / a few days / most days / nearly every day)'."
+))
+TURN_NO_QUESTION_PREFIX = PromptPrefix("turn_no_question", "v1", _TURN_RULES.rstrip())
+
+# scoring prompt version; cached scores (score_cache) from any other version are dropped
+SCORE_PROMPT_VERSION = f"{SCORE_PREFIX.name}-{SCORE_PREFIX.version}"
+
+
+def _generate(call: str, prefix: PromptPrefix, prompt: str, temperature: float, max_output_tokens: int,
+              schema: Dict = None) -> str:
+    """
+    Single place that asks the LLM transport for a reply to the static `prefix` + dynamic `prompt`;
+    `call` names the caller in the metrics, `schema` requests JSON output. Raises CircuitOpenError without calling out while the provider
+    is failing, Throttled when the quota scheduler turns the call away, and BudgetExceededError
+    when the turn budget runs out first.
+    """
+    config = {"temperature": temperature, "max_output_tokens": max_output_tokens}
+    if schema is not None:
+        config.update(response_mime_type="application/json", response_schema=schema)
+    priority = CALL_PRIORITY.get(call, NORMAL)
+    probe = _admit(call, priority)
+    left = remaining()
+    timeout = LLM_CALL_TIMEOUT_S if left is None else min(left, LLM_CALL_TIMEOUT_S)
+    if timeout <= 0:
+        # the turn ran out of time before anything was sent: no verdict on the provider
+        if probe:
+            breaker.cancel_probe()
+        LLM_CALLS.inc(call=call, outcome="no_budget")
+        raise BudgetExceededError(f"{call}: no time left in the turn budget")
+    tracker = _latencies.setdefault(call, LatencyTracker())
+    started = time.perf_counter()
+    try:
+        reply = _hedged(call, lambda: transport.generate(MODEL, prompt, config, prefix), timeout, tracker.hedge_delay(),
+                       may_hedge=lambda: scheduler.try_acquire(priority))
+    except BudgetExceededError:
+        # sent, but the provider did not answer in time
+        breaker.record(False)
+        LLM_CALLS.inc(call=call, outcome="timeout")
+        raise
+    except Exception:
+        breaker.record(False)
+        LLM_CALLS.inc(call=call, outcome="error")
+        raise
+    finally:
+        LLM_SECONDS.observe(time.perf_counter() - started, call=call)
+    tracker.observe(time.perf_counter() - started)
+    breaker.record(True)
+    LLM_CALLS.inc(call=call, outcome="ok")
+    _record_usage(call, reply)
+    return (reply.text or "").strip()
+
+
+def _record_usage(call: str, reply: LLMReply):
+    LLM_TOKENS.inc(reply.prompt_tokens, call=call, kind="prompt")
+    LLM_TOKENS.inc(reply.cached_tokens, call=call, kind="cached")
+    LLM_TOKENS.inc(reply.output_tokens, call=call, kind="output")
+    LLM_PROMPT_TOKENS.observe(reply.prompt_tokens, call=call)
+
+
+def _admit(call: str, priority: int) -> bool:
+    """
+    Circuit check first (fails fast without spending quota), then quota. If the call was
+    the half-open probe and is throttled, the probe slot is released so the circuit can
+    still close. Returns whether the call is the probe.
+    """
+    try:
+        probe = breaker.allow()
+    except CircuitOpenError:
+        LLM_CALLS.inc(call=call, outcome="circuit_open")
+        raise
+    try:
+        _acquire(call, priority)
+    except Throttled:
+        if probe:
+            breaker.cancel_probe()
+        raise
+    return probe
+
+
+def _acquire(call: str, priority: int):
+    """Wait for quota; raises Throttled (counted as outcome="throttled") when there is none in time."""
+    left = remaining()
+    try:
+        scheduler.acquire(priority, timeout=left)
+    except Throttled:
+        LLM_CALLS.inc(call=call, outcome="throttled")
+        raise
+
+
+def _hedged(call: str, request: Callable[[], LLMReply], timeout: float, hedge_delay: Optional[float],
+            may_hedge: Callable[[], bool] = lambda: True) -> LLMReply:
+    """
+    Run `request` and wait at most `timeout` seconds. If it is still running after
+    `hedge_delay` (a high percentile of recent latencies) and `may_hedge()` grants the
+    quota for it, send the same request again and take whichever answers first.
+    """
+    if timeout <= 0:
+        raise BudgetExceededError(f"{call}: no time left in the turn budget")
+    deadline = time.monotonic() + timeout
+    pending = {_io_executor.submit(request)}
+    if hedge_delay is not None and hedge_delay < timeout:
+        done, pending = wait(pending, timeout=hedge_delay)
+        if done:
+            pending = done
+        elif may_hedge():
+            LLM_HEDGES.inc(call=call)
+            pending.add(_io_executor.submit(request))
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for fut in done:
+            if fut.exception() is None:
+                return fut.result()
+            error = fut.exception()
+    if error is not None and not pending:
+        raise error
+    raise BudgetExceededError(f"{call}: no reply within {timeout:.1f}s")
+
+
+def submit(fn, *args, **kwargs) -> Future:
+    """
+    Start an llm_client call in the background. Future.cancel() drops a call
+    that has not started yet; a call already in flight finishes and is ignored.
+    """
+    # run in a copy of the caller's context so the turn budget applies inside the call too
+    return _executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+def fallback_soothing(user_reply: str) -> str:
+    """Local soothing line that mirrors the user's words, for when the LLM is unavailable."""
+    mirror = " ".join(user_reply.split()[:12])
+    if not mirror:
+        return "I hear you — thanks for sharing."
+    return f"It sounds like {mirror}... — that must be really hard. Thanks for sharing."
+
 def generate_conversational_question(question_text: str) -> str:
-    prompt = (
-        "You are a compassionate conversational assistant. "
-        "Rewrite the PHQ-style item below into a short, informal one-or-two sentence question "
-        "that encourages a natural reply. Add short answer hints in parentheses such as "
-        "'(rare / a few days / most days / nearly every day)'. Keep it empathetic and <= 2 sentences.\n\n"
-        f"PHQ item: {question_text}"
-    )
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=[{"role": "user", "parts": [prompt]}],
-        config={"temperature": 0.7, "max_output_tokens": 120}
-    )
-    return resp.text.strip()
-
-def map_reply_to_score(question_text: str, user_reply: str) -> Dict:
-    system_prompt = (
-        "You are a calm, precise assistant. You MUST return valid JSON only (no extra commentary). "
-        "The JSON must have keys: 'answer' (int 0..3), 'risk' ('none' or 'suicidal'), 'explain' (short text). "
-        "Map the user's reply about frequency to the integer where: "
-        "0=not at all, 1=several days, 2=more than half the days, 3=nearly every day. "
-        "If the reply indicates suicidal ideation, self-harm intent, or plans, set 'risk' to 'suicidal'.\n\n"
-        f"Question: {question_text}\nReply: {user_reply}"
-    )
-
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=[{"role": "user", "parts": [system_prompt]}],
-        config={"temperature": 0.0, "max_output_tokens": 160}
-    )
-    raw = resp.text.strip()
+    return _generate("question", QUESTION_PREFIX, f"PHQ item: {question_text}", temperature=0.7, max_output_tokens=120)
+
+def get_score_cache() -> ScoreCache:
+    global _score_cache
+    if _score_cache is None:
+        _score_cache = ScoreCache(CACHE_PATH, SCORE_PROMPT_VERSION)
+    return _score_cache
+
+def map_reply_to_score(question_text: str, user_reply: str, item_idx: Optional[int] = None) -> Dict:
+    """
+    Score a reply with Gemini. Results that parsed cleanly are cached per
+    (item, normalized reply, model, prompt version); a cached result comes back
+    with "cached": True.
+    """
+    cache = get_score_cache()
+    key = make_key(item_idx if item_idx is not None else question_text, normalize_reply(user_reply),
+                   MODEL, SCORE_PROMPT_VERSION)
+    hit = cache.get(key)
+    if hit is not None:
+        return {**hit, "cached": True}
+
+    prompt = f"Question: {question_text}\nReply: {user_reply}"
+    raw = _generate("score", SCORE_PREFIX, prompt, temperature=0.0, max_output_tokens=160, schema=SCORE_SCHEMA)
     parsed = {"answer": 0, "risk": "none", "explain": "", "raw": raw}
     try:
-        data = json.loads(raw)
+        with timed("json_parse"):
+            data = json.loads(raw)
         parsed.update({
             "answer": int(data.get("answer", 0)),
             "risk": data.get("risk", "none"),
             "explain": data.get("explain", "")
         })
         parsed["answer"] = max(0, min(3, parsed["answer"]))
+        cache.put(key, parsed)
     except Exception:
+        LLM_PARSE_FAILURES.inc(call="score")
         m = re.search(r"\b([0-3])\b", raw)
         parsed["answer"] = int(m.group(1)) if m else 0
         low = raw.lower()
@@ -68,53 +324,107 @@ def generate_soothing_and_question(question_text: str, user_reply: str) -> Dict:
     Returns:
       { "soothing": "<empathic reply referencing user>", "next_question": "<phq question with hints>", "raw": "<llm raw>" }
     """
-    # Few-shot examples to teach reflection + brevity
-    prompt = f"""
-You are an empathic, concise counselor-style assistant.
-Given the user's last message, produce JSON ONLY with keys 'soothing' and 'next_question'.
-Rules:
- - 'soothing': 1-2 short sentences (15-30 words max) that acknowledge and reflect the user's feelings using some of their words.
-   Use phrases like 'That sounds...', 'I can hear...', 'It makes sense you feel...' Avoid 'I hear you' alone.
- - 'next_question': a gentle, casual PHQ-style follow-up question (<=2 sentences) that asks the next PHQ item and includes answer hints like '(rare / a few days / most days / nearly every day)'.
- - Be specific but brief; avoid giving medical advice or instructions here.
- - Do NOT include anything else besides the JSON object.
-
-Examples:
-User: 'I'm exhausted and I can't focus on anything lately.'
-JSON: {{"soothing":"That sounds really exhausting — it's understandable you're finding it hard to focus right now.", "next_question":"Lately, how often have you had trouble concentrating (rare / a few days / most days / nearly every day)?"}}
-
-User: 'I feel hopeless — nothing seems to help.'
-JSON: {{"soothing":"I’m so sorry — feeling hopeless can be overwhelming. You’re not alone in this.", "next_question":"Over the last two weeks, how often have you felt down, depressed, or hopeless (rare / a few days / most days / nearly every day)?"}}
-
-Now produce a JSON for the following input.
-User: "{user_reply}"
-Next PHQ item (to phrase casually): "{question_text}"
-Return JSON only.
-"""
-
-    resp = client.models.generate_content(
-        model=MODEL,
-        contents=[{"role": "user", "parts": [prompt]}],
-        config={"temperature": 0.6, "max_output_tokens": 220}
-    )
-    out = resp.text.strip()
+    # rules + few-shot examples live in SOOTHING_QUESTION_PREFIX
+    prompt = f'User: "{user_reply}"\nNext PHQ item (to phrase casually): "{question_text}"'
+    out = _generate("soothing", SOOTHING_QUESTION_PREFIX, prompt, temperature=0.6, max_output_tokens=220,
+                    schema=SOOTHING_SCHEMA)
 
     # extract JSON robustly
     json_start = out.find("{")
     json_text = out[json_start:] if json_start != -1 else out
     try:
-        data = json.loads(json_text)
+        with timed("json_parse"):
+            data = json.loads(json_text)
         soothing = data.get("soothing", "").strip()
         next_q = data.get("next_question", "").strip()
         return {"soothing": soothing, "next_question": next_q, "raw": out}
     except Exception:
+        LLM_PARSE_FAILURES.inc(call="soothing")
         # fallback: build a reflective soothing reply using the user's words
-        # pick a short part of the user's text to mirror (first 6–12 words)
-        mirror = " ".join(user_reply.split()[:12])
-        soothing = f"It sounds like {mirror}... — that must be really hard. Thanks for sharing."
+        soothing = fallback_soothing(user_reply)
         # Use the existing helper to create a proper next question
         try:
             next_q = generate_conversational_question(question_text)
         except Exception:
             next_q = f"{question_text} (Please answer: rare / a few days / most days / nearly every day)"
         return {"soothing": soothing, "next_question": next_q, "raw": out}
+
+def generate_soothing(user_reply: str) -> Dict:
+    """
+    Soothing line only, for turns whose next question comes from the phrasing pool.
+    Returns {"soothing": str, "raw": str}; soothing is "" if the reply could not be parsed.
+    """
+    raw = _generate("soothing", SOOTHING_PREFIX, f'User: "{user_reply}"', temperature=0.6, max_output_tokens=120,
+                    schema=SOOTHING_ONLY_SCHEMA)
+    try:
+        with timed("json_parse"):
+            soothing = str(json.loads(raw).get("soothing", "")).strip()
+    except (ValueError, AttributeError):
+        LLM_PARSE_FAILURES.inc(call="soothing")
+        soothing = ""
+    return {"soothing": soothing, "raw": raw}
+
+def stream_soothing(user_reply: str) -> Iterator[str]:
+    """Soothing line as plain text, yielded chunk by chunk as Gemini generates it (for /answer/stream)."""
+    probe = _admit("soothing_stream", CALL_PRIORITY["soothing_stream"])
+    left = remaining()
+    started = time.perf_counter()
+    first = True
+    stream = None
+    try:
+        # bounded by the turn budget, so a hung provider stream cannot hold its thread indefinitely
+        stream = transport.generate_stream(MODEL, f'User: "{user_reply}"', {"temperature": 0.6, "max_output_tokens": 120},
+                                           SOOTHING_TEXT_PREFIX,
+                                           on_usage=lambda usage: _record_usage("soothing_stream", usage),
+                                           timeout=LLM_CALL_TIMEOUT_S if left is None else min(left, LLM_CALL_TIMEOUT_S))
+        for text in stream:
+            if not text:
+                continue
+            if first:
+                LLM_FIRST_TOKEN_SECONDS.observe(time.perf_counter() - started, call="soothing_stream")
+                first = False
+            yield text
+    except GeneratorExit:
+        # the reader stopped early (turn deadline / client gone): no verdict on the provider
+        if probe:
+            breaker.cancel_probe()
+        raise
+    except Exception:
+        breaker.record(False)
+        LLM_CALLS.inc(call="soothing_stream", outcome="error")
+        raise
+    finally:
+        if stream is not None:
+            stream.close()
+    breaker.record(True)
+    LLM_CALLS.inc(call="soothing_stream", outcome="ok")
+    LLM_SECONDS.observe(time.perf_counter() - started, call="soothing_stream")
+
+def process_turn(question_text: str, user_reply: str, next_question_text: Optional[str]) -> Dict:
+    """
+    Combined mode: score the reply and write the soothing line (+ the next question, unless
+    next_question_text is None because it comes from the phrasing pool) in one
+    schema-constrained call. Returns {answer, risk, explain, soothing, next_question, raw};
+    raises ValueError if the reply still is not valid JSON (callers fall back, no retry).
+    """
+    prompt = f'Current question: "{question_text}"\nUser reply: "{user_reply}"'
+    if next_question_text is not None:
+        prompt += f'\nNext PHQ item (to phrase casually): "{next_question_text}"'
+        prefix, schema = TURN_PREFIX, TURN_SCHEMA
+    else:
+        prefix, schema = TURN_NO_QUESTION_PREFIX, TURN_NO_QUESTION_SCHEMA
+    raw = _generate("turn", prefix, prompt, temperature=0.4, max_output_tokens=320, schema=schema)
+    try:
+        with timed("json_parse"):
+            data = json.loads(raw)
+        return {
+            "answer": max(0, min(3, int(data["answer"]))),
+            "risk": "suicidal" if data.get("risk") == "suicidal" else "none",
+            "explain": str(data.get("explain", "")),
+            "soothing": str(data.get("soothing", "")).strip(),
+            "next_question": str(data.get("next_question", "")).strip(),
+            "raw": raw,
+        }
+    except (ValueError, KeyError, TypeError) as e:
+        LLM_PARSE_FAILURES.inc(call="turn")
+        raise ValueError(f"unparseable turn response: {e}") from e
@@ -0,0 +1,355 @@
+# src/llm_transport.py
+"""
+Pluggable transport behind llm_client: everything that actually produces LLM text.
+
+LLM_TRANSPORT selects one:
+  gemini   the live API (default); GEMINI_API_KEY is checked on the first call, not at import
+  fake     local deterministic stand-in: schema-valid JSON / plain text with no network,
+           optional latency (LLM_FAKE_LATENCY) and faults (LLM_FAKE_ERROR_RATE, LLM_FAKE_BAD_JSON_RATE)
+  record   calls Gemini and appends every (request, reply) pair to LLM_REPLAY_PATH
+  replay   answers from LLM_REPLAY_PATH only; an unrecorded request raises LookupError
+
+Latency specs (seconds): "0.3" or "fixed:0.3", "uniform:0.1,0.6", "lognormal:0.4,0.5" (median, sigma).
+
+Every request is a static, versioned PromptPrefix (instructions, few-shot examples)
+plus a short dynamic prompt. The Gemini transport uploads each prefix once as
+provider-side cached content (LLM_CONTEXT_CACHE, refreshed every
+LLM_CONTEXT_CACHE_TTL_S) and references it by name; when the provider will not cache
+it (e.g. a prefix below the model's minimum cacheable size) the prefix is sent as
+system_instruction instead. Replies carry token counts (LLMReply).
+"""
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import Future
+from typing import Callable, Dict, Iterator, NamedTuple, Optional
+
+TRANSPORTS = ("gemini", "fake", "record", "replay")
+TRANSPORT = os.environ.get("LLM_TRANSPORT", "gemini")
+FAKE_LATENCY = os.environ.get("LLM_FAKE_LATENCY", "0")
+FAKE_ERROR_RATE = float(os.environ.get("LLM_FAKE_ERROR_RATE", 0.0))
+FAKE_BAD_JSON_RATE = float(os.environ.get("LLM_FAKE_BAD_JSON_RATE", 0.0))
+FAKE_SEED = os.environ.get("LLM_FAKE_SEED")
+REPLAY_PATH = os.environ.get("LLM_REPLAY_PATH", "llm_replay.jsonl")
+# HTTP timeout of a single Gemini request; also ends requests the caller stopped waiting for
+HTTP_TIMEOUT_S = float(os.environ.get("LLM_HTTP_TIMEOUT_S", 30.0))
+CONTEXT_CACHE = os.environ.get("LLM_CONTEXT_CACHE", "1") != "0"
+CONTEXT_CACHE_TTL_S = int(os.environ.get("LLM_CONTEXT_CACHE_TTL_S", 3600))
+
+
+class PromptPrefix(NamedTuple):
+    """Static part of a prompt; bump `version` whenever `text` changes."""
+    name: str
+    version: str
+    text: str
+
+
+class LLMReply(NamedTuple):
+    text: str
+    prompt_tokens: int = 0    # all input tokens, including cached ones
+    cached_tokens: int = 0    # input tokens served from the provider-side cache
+    output_tokens: int = 0
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for transports without real usage data."""
+    return max(1, len(text) // 4) if text else 0
+
+
+class TransportError(RuntimeError):
+    """Failure injected by the fake transport (stands in for a Gemini API error)."""
+
+
+class GeminiTransport:
+    name = "gemini"
+
+    def __init__(self, api_key: Optional[str] = None):
+        self._api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()           # client creation only
+        self._caches_lock = threading.Lock()    # guards _caches / _creating; never held across a network call
+        self._caches: Dict[tuple, tuple] = {}   # (model, prefix name, version) -> (cache name or None, renew at)
+        self._creating: Dict[tuple, Future] = {}   # key -> creation in flight (single flight per key)
+
+    @property
+    def client(self):
+        # One client for the whole process: its HTTP connection pool is shared by every thread.
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    api_key = self._api_key or os.environ.get("GEMINI_API_KEY")
+                    if not api_key:
+                        raise RuntimeError("Missing GEMINI_API_KEY in environment/.env")
+                    from google import genai
+                    self._client = genai.Client(api_key=api_key,
+                                                http_options={"timeout": int(HTTP_TIMEOUT_S * 1000)})
+        return self._client
+
+    def _cached_content(self, model: str, prefix: PromptPrefix) -> Optional[str]:
+        """
+        Name of the provider-side cache holding `prefix`, created on first use; None if unavailable.
+        One caller per key creates (or renews) it; the others wait for that result, or keep using
+        the previous name while a renewal is in flight. A failure is remembered just like a
+        success, so a prefix the provider will not cache is not retried on every request.
+        """
+        key = (model, prefix.name, prefix.version)
+        with self._caches_lock:
+            entry = self._caches.get(key)
+            if entry is not None and entry[1] > time.monotonic():
+                return entry[0]
+            pending = self._creating.get(key)
+            owner = pending is None
+            if owner:
+                pending = self._creating[key] = Future()
+        if not owner:
+            return entry[0] if entry is not None else pending.result()
+
+        try:
+            cache = self.client.caches.create(model=model, config={
+                "system_instruction": prefix.text,
+                "display_name": f"phq-{prefix.name}-{prefix.version}",
+                "ttl": f"{CONTEXT_CACHE_TTL_S}s",
+            })
+            name = cache.name
+        except Exception as e:
+            if entry is None:
+                print(f"[llm] no context cache for prompt '{prefix.name}' ({e}); sending it as system_instruction")
+            name = None
+        with self._caches_lock:
+            # renew a minute before the provider drops it; a failed attempt is retried after the same TTL
+            self._caches[key] = (name, time.monotonic() + max(60, CONTEXT_CACHE_TTL_S - 60))
+            del self._creating[key]
+        pending.set_result(name)
+        return name
+
+    def _config(self, model: str, config: Dict, prefix: Optional[PromptPrefix]) -> Dict:
+        if prefix is None:
+            return config
+        name = self._cached_content(model, prefix) if CONTEXT_CACHE else None
+        if name:
+            return {**config, "cached_content": name}
+        return {**config, "system_instruction": prefix.text}
+
+    @staticmethod
+    def _usage(text: str, usage) -> LLMReply:
+        if usage is None:
+            return LLMReply(text)
+        return LLMReply(text, usage.prompt_token_count or 0, usage.cached_content_token_count or 0,
+                        usage.candidates_token_count or 0)
+
+    def generate(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None) -> LLMReply:
+        resp = self.client.models.generate_content(
+            model=model,
+            contents=[{"role": "user", "parts": [prompt]}],
+            config=self._config(model, config, prefix)
+        )
+        return self._usage(resp.text, getattr(resp, "usage_metadata", None))
+
+    def generate_stream(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None,
+                        on_usage: Callable[[LLMReply], None] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        config = self._config(model, config, prefix)
+        if timeout is not None:
+            # the caller's deadline, if tighter than the client-wide HTTP timeout
+            config = {**config, "http_options": {"timeout": max(1, int(min(timeout, HTTP_TIMEOUT_S) * 1000))}}
+        stream = self.client.models.generate_content_stream(
+            model=model,
+            contents=[{"role": "user", "parts": [prompt]}],
+            config=config
+        )
+        usage = None
+        try:
+            for chunk in stream:
+                usage = getattr(chunk, "usage_metadata", None) or usage
+                if chunk.text:
+                    yield chunk.text
+        finally:
+            # closing this generator early (reader gone) also closes the HTTP response
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+        if on_usage is not None:
+            on_usage(self._usage("", usage))
+
+
+# ----------------------
+# fake
+# ----------------------
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """Latency spec -> sampler(rng) returning seconds."""
+    kind, _, params = (spec or "0").partition(":")
+    if not params:
+        kind, params = "fixed", kind
+    try:
+        values = [float(v) for v in params.split(",")]
+        if kind == "fixed" and len(values) == 1:
+            return lambda rng: values[0]
+        if kind == "uniform" and len(values) == 2:
+            return lambda rng: rng.uniform(values[0], values[1])
+        if kind == "lognormal" and len(values) == 2:
+            return lambda rng: rng.lognormvariate(math.log(values[0]), values[1])
+    except ValueError:
+        pass
+    raise ValueError(f"Bad latency spec '{spec}'. Use 'fixed:S', 'uniform:LO,HI' or 'lognormal:MEDIAN,SIGMA'.")
+
+
+# the labels llm_client puts in front of the user's reply: "Reply:" (scoring),
+# "User:" (soothing) and "User reply:" (combined turns)
+_REPLY_RE = re.compile(r'^(?:User reply|Reply|User): "?(.*?)"?\s*$', flags=re.MULTILINE)
+_FAKE_TEXT = {
+    "soothing": "That sounds really hard — thank you for telling me how it has been.",
+    "next_question": "Lately, how often has this been on your mind (rare / a few days / most days / nearly every day)?",
+    "explain": "fake transport",
+}
+
+
+class FakeTransport:
+    """
+    Deterministic stand-in: the same prompt always gives the same reply. JSON
+    replies follow the requested response_schema; the score is a hash of the
+    user's reply and 'risk' uses the local self-harm pattern.
+    """
+    name = "fake"
+
+    def __init__(self, latency: str = FAKE_LATENCY, error_rate: float = FAKE_ERROR_RATE,
+                 bad_json_rate: float = FAKE_BAD_JSON_RATE, seed: Optional[str] = FAKE_SEED):
+        self._sample_latency = parse_latency(latency)
+        self.error_rate = error_rate
+        self.bad_json_rate = bad_json_rate
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def _draw(self):
+        with self._rng_lock:
+            return self._sample_latency(self._rng), self._rng.random(), self._rng.random()
+
+    def _reply(self, prompt: str, config: Dict, prefix: Optional[PromptPrefix], bad_json: bool) -> str:
+        schema = config.get("response_schema")
+        if schema is None:
+            instructions = (prefix.text if prefix else "") + prompt
+            return _FAKE_TEXT["soothing"] if "soothing" in instructions else _FAKE_TEXT["next_question"]
+        from reply_mapper import has_risk_language
+        replies = _REPLY_RE.findall(prompt)
+        user_reply = replies[-1] if replies else prompt
+        digest = int(hashlib.sha256(user_reply.encode("utf-8")).hexdigest(), 16)
+        out = {}
+        for key, spec in schema["properties"].items():
+            if key == "risk":
+                out[key] = "suicidal" if has_risk_language(user_reply) else "none"
+            elif spec["type"] == "INTEGER":
+                lo, hi = spec.get("minimum", 0), spec.get("maximum", 3)
+                out[key] = lo + digest % (hi - lo + 1)
+            else:
+                out[key] = _FAKE_TEXT.get(key, "")
+        text = json.dumps(out, ensure_ascii=False)
+        return text[: len(text) // 2] if bad_json else text
+
+    @staticmethod
+    def _usage(prompt: str, prefix: Optional[PromptPrefix], text: str) -> LLMReply:
+        return LLMReply(text, estimate_tokens((prefix.text if prefix else "") + prompt), 0, estimate_tokens(text))
+
+    def generate(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None) -> LLMReply:
+        delay, fault, bad = self._draw()
+        time.sleep(delay)
+        if fault < self.error_rate:
+            raise TransportError("injected fault")
+        return self._usage(prompt, prefix, self._reply(prompt, config, prefix, bad < self.bad_json_rate))
+
+    def generate_stream(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None,
+                        on_usage: Callable[[LLMReply], None] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        delay, fault, _ = self._draw()
+        text = self._reply(prompt, config, prefix, False)
+        words = text.split(" ")
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for i, word in enumerate(words):
+            time.sleep(delay / len(words))
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"stream ran past its {timeout:.1f}s timeout")
+            if i == len(words) // 2 and fault < self.error_rate:
+                raise TransportError("injected fault")
+            yield word if i == len(words) - 1 else word + " "
+        if on_usage is not None:
+            on_usage(self._usage(prompt, prefix, ""))
+
+
+# ----------------------
+# record / replay
+# ----------------------
+def request_key(model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None) -> str:
+    prefix_id = [prefix.name, prefix.version] if prefix else None
+    raw = json.dumps([model, prefix_id, prompt, config], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class RecordTransport:
+    """Pass-through to another transport that appends every reply to a JSONL file."""
+    name = "record"
+
+    def __init__(self, inner, path: str = REPLAY_PATH):
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _save(self, key: str, reply: LLMReply):
+        line = json.dumps({"key": key, **reply._asdict()}, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def generate(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None) -> LLMReply:
+        reply = self.inner.generate(model, prompt, config, prefix)
+        self._save(request_key(model, prompt, config, prefix), reply)
+        return reply
+
+    def generate_stream(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None,
+                        on_usage: Callable[[LLMReply], None] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        chunks, usage = [], []
+        for chunk in self.inner.generate_stream(model, prompt, config, prefix, on_usage=usage.append, timeout=timeout):
+            chunks.append(chunk)
+            yield chunk
+        reply = (usage[0] if usage else LLMReply(""))._replace(text="".join(chunks))
+        self._save(request_key(model, prompt, config, prefix), reply)
+        if on_usage is not None:
+            on_usage(reply._replace(text=""))
+
+
+class ReplayTransport:
+    name = "replay"
+
+    def __init__(self, path: str = REPLAY_PATH):
+        self.path = path
+        self.replies: Dict[str, LLMReply] = {}
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    rec = json.loads(line)
+                    key = rec.pop("key")
+                    self.replies[key] = LLMReply(**rec)
+
+    def generate(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None) -> LLMReply:
+        try:
+            return self.replies[request_key(model, prompt, config, prefix)]
+        except KeyError:
+            raise LookupError(f"request not recorded in {self.path}") from None
+
+    def generate_stream(self, model: str, prompt: str, config: Dict, prefix: Optional[PromptPrefix] = None,
+                        on_usage: Callable[[LLMReply], None] = None, timeout: Optional[float] = None) -> Iterator[str]:
+        reply = self.generate(model, prompt, config, prefix)
+        yield reply.text
+        if on_usage is not None:
+            on_usage(reply._replace(text=""))
+
+
+def make_transport(name: str = TRANSPORT):
+    if name == "gemini":
+        return GeminiTransport()
+    if name == "fake":
+        return FakeTransport()
+    if name == "record":
+        return RecordTransport(GeminiTransport())
+    if name == "replay":
+        return ReplayTransport()
+    raise ValueError(f"Unknown LLM_TRANSPORT '{name}'. Choose one of: {', '.join(TRANSPORTS)}")
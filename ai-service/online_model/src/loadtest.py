@@ -0,0 +1,206 @@
+# src/loadtest.py
+"""
+Concurrent load test of the chat flow: many sessions of /start -> 9 x /answer.
+
+By default the Flask app runs in-process with LLM_TRANSPORT=fake, so no network
+or API quota is needed; shape the stand-in with LLM_FAKE_LATENCY /
+LLM_FAKE_ERROR_RATE (see llm_transport.py). --url drives a running server instead.
+Reports turns/s and per-turn latency percentiles, optionally saves them as JSON
+and compares against a saved baseline (exit 1 on a regression).
+
+Usage (from inside src/):
+  python loadtest.py --sessions 200 --concurrency 32 --latency lognormal:0.4,0.5
+  python loadtest.py --endpoint /answer/stream --output after.json --baseline before.json
+  python loadtest.py --url http://localhost:5000 --sessions 20 --concurrency 4
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from typing import Dict, List, Optional, Tuple
+
+# replies the local mapper scores on its own vs. replies that need the LLM
+LOCAL_REPLIES = ("not at all", "several days", "most days", "nearly every day", "twice a week", "never", "every day honestly")
+LLM_REPLIES = (
+    "honestly it's been a rough couple of weeks with exams",
+    "hard to say, it comes and goes depending on work",
+    "I guess more than I'd like to admit",
+    "not sure, maybe a bit more lately than before",
+)
+TURNS_PER_SESSION = 9
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = min(len(ordered) - 1, max(0, int(round(q / 100.0 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+# ----------------------
+# clients
+# ----------------------
+class _InProcessClient:
+    def __init__(self, flask_app):
+        self._client = flask_app.test_client()
+
+    def post(self, path: str, body: Optional[Dict]) -> Tuple[int, bytes]:
+        resp = self._client.post(path, json=body)
+        return resp.status_code, resp.get_data()
+
+
+class _HttpClient:
+    def __init__(self, base_url: str, timeout: float):
+        self._base = base_url.rstrip("/")
+        self._timeout = timeout
+        self._opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+    def post(self, path: str, body: Optional[Dict]) -> Tuple[int, bytes]:
+        req = urllib.request.Request(self._base + path, data=json.dumps(body or {}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"}, method="POST")
+        try:
+            with self._opener.open(req, timeout=self._timeout) as resp:
+                return resp.status, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def _final_payload(endpoint: str, data: bytes) -> Dict:
+    """The /answer JSON, or the 'done' event of an /answer/stream body."""
+    text = data.decode("utf-8")
+    if endpoint != "/answer/stream" or text.lstrip().startswith("{"):
+        return json.loads(text)
+    for frame in text.split("\n\n"):
+        if frame.startswith("event: done"):
+            return json.loads(frame.split("data: ", 1)[1])
+    raise ValueError("stream ended without a 'done' event")
+
+
+# ----------------------
+# driver
+# ----------------------
+def run_session(client, endpoint: str, rng: random.Random, llm_share: float) -> Dict:
+    turns, errors, sources = [], 0, Counter()
+    status, _ = client.post("/start", None)
+    if status != 200:
+        return {"turns": turns, "errors": 1, "sources": sources}
+    for _ in range(TURNS_PER_SESSION):
+        reply = rng.choice(LLM_REPLIES if rng.random() < llm_share else LOCAL_REPLIES)
+        started = time.perf_counter()
+        try:
+            status, data = client.post(endpoint, {"reply": reply})
+            payload = _final_payload(endpoint, data)
+        except (OSError, ValueError):
+            errors += 1
+            break
+        turns.append(time.perf_counter() - started)
+        if status != 200:
+            errors += 1
+            break
+        sources[(payload.get("mapped") or {}).get("source", "none")] += 1
+        if payload.get("status") != "continue":
+            break
+    return {"turns": turns, "errors": errors, "sources": sources}
+
+
+def run(args) -> Dict:
+    if args.url:
+        make_client = lambda: _HttpClient(args.url, args.timeout)
+    else:
+        os.environ.setdefault("LLM_TRANSPORT", "fake")
+        if args.latency is not None:
+            os.environ["LLM_FAKE_LATENCY"] = args.latency
+        if args.error_rate is not None:
+            os.environ["LLM_FAKE_ERROR_RATE"] = str(args.error_rate)
+        from app import app as flask_app
+        make_client = lambda: _InProcessClient(flask_app)
+
+    lock = threading.Lock()
+    latencies, sources = [], Counter()
+    totals = {"sessions": 0, "errors": 0}
+
+    def one(i: int):
+        result = run_session(make_client(), args.endpoint, random.Random(args.seed + i), args.llm_share)
+        with lock:
+            latencies.extend(result["turns"])
+            sources.update(result["sources"])
+            totals["sessions"] += 1
+            totals["errors"] += result["errors"]
+
+    print(f"[load] {args.sessions} sessions, concurrency {args.concurrency}, {args.endpoint} "
+          f"({'url ' + args.url if args.url else 'in-process, LLM_TRANSPORT=' + os.environ['LLM_TRANSPORT']})")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(one, range(args.sessions)))
+    elapsed = time.perf_counter() - started
+
+    ms = [s * 1000.0 for s in latencies]
+    return {
+        "sessions": totals["sessions"],
+        "turns": len(latencies),
+        "errors": totals["errors"],
+        "elapsed_s": round(elapsed, 3),
+        "turns_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+        "sources": dict(sources),
+        "config": {k: getattr(args, k) for k in ("endpoint", "concurrency", "llm_share", "latency", "error_rate", "url")},
+    }
+
+
+def compare(baseline: Dict, current: Dict, tolerance: float) -> int:
+    """Returns 1 if throughput dropped or p95 rose by more than `tolerance` (fraction)."""
+    regressions = 0
+    for key, worse in (("turns_per_s", lambda old, new: new < old * (1 - tolerance)),
+                       ("p95_ms", lambda old, new: new > old * (1 + tolerance))):
+        old, new = baseline[key], current[key]
+        flag = "  REGRESSION" if worse(old, new) else ""
+        regressions += bool(flag)
+        print(f"  {key:12s} {old:10.2f} -> {new:10.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test the online PHQ chat flow.")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--endpoint", default="/answer", choices=["/answer", "/answer/stream"])
+    parser.add_argument("--llm-share", type=float, default=0.5, help="fraction of replies that need the LLM to score")
+    parser.add_argument("--latency", default=None, help="fake transport latency spec (in-process only)")
+    parser.add_argument("--error-rate", type=float, default=None, help="fake transport fault rate (in-process only)")
+    parser.add_argument("--url", default=None, help="drive a running server instead of the in-process app")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="write the report as JSON")
+    parser.add_argument("--baseline", default=None, help="report JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.10)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    print(f"[load] {report['turns']} turns in {report['elapsed_s']:.1f}s = {report['turns_per_s']:.1f} turns/s, "
+          f"{report['errors']} errors")
+    print(f"[load] turn latency p50={report['p50_ms']:.1f}  p95={report['p95_ms']:.1f}  "
+          f"p99={report['p99_ms']:.1f}  max={report['max_ms']:.1f} ms")
+    print(f"[load] answer sources: {report['sources']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"[load] wrote {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            return compare(json.load(f), report, args.tolerance)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
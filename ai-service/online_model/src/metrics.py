@@ -0,0 +1,241 @@
+# src/metrics.py
+"""
+In-process latency histograms, counters and gauges, rendered in the Prometheus text
+format by GET /metrics.
+
+This module is kept identical in online_model/src and offline_model/src apart
+from the SERVICE block below: the two services are deployed separately and import
+their modules flat from src/, so there is no shared package to hold it.
+offline_model/tests/test_metrics.py fails if the copies drift, so change both.
+
+Stage timers are sampled (<ENV_PREFIX>METRICS_SAMPLE_RATE, default 1.0): a skipped
+sample costs one random() call, so the timers can stay on in production. With
+<ENV_PREFIX>METRICS_TRACEMALLOC=1 the scrape also reports Python heap usage and the
+top allocation sites (tracemalloc slows allocations down, so keep it off unless
+you are looking for a leak).
+
+Metrics are per process: with gunicorn workers (or the offline inference worker
+pool), each process reports its own numbers.
+"""
+import os
+import random
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+# ----------------------
+# SERVICE (the only lines that differ between the two copies)
+# ----------------------
+ENV_PREFIX = "PHQ_CHAT_"
+STAGE_METRIC = ("phq_chat_stage_seconds", "Time per chat stage (sampled).")
+
+# ----------------------
+# CONFIG
+# ----------------------
+SAMPLE_RATE = float(os.environ.get(ENV_PREFIX + "METRICS_SAMPLE_RATE", 1.0))
+MEMORY_SNAPSHOTS = os.environ.get(ENV_PREFIX + "METRICS_TRACEMALLOC", "0") == "1"
+TRACEMALLOC_TOP_N = 10
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_str(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = ()):
+        self.name, self.help, self.label_names = name, help, tuple(label_names)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_label_str(self.label_names, key)} {value:.17g}")
+        return lines
+
+
+class Gauge(Counter):
+    def set(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label_names: Sequence[str] = (), buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.name, self.help, self.label_names = name, help, tuple(label_names)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # key -> [bucket counts..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(n, "") for n in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {count}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_label_str(self.label_names, key, le)} {series[-1]}")
+                lines.append(f"{self.name}_sum{_label_str(self.label_names, key)} {series[-2]:.6f}")
+                lines.append(f"{self.name}_count{_label_str(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, help, label_names, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, label_names, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str, label_names: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, help, label_names)
+
+    def gauge(self, name: str, help: str, label_names: Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, help, label_names)
+
+    def histogram(self, name: str, help: str, label_names: Sequence[str] = (), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help, label_names, buckets=buckets)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return lines
+
+
+REGISTRY = Registry()
+STAGE_SECONDS = REGISTRY.histogram(*STAGE_METRIC, ("stage",))
+
+
+# ----------------------
+# timers
+# ----------------------
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram: Histogram, labels: dict):
+        self.histogram, self.labels = histogram, labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+        return False
+
+
+def timed(stage: str = None, histogram: Histogram = None, **labels):
+    """
+    `with timed("stage"): ...` records the block's duration in STAGE_SECONDS for a
+    SAMPLE_RATE fraction of calls; pass `histogram` and its labels to record elsewhere.
+    """
+    if SAMPLE_RATE < 1.0 and random.random() >= SAMPLE_RATE:
+        return _NULL_TIMER
+    if stage is not None:
+        labels["stage"] = stage
+    return _Timer(histogram or STAGE_SECONDS, labels)
+
+
+# ----------------------
+# process / memory gauges
+# ----------------------
+def _gauge(name: str, help: str, samples: List[Tuple[str, float]]) -> List[str]:
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} gauge"]
+    lines += [f"{name}{labels} {value:.17g}" for labels, value in samples]
+    return lines
+
+
+def _process_lines() -> List[str]:
+    lines = []
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        lines += _gauge("process_resident_memory_bytes", "Resident memory size in bytes.", [("", rss)])
+    except (OSError, ValueError, IndexError):
+        pass
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    max_rss *= 1 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB on Linux
+    lines += _gauge("process_max_resident_memory_bytes", "Peak resident memory size in bytes.", [("", max_rss)])
+    return lines
+
+
+def _tracemalloc_lines() -> List[str]:
+    if not tracemalloc.is_tracing():
+        return []
+    current, peak = tracemalloc.get_traced_memory()
+    lines = _gauge("python_traced_memory_bytes", "Python heap traced by tracemalloc.",
+                   [('{kind="current"}', current), ('{kind="peak"}', peak)])
+    top = tracemalloc.take_snapshot().statistics("lineno")[:TRACEMALLOC_TOP_N]
+    lines += _gauge("python_traced_memory_top_bytes", "Largest allocation sites (tracemalloc snapshot).",
+                    [('{site="%s"}' % _escape(f"{s.traceback[0].filename}:{s.traceback[0].lineno}"), s.size)
+                     for s in top])
+    return lines
+
+
+def start_memory_snapshots():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(1)
+
+
+if MEMORY_SNAPSHOTS:
+    start_memory_snapshots()
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    return "\n".join(REGISTRY.render() + _process_lines() + _tracemalloc_lines()) + "\n"
@@ -0,0 +1,93 @@
+# src/question_pool.py
+"""
+Pre-written phrasings of the nine PHQ items.
+
+The next question used to be rephrased by Gemini on every turn, although the
+items never change. The pool (question_pool.json, reviewed variants per item)
+is served with no LLM call, randomly or round-robin (QUESTION_POOL_STRATEGY),
+so the live model only writes the personalized soothing line.
+
+New candidates can be generated offline and reviewed before they go into the pool:
+  python question_pool.py --generate 5 --out candidates.json
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+from typing import Dict, List, Optional
+
+from phq_items import PHQ_ITEMS
+
+POOL_PATH = os.environ.get("QUESTION_POOL_PATH", os.path.join(os.path.dirname(__file__), "question_pool.json"))
+POOL_STRATEGY = os.environ.get("QUESTION_POOL_STRATEGY", "random")   # "random" | "round_robin" | "off"
+STRATEGIES = ("random", "round_robin", "off")
+if POOL_STRATEGY not in STRATEGIES:
+    # fail at startup, not on the first turn that reaches the pool
+    raise ValueError(f"Unknown QUESTION_POOL_STRATEGY '{POOL_STRATEGY}'. Choose one of: {', '.join(STRATEGIES)}")
+
+
+class QuestionPool:
+    def __init__(self, variants: Dict[int, List[str]], strategy: str = "random"):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Unknown question pool strategy '{strategy}'. Choose one of: {', '.join(STRATEGIES)}")
+        self.variants = {i: v for i, v in variants.items() if v}
+        self.strategy = strategy
+        self._cycles = {i: itertools.cycle(v) for i, v in self.variants.items()}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, path: str = POOL_PATH, strategy: str = POOL_STRATEGY) -> "QuestionPool":
+        """Missing or unreadable files give an empty pool (every get() returns None)."""
+        try:
+            with open(path, encoding="utf-8") as f:
+                items = json.load(f)["items"]
+            variants = {int(k): [str(q).strip() for q in v if str(q).strip()] for k, v in items.items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            print(f"[pool] cannot load {path} ({type(e).__name__}: {e}); the LLM will phrase every question")
+            variants = {}
+        else:
+            print(f"[pool] loaded {sum(map(len, variants.values()))} phrasing(s) for {len(variants)} item(s) from {path}")
+        return cls(variants, strategy)
+
+    def get(self, idx: int) -> Optional[str]:
+        """A phrasing of PHQ_ITEMS[idx], or None when the pool has none (or is switched off)."""
+        if self.strategy == "off" or idx not in self.variants:
+            return None
+        if self.strategy == "random":
+            return random.choice(self.variants[idx])
+        with self._lock:
+            return next(self._cycles[idx])
+
+
+_pool = None
+
+
+def get_pool() -> QuestionPool:
+    global _pool
+    if _pool is None:
+        _pool = QuestionPool.load()
+    return _pool
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Generate candidate PHQ question phrasings for review.")
+    parser.add_argument("--generate", type=int, required=True, metavar="N", help="candidates per item")
+    parser.add_argument("--out", default="question_pool.candidates.json")
+    args = parser.parse_args(argv)
+
+    from llm_client import generate_conversational_question
+    items = {}
+    for i, item in enumerate(PHQ_ITEMS):
+        items[str(i)] = sorted({generate_conversational_question(item) for _ in range(args.generate)})
+        print(f"[pool] item {i}: {len(items[str(i)])} candidate(s)")
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"version": 1, "items": items}, f, indent=2, ensure_ascii=False)
+    print(f"[pool] wrote {args.out}; review before copying into {POOL_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
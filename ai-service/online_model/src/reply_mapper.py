@@ -0,0 +1,168 @@
+# src/reply_mapper.py
+"""
+Local, deterministic reply -> PHQ score (0..3) mapper.
+
+Most replies are frequency phrases ("most days", "every day honestly", "3 days",
+"twice a week") that do not need an LLM. map_reply_locally() tries, in order:
+exact phrases, numeric / frequency patterns, phrases contained in the reply and
+fuzzy (typo-tolerant) matching, and returns a confidence for its answer. The app
+scores confident matches locally and only sends ambiguous replies to Gemini.
+"""
+import difflib
+import os
+import re
+from typing import Dict, Optional
+
+from phq_items import HINT_TO_SCORE
+
+# Replies at or above this confidence are scored without calling the LLM.
+LOCAL_CONFIDENCE_THRESHOLD = float(os.environ.get("LOCAL_MAPPER_THRESHOLD", 0.85))
+
+# More everyday ways of saying the four PHQ frequencies (on top of HINT_TO_SCORE).
+EXTRA_PHRASES = {
+    "no": 0, "nope": 0, "never": 0, "none": 0, "not really": 0, "not at all really": 0,
+    "rarely": 0, "hardly ever": 0, "not once": 0, "zero": 0, "nothing like that": 0,
+    "sometimes": 1, "occasionally": 1, "once in a while": 1, "some days": 1, "a couple of days": 1,
+    "a couple days": 1, "a few times": 1, "now and then": 1, "every now and then": 1, "a little": 1,
+    "often": 2, "frequently": 2, "most of the time": 2, "half the time": 2, "more often than not": 2,
+    "a lot": 2, "usually": 2, "more than half the time": 2,
+    "always": 3, "all the time": 3, "daily": 3, "everyday": 3, "every single day": 3, "constantly": 3,
+    "almost always": 3, "every night": 3, "pretty much every day": 3, "all day every day": 3,
+}
+PHRASE_TO_SCORE: Dict[str, int] = {**EXTRA_PHRASES, **HINT_TO_SCORE}
+# Bare negations / quantities are an answer only as the whole reply: inside a longer one
+# they usually are not about frequency ("no idea", "none of your business", "zero energy").
+# Next to a real frequency phrase they are ignored ("no, never"); on their own a contained
+# match stays below LOCAL_CONFIDENCE_THRESHOLD and the LLM decides.
+WHOLE_REPLY_ONLY = frozenset({"no", "nope", "none", "zero", "nothing like that"})
+_CONTAINED_NEGATION_CONFIDENCE = 0.5
+# longest first so "nearly every day" wins over "every day" when scanning a sentence
+_PHRASES_BY_LENGTH = sorted(PHRASE_TO_SCORE, key=len, reverse=True)
+
+_NUMBER_WORDS = {
+    "zero": 0, "no": 0, "one": 1, "once": 1, "two": 2, "twice": 2, "three": 3, "thrice": 3, "four": 4,
+    "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "a couple": 2, "a few": 3,
+}
+_NUM = r"\b(\d{1,2}|" + "|".join(sorted(map(re.escape, _NUMBER_WORDS), key=len, reverse=True)) + r")"
+# "3 days", "3 out of 14 days", "about five days"
+_DAYS_RE = re.compile(_NUM + r"\s*(?:out of (?:the last )?(?:14|fourteen)\s*)?days?\b")
+# "twice a week", "3 times per week", "4 days a week"
+_PER_WEEK_RE = re.compile(_NUM + r"\s*(?:times?|days?|nights?)?\s*(?:a|per|each|every)\s*week\b")
+# the PHQ-9 look-back window echoed from the question ("over the last 14 days"): not an answer
+_WINDOW_RE = re.compile(r"\b(?:last|past)\s+(?:(?:14|fourteen)\s+days?|(?:2|two)\s+weeks?)\b")
+_BARE_SCORE_RE = re.compile(r"^[0-3]$")
+_NEGATION_RE = re.compile(r"\b(not|never|no|don'?t|didn'?t|isn'?t|wasn'?t|hardly)\b")
+
+# obvious self-harm language: such replies always go to the LLM for the risk decision
+_RISK_RE = re.compile(
+    r"\b(kill myself|suicid(e|al)|end my life|end it all|want to die|hurt myself|self[- ]harm|cut myself|"
+    r"hang myself|better off dead)\b",
+    flags=re.IGNORECASE
+)
+
+
+def has_risk_language(reply: str) -> bool:
+    return bool(reply and _RISK_RE.search(reply))
+
+
+def normalize_reply(reply: str) -> str:
+    text = (reply or "").lower().replace("’", "'")
+    text = re.sub(r"[^a-z0-9' ]+", " ", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _days_to_score(days_in_two_weeks: float) -> int:
+    # PHQ-9 covers the last 2 weeks: 0 days / several (1-6) / more than half (7-11) / nearly every day (12-14)
+    if days_in_two_weeks <= 0:
+        return 0
+    if days_in_two_weeks < 7:
+        return 1
+    if days_in_two_weeks < 12:
+        return 2
+    return 3
+
+
+def _to_number(token: str) -> float:
+    return float(token) if token.isdigit() else float(_NUMBER_WORDS[token])
+
+
+def _result(answer: Optional[int], confidence: float, method: str) -> Dict:
+    return {"answer": answer, "confidence": round(confidence, 3), "method": method}
+
+
+def _scan_phrases(text: str):
+    """
+    Known phrases inside `text`, longest first. Returns (scores of frequency phrases,
+    scores of bare negations, the text with the matches cut out).
+    """
+    found, negations = [], []
+    remaining = f" {text} "
+    for phrase in _PHRASES_BY_LENGTH:
+        token = f" {phrase} "
+        if token in remaining:
+            (negations if phrase in WHOLE_REPLY_ONLY else found).append(PHRASE_TO_SCORE[phrase])
+            remaining = remaining.replace(token, " | ")
+    return found, negations, remaining
+
+
+def _numeric_match(text: str):
+    """First per-week / day-count match whose number is not the echoed look-back window."""
+    windows = [m.span() for m in _WINDOW_RE.finditer(text)]
+    for pattern, method, per_days in ((_PER_WEEK_RE, "per_week", 2), (_DAYS_RE, "days", 1)):
+        for m in pattern.finditer(text):
+            if not any(start <= m.start(1) < end for start, end in windows):
+                return m, method, per_days
+    return None, None, None
+
+
+def map_reply_locally(reply: str) -> Dict:
+    """
+    Returns {"answer": int 0..3 or None, "confidence": float 0..1, "method": str}.
+    `method` is one of: exact, digit, days, per_week, phrase, fuzzy, none.
+    """
+    text = normalize_reply(reply)
+    if not text:
+        return _result(None, 0.0, "none")
+
+    # 1) the whole reply is a known phrase
+    if text in PHRASE_TO_SCORE:
+        return _result(PHRASE_TO_SCORE[text], 1.0, "exact")
+
+    # 2) a bare 0..3 (the user answering with the score itself)
+    if _BARE_SCORE_RE.match(text):
+        return _result(int(text), 0.95, "digit")
+
+    # 3) numeric frequency patterns
+    m, method, per_days = _numeric_match(text)
+    if m:
+        answer = _days_to_score(min(14.0, _to_number(m.group(1)) * per_days))
+        found, negations, rest = _scan_phrases(text[:m.start()] + " | " + text[m.end():])
+        if any(score != answer for score in found):
+            return _result(answer, 0.3, method)  # "no days off, felt low most days"
+        if answer != 0 and (negations or _NEGATION_RE.search(rest)):
+            return _result(answer, 0.4, method)  # "not 3 days"
+        return _result(answer, 0.9, method)
+
+    # 4) known phrases inside a longer reply
+    found, negations, remaining = _scan_phrases(text)
+    only_negations = not found and bool(negations)
+    found = found or negations
+    if found:
+        words = len(text.split())
+        if len(set(found)) > 1:
+            return _result(max(found), 0.3, "phrase")  # conflicting frequencies - let the LLM decide
+        confidence = 0.9 if words <= 6 else 0.75
+        if _NEGATION_RE.search(remaining) and found[0] != 0:
+            confidence = 0.4  # "not every day", "I don't sleep most days" ...
+        if only_negations:
+            confidence = min(confidence, _CONTAINED_NEGATION_CONFIDENCE)
+        return _result(found[0], confidence, "phrase")
+
+    # 5) typo-tolerant match of the whole reply ("sevral days", "nearlly evry day")
+    match = difflib.get_close_matches(text, PHRASE_TO_SCORE.keys(), n=1, cutoff=0.8)
+    if match:
+        ratio = difflib.SequenceMatcher(None, text, match[0]).ratio()
+        return _result(PHRASE_TO_SCORE[match[0]], 0.9 * ratio, "fuzzy")
+
+    return _result(None, 0.0, "none")
@@ -0,0 +1,147 @@
+# src/resilience.py
+"""
+Time limits and failure handling for the LLM calls of a turn.
+
+  turn_budget()    per-turn deadline (LLM_TURN_BUDGET_S) kept in a contextvar; every
+                   LLM call of the turn, including ones submitted to the llm_client
+                   pool, waits at most remaining() seconds
+  LatencyTracker   recent call latencies; a call still running after their
+                   LLM_HEDGE_PERCENTILE is hedged with a second identical request
+  CircuitBreaker   opens when the error rate over LLM_BREAKER_WINDOW_S passes
+                   LLM_BREAKER_ERROR_RATE; while open, calls fail at once (CircuitOpenError)
+                   so the app uses its local fallbacks; after LLM_BREAKER_COOLDOWN_S one
+                   probe call decides whether it closes again
+"""
+import contextlib
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+TURN_BUDGET_S = float(os.environ.get("LLM_TURN_BUDGET_S", 8.0))
+HEDGE_PERCENTILE = float(os.environ.get("LLM_HEDGE_PERCENTILE", 95))   # 0 disables hedging
+HEDGE_MIN_SAMPLES = int(os.environ.get("LLM_HEDGE_MIN_SAMPLES", 20))
+BREAKER_ERROR_RATE = float(os.environ.get("LLM_BREAKER_ERROR_RATE", 0.5))
+BREAKER_MIN_CALLS = int(os.environ.get("LLM_BREAKER_MIN_CALLS", 10))
+BREAKER_WINDOW_S = float(os.environ.get("LLM_BREAKER_WINDOW_S", 30.0))
+BREAKER_COOLDOWN_S = float(os.environ.get("LLM_BREAKER_COOLDOWN_S", 15.0))
+
+_deadline: contextvars.ContextVar = contextvars.ContextVar("llm_deadline", default=None)
+
+
+class CircuitOpenError(RuntimeError):
+    """The LLM provider is failing; the call was not attempted."""
+
+
+class BudgetExceededError(TimeoutError):
+    """The turn's latency budget ran out before the LLM answered."""
+
+
+@contextlib.contextmanager
+def turn_budget(seconds: float = TURN_BUDGET_S):
+    """Set the deadline for LLM calls made in this block (a tighter outer deadline wins)."""
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left in the current turn budget (never negative), or None outside a turn."""
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class LatencyTracker:
+    def __init__(self, size: int = 200):
+        self._samples: "deque[float]" = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def hedge_delay(self, percentile: float = HEDGE_PERCENTILE, min_samples: int = HEDGE_MIN_SAMPLES) -> Optional[float]:
+        """Latency at `percentile` of recent calls, or None when hedging is off or there is too little data."""
+        with self._lock:
+            if percentile <= 0 or len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percentile / 100.0))]
+
+
+class CircuitBreaker:
+    def __init__(self, error_rate: float = BREAKER_ERROR_RATE, min_calls: int = BREAKER_MIN_CALLS,
+                 window_s: float = BREAKER_WINDOW_S, cooldown_s: float = BREAKER_COOLDOWN_S):
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.window_s = window_s
+        self.cooldown_s = cooldown_s
+        self._outcomes: "deque[tuple]" = deque()   # (monotonic time, ok)
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state(time.monotonic())
+
+    def _state(self, now: float) -> str:
+        if self._opened_at is None:
+            return "closed"
+        return "half_open" if now - self._opened_at >= self.cooldown_s else "open"
+
+    def allow(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go out now (one probe at a time when half open).
+        Returns True if this call is the half-open probe: its record() decides the state, or
+        cancel_probe() frees the slot if it never goes out.
+        """
+        with self._lock:
+            state = self._state(time.monotonic())
+            if state == "closed":
+                return False
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+        raise CircuitOpenError("LLM circuit open; using local fallback")
+
+    def cancel_probe(self):
+        """The probe granted by allow() was not sent (e.g. throttled); let the next call probe."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool):
+        now = time.monotonic()
+        with self._lock:
+            if self._opened_at is not None:
+                if not self._probing:
+                    return  # a call that started before the circuit opened
+                # result of the half-open probe
+                self._probing = False
+                if ok:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = now
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window_s:
+                self._outcomes.popleft()
+            failures = sum(1 for _, good in self._outcomes if not good)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.error_rate:
+                self._opened_at = now
+                self.trips += 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            failures = sum(1 for _, good in self._outcomes if not good)
+            return {"state": self._state(time.monotonic()), "trips": self.trips,
+                    "window_calls": len(self._outcomes), "window_failures": failures}
@@ -0,0 +1,149 @@
+# src/scheduler.py
+"""
+Process-wide admission for outgoing LLM requests.
+
+A token bucket (LLM_RATE_PER_MIN requests per minute, bursts up to LLM_RATE_BURST)
+is shared by every call; waiting requests are served strictly by priority:
+
+  HIGH    scoring (map_reply_to_score, combined turns): carries the Q9 risk decision
+  NORMAL  soothing lines
+  LOW     cosmetic rephrasing (generate_conversational_question)
+
+The last LLM_RESERVED_TOKENS tokens of the bucket are only handed to HIGH calls, so
+scoring never waits behind a burst of cheaper work. The queue is bounded
+(LLM_MAX_QUEUE); NORMAL / LOW requests are turned away earlier (at 1/2 and 1/4 of it)
+and LOW requests wait at most LLM_LOW_PRIORITY_MAX_WAIT_S. A turned-away request
+raises Throttled and the caller uses its template text instead.
+LLM_RATE_PER_MIN=0 (the default) disables rate limiting.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from metrics import REGISTRY
+
+HIGH, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = {HIGH: "high", NORMAL: "normal", LOW: "low"}
+
+RATE_PER_MIN = float(os.environ.get("LLM_RATE_PER_MIN", 0))
+RATE_BURST = int(os.environ.get("LLM_RATE_BURST", 10))
+RESERVED_TOKENS = float(os.environ.get("LLM_RESERVED_TOKENS", 2))
+MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 64))
+LOW_PRIORITY_MAX_WAIT_S = float(os.environ.get("LLM_LOW_PRIORITY_MAX_WAIT_S", 0.5))
+
+QUEUE_DEPTH = REGISTRY.gauge("phq_chat_llm_queue_depth", "LLM requests waiting for quota.", ("priority",))
+QUEUE_WAIT_SECONDS = REGISTRY.histogram("phq_chat_llm_queue_wait_seconds", "Time spent waiting for quota.", ("priority",))
+ADMISSIONS = REGISTRY.counter("phq_chat_llm_admission_total", "LLM requests by admission outcome.", ("priority", "outcome"))
+
+
+class Throttled(RuntimeError):
+    """No quota for this request right now; use the local / template fallback."""
+
+
+class TokenBucket:
+    def __init__(self, rate_per_s: float, burst: float, now: float):
+        self.rate = rate_per_s
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self._stamp = now
+
+    def refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def wait_time(self, need: float) -> float:
+        """Seconds until `need` tokens are available (0 if they are now)."""
+        return max(0.0, (need - self.tokens) / self.rate) if self.rate > 0 else float("inf")
+
+
+class LLMScheduler:
+    def __init__(self, rate_per_min: float = RATE_PER_MIN, burst: int = RATE_BURST,
+                 reserved: float = RESERVED_TOKENS, max_queue: int = MAX_QUEUE,
+                 low_max_wait_s: float = LOW_PRIORITY_MAX_WAIT_S,
+                 clock: Callable[[], float] = time.monotonic):
+        """`clock` is the time source for refills and deadlines (tests pass a fake one)."""
+        self.enabled = rate_per_min > 0
+        self.clock = clock
+        self.bucket = TokenBucket(rate_per_min / 60.0, burst, clock())
+        self.reserved = min(reserved, max(0.0, burst - 1))
+        self.max_queue = max_queue
+        self.low_max_wait_s = low_max_wait_s
+        self._waiting = []   # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _need(self, priority: int) -> float:
+        # tokens that must be in the bucket before this priority may take one
+        return 1.0 if priority == HIGH else 1.0 + self.reserved
+
+    def _queue_limit(self, priority: int) -> int:
+        return {HIGH: self.max_queue, NORMAL: self.max_queue // 2, LOW: self.max_queue // 4}[priority]
+
+    def _set_depth(self):
+        for p, name in PRIORITY_NAMES.items():
+            QUEUE_DEPTH.set(sum(1 for q, _ in self._waiting if q == p), priority=name)
+
+    def try_acquire(self, priority: int = LOW) -> bool:
+        """Take a token only if one is free right now and nobody is waiting (used for hedges)."""
+        if not self.enabled:
+            return True
+        with self._cond:
+            self.bucket.refill(self.clock())
+            if self._waiting or self.bucket.tokens < self._need(priority):
+                return False
+            self.bucket.tokens -= 1.0
+            return True
+
+    def acquire(self, priority: int, timeout: Optional[float] = None):
+        """
+        Block until this request may go out. Raises Throttled when the queue is full for
+        this priority or no token arrives within `timeout` (LOW also caps it at low_max_wait_s).
+        """
+        name = PRIORITY_NAMES[priority]
+        if not self.enabled:
+            ADMISSIONS.inc(priority=name, outcome="admitted")
+            return
+        if priority == LOW:
+            timeout = self.low_max_wait_s if timeout is None else min(timeout, self.low_max_wait_s)
+        started = self.clock()
+        deadline = None if timeout is None else started + timeout
+        with self._cond:
+            if len(self._waiting) >= self._queue_limit(priority):
+                ADMISSIONS.inc(priority=name, outcome="rejected")
+                raise Throttled(f"LLM queue full for {name} priority requests")
+            entry = (priority, next(self._seq))
+            heapq.heappush(self._waiting, entry)
+            self._set_depth()
+            try:
+                while True:
+                    now = self.clock()
+                    self.bucket.refill(now)
+                    wait = self.bucket.wait_time(self._need(priority))
+                    if self._waiting[0] == entry and wait == 0.0:
+                        heapq.heappop(self._waiting)
+                        self.bucket.tokens -= 1.0
+                        break
+                    if self._waiting[0] != entry:
+                        wait = None  # woken when the head of the queue leaves
+                    if deadline is not None:
+                        if now >= deadline:
+                            self._waiting.remove(entry)
+                            heapq.heapify(self._waiting)
+                            ADMISSIONS.inc(priority=name, outcome="expired")
+                            raise Throttled(f"no LLM quota for {name} priority request within {timeout:.2f}s")
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._cond.wait(wait)
+            finally:
+                self._set_depth()
+                self._cond.notify_all()
+        ADMISSIONS.inc(priority=name, outcome="admitted")
+        QUEUE_WAIT_SECONDS.observe(self.clock() - started, priority=name)
+
+    def stats(self):
+        with self._cond:
+            self.bucket.refill(self.clock())
+            return {"enabled": self.enabled, "tokens": round(self.bucket.tokens, 2),
+                    "queued": {PRIORITY_NAMES[p]: sum(1 for q, _ in self._waiting if q == p) for p in PRIORITY_NAMES}}
@@ -0,0 +1,179 @@
+# src/score_cache.py
+"""
+Exact-match cache for LLM scoring results (map_reply_to_score).
+
+Scoring runs at temperature 0, so the same reply to the same item gives the
+same answer; short replies ("not really", "every day honestly") repeat across
+users. Entries are keyed on (item, normalized reply, model, prompt version):
+changing GEMINI_MODEL or SCORE_PROMPT_VERSION makes every old entry a miss, and
+rows written under another prompt version are deleted on open, so a risk
+decision is never served from a prompt that is no longer live.
+
+Two levels:
+  - a bounded in-process LRU (SCORE_CACHE_SIZE entries, 0 disables the cache)
+  - a sqlite file (SCORE_CACHE_PATH) shared by worker processes and kept across
+    restarts, trimmed to SCORE_CACHE_MAX_ROWS least recently used rows
+Entries older than SCORE_CACHE_TTL_S are ignored and removed.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from metrics import REGISTRY
+
+CACHE_PATH = os.environ.get("SCORE_CACHE_PATH", os.path.join(os.path.dirname(__file__), "..", "score_cache.sqlite3"))
+CACHE_SIZE = int(os.environ.get("SCORE_CACHE_SIZE", 4096))
+CACHE_TTL_S = float(os.environ.get("SCORE_CACHE_TTL_S", 7 * 24 * 3600))
+CACHE_MAX_ROWS = int(os.environ.get("SCORE_CACHE_MAX_ROWS", 200_000))
+# trim the sqlite file every this many writes
+_TRIM_EVERY = 500
+
+CACHE_LOOKUPS = REGISTRY.counter("phq_chat_score_cache_total", "Score cache lookups by result.", ("result",))
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS score_cache (
+    key            TEXT PRIMARY KEY,
+    prompt_version TEXT NOT NULL,
+    value          TEXT NOT NULL,
+    created_at     REAL NOT NULL,
+    last_used      REAL NOT NULL
+)
+"""
+
+
+def make_key(item, normalized_reply: str, model: str, prompt_version: str) -> str:
+    raw = json.dumps([item, normalized_reply, model, prompt_version], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    def __init__(self, path: Optional[str], prompt_version: str, maxsize: int = CACHE_SIZE,
+                 ttl_s: float = CACHE_TTL_S, max_rows: int = CACHE_MAX_ROWS):
+        """`path=None` keeps the cache in memory only."""
+        self.prompt_version = prompt_version
+        self.maxsize = max(0, int(maxsize))
+        self.ttl_s = ttl_s
+        self.max_rows = max_rows
+        self._mem: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._lock = threading.Lock()      # the in-memory LRU and the counters
+        self._db_lock = threading.Lock()   # the sqlite connection; never held together with _lock
+        self._writes = 0
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        self._db = None
+        if path and self.maxsize:
+            self._db = self._open(path)
+
+    def _open(self, path: str) -> Optional[sqlite3.Connection]:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            db = sqlite3.connect(path, timeout=5.0, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            db.execute(_SCHEMA)
+            db.execute("DELETE FROM score_cache WHERE prompt_version != ? OR created_at < ?",
+                       (self.prompt_version, time.time() - self.ttl_s))
+            return db
+        except sqlite3.Error as e:
+            print(f"[score-cache] {path} unavailable, caching in memory only: {e}")
+            return None
+
+    def get(self, key: str) -> Optional[Dict]:
+        if not self.maxsize:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._mem.get(key)
+            if entry is not None and now - entry[0] < self.ttl_s:
+                self._mem.move_to_end(key)
+                self.hits["memory"] += 1
+                CACHE_LOOKUPS.inc(result="memory_hit")
+                return dict(entry[1])
+            self._mem.pop(key, None)
+        # the disk lookup runs outside _lock so memory hits never wait on sqlite
+        row = self._db_get(key, now)
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                CACHE_LOOKUPS.inc(result="miss")
+                return None
+            self._remember(key, row)
+            self.hits["disk"] += 1
+            CACHE_LOOKUPS.inc(result="disk_hit")
+            return dict(row[1])
+
+    def put(self, key: str, value: Dict):
+        if not self.maxsize:
+            return
+        now = time.time()
+        with self._lock:
+            self._remember(key, (now, value))
+        if self._db is None:
+            return
+        with self._db_lock:
+            try:
+                self._db.execute("INSERT OR REPLACE INTO score_cache VALUES (?, ?, ?, ?, ?)",
+                                 (key, self.prompt_version, json.dumps(value), now, now))
+                self._writes += 1
+                if self._writes % _TRIM_EVERY == 0:
+                    self._trim(now)
+            except sqlite3.Error as e:
+                print(f"[score-cache] write failed: {e}")
+
+    def _remember(self, key: str, entry: Tuple[float, Dict]):
+        self._mem[key] = entry
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.maxsize:
+            self._mem.popitem(last=False)
+
+    def _db_get(self, key: str, now: float) -> Optional[Tuple[float, Dict]]:
+        if self._db is None:
+            return None
+        with self._db_lock:
+            return self._db_get_locked(key, now)
+
+    def _db_get_locked(self, key: str, now: float) -> Optional[Tuple[float, Dict]]:
+        try:
+            row = self._db.execute("SELECT value, created_at FROM score_cache WHERE key = ? AND prompt_version = ?",
+                                   (key, self.prompt_version)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] >= self.ttl_s:
+                self._db.execute("DELETE FROM score_cache WHERE key = ?", (key,))
+                return None
+            self._db.execute("UPDATE score_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[1], json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            print(f"[score-cache] read failed: {e}")
+            return None
+
+    def _trim(self, now: float):
+        self._db.execute("DELETE FROM score_cache WHERE created_at < ?", (now - self.ttl_s,))
+        self._db.execute("DELETE FROM score_cache WHERE key IN (SELECT key FROM score_cache "
+                         "ORDER BY last_used DESC LIMIT -1 OFFSET ?)", (self.max_rows,))
+
+    def clear(self):
+        with self._lock:
+            self._mem.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM score_cache")
+
+    def stats(self) -> Dict:
+        with self._lock:
+            hits = self.hits["memory"] + self.hits["disk"]
+            total = hits + self.misses
+            return {
+                "size": len(self._mem),
+                "maxsize": self.maxsize,
+                "persistent": self._db is not None,
+                "memory_hits": self.hits["memory"],
+                "disk_hits": self.hits["disk"],
+                "misses": self.misses,
+                "hit_rate": (hits / total) if total else 0.0,
+            }
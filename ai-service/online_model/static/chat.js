@@ -81,66 +81,30 @@ async function sendUserReply() {
   disableControls(true);
 
   try {
-    const res = await fetch('/answer', {
+    // streamed variant: soothing text arrives token by token, then a final "done" event
+    const res = await fetch('/answer/stream', {
       method: 'POST',
       headers: {'Content-Type': 'application/json'},
       body: JSON.stringify({ reply: text })
     });
-    const data = await res.json();
-
-    if (data.error) {
-      appendMessage('bot', "Oops: " + (data.error || "unknown error"));
-      return;
-    }
-
-    if (data.status === 'escalate') {
-      // immediate crisis flow
-      appendMessage('bot', data.message || "We need to escalate. Please seek help.");
+    const isStream = (res.headers.get('Content-Type') || '').startsWith('text/event-stream');
+    if (!isStream || !res.body || !res.body.getReader) {
+      // errors come back as plain JSON; very old browsers can't read the body incrementally
+      handleAnswer(await res.json(), null);
       return;
     }
 
-    if (data.status === 'finished') {
-      if (data.bot_message) appendMessage('bot', data.bot_message);
-      const s = data.summary || {};
-      appendMessage('bot', `Summary — score: ${s.score}, level: ${s.level} (${s.label})`);
-      return;
-    }
-
-    if (data.status === 'continue') {
-      // show soothing reply first (styled)
-      if (data.soothing) {
-        appendMessage('bot', data.soothing, 'soothing');
-      } else {
-        // fallback empathetic phrase
-        appendMessage('bot', "Thanks for sharing — I appreciate you telling me that.", 'soothing');
+    let soothingEl = null;
+    let soothingText = '';
+    await readEvents(res.body.getReader(), (event, data) => {
+      if (event === 'soothing') {
+        soothingText += data.delta || '';
+        if (!soothingEl) soothingEl = appendMessage('bot', '', 'soothing');
+        setBotText(soothingEl, soothingText);
+      } else if (event === 'done') {
+        handleAnswer(data, soothingEl);
       }
-
-      // small "typing" indicator (optional)
-      const typingEl = appendMessage('bot', "…", 'typing');
-      // then show the next question after a short delay so the soothing message registers
-      const delayMs = 1000; // 1 second feels natural
-      setTimeout(() => {
-        // remove typing indicator
-        if (typingEl && typingEl.parentNode) typingEl.parentNode.removeChild(typingEl);
-
-        // show the next question
-        if (data.question) {
-          appendMessage('bot', data.question);
-        } else {
-          // fallback if LLM failed to produce a question
-          appendMessage('bot', "Can you tell me a bit more about how often you've felt this way? (rare / a few days / most days / nearly every day)");
-        }
-
-        // re-enable controls after showing next prompt
-        disableControls(false);
-      }, delayMs);
-
-      return;
-    }
-
-    // fallback for unexpected responses
-    appendMessage('bot', "Hmm — I didn't understand that. Try again or refresh the page.");
-    console.warn("Unexpected /answer response:", data);
+    });
 
   } catch (err) {
     appendMessage('bot', "Network or server error — please try again.");
@@ -151,6 +115,95 @@ async function sendUserReply() {
   }
 }
 
+// Parse a Server-Sent Events body ("event: x\ndata: {...}\n\n" frames) and call onEvent(event, data).
+async function readEvents(reader, onEvent) {
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event:')) event = line.slice(6).trim();
+        else if (line.startsWith('data:')) data += line.slice(5).trim();
+      }
+      if (data) onEvent(event, JSON.parse(data));
+    }
+  }
+}
+
+function setBotText(wrapper, text) {
+  const bot = wrapper.querySelector('.bot');
+  bot.innerHTML = `<strong>Bot:</strong> ${escapeHtml(text)}`;
+  chatEl.scrollTop = chatEl.scrollHeight;
+}
+
+// Render a /answer payload (or the "done" event of /answer/stream, where the
+// soothing bubble has already been filled in as it streamed).
+function handleAnswer(data, soothingEl) {
+  if (data.error) {
+    appendMessage('bot', "Oops: " + (data.error || "unknown error"));
+    return;
+  }
+
+  if (data.status === 'escalate') {
+    // immediate crisis flow
+    appendMessage('bot', data.message || "We need to escalate. Please seek help.");
+    return;
+  }
+
+  if (data.status === 'finished') {
+    if (data.bot_message) appendMessage('bot', data.bot_message);
+    const s = data.summary || {};
+    appendMessage('bot', `Summary — score: ${s.score}, level: ${s.level} (${s.label})`);
+    return;
+  }
+
+  if (data.status === 'continue') {
+    // show soothing reply first (styled)
+    if (soothingEl) {
+      if (data.soothing) setBotText(soothingEl, data.soothing);
+    } else if (data.soothing) {
+      appendMessage('bot', data.soothing, 'soothing');
+    } else {
+      // fallback empathetic phrase
+      appendMessage('bot', "Thanks for sharing — I appreciate you telling me that.", 'soothing');
+    }
+
+    // small "typing" indicator (optional)
+    const typingEl = appendMessage('bot', "…", 'typing');
+    // then show the next question after a short delay so the soothing message registers
+    const delayMs = 1000; // 1 second feels natural
+    setTimeout(() => {
+      // remove typing indicator
+      if (typingEl && typingEl.parentNode) typingEl.parentNode.removeChild(typingEl);
+
+      // show the next question
+      if (data.question) {
+        appendMessage('bot', data.question);
+      } else {
+        // fallback if LLM failed to produce a question
+        appendMessage('bot', "Can you tell me a bit more about how often you've felt this way? (rare / a few days / most days / nearly every day)");
+      }
+
+      // re-enable controls after showing next prompt
+      disableControls(false);
+    }, delayMs);
+
+    return;
+  }
+
+  // fallback for unexpected responses
+  appendMessage('bot', "Hmm — I didn't understand that. Try again or refresh the page.");
+  console.warn("Unexpected /answer response:", data);
+}
+
 // start automatically on load
 window.onload = () => {
   chatEl.innerHTML = '';
@@ -0,0 +1,18 @@
+# tests/conftest.py
+"""
+Shared setup for the online service tests (run from ai-service/online_model):
+  python -m pytest -q tests
+
+The LLM is replaced by the fake transport (llm_transport.FakeTransport), so no
+API key, network or google-genai install is needed.
+"""
+import os
+import sys
+from pathlib import Path
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))
+
+os.environ["LLM_TRANSPORT"] = "fake"
+os.environ.setdefault("LLM_FAKE_LATENCY", "0")
+os.environ.pop("GEMINI_API_KEY", None)
@@ -0,0 +1,45 @@
+# tests/test_app.py
+import pytest
+
+import app
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Record the order in which /answer scores the reply and starts the soothing call."""
+    events = []
+
+    def score(question, reply, item_idx=None):
+        events.append("score")
+        return {"answer": 1, "risk": "none", "explain": "stub", "raw": ""}
+
+    def soothing(next_q, reply):
+        return {"soothing": "ok", "next_question": "next?"}
+
+    real_submit = app.submit
+    monkeypatch.setattr(app, "map_reply_to_score", score)
+    monkeypatch.setattr(app, "generate_soothing_and_question", soothing)
+    monkeypatch.setattr(app, "get_pool", lambda: {})
+    monkeypatch.setattr(app, "TURN_MODE", "split")
+    monkeypatch.setattr(app, "submit", lambda fn, *a, **kw: events.append(fn.__name__) or real_submit(fn, *a, **kw))
+    return events
+
+
+def _answer(reply):
+    client = app.app.test_client()
+    client.post("/start")
+    resp = client.post("/answer", json={"reply": reply})
+    assert resp.status_code == 200
+    return resp.get_json()
+
+
+def test_soothing_runs_alongside_scoring(calls):
+    body = _answer("I have been tired and it is hard to say how often")
+    assert calls == ["soothing", "score"]
+    assert body["status"] == "continue" and body["soothing"] == "ok"
+
+
+def test_risky_reply_is_scored_before_any_soothing_call(calls):
+    body = _answer("some days I want to die")
+    assert calls == ["score", "soothing"]
+    assert body["status"] == "continue" and body["question"] == "next?"
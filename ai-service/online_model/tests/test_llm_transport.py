@@ -0,0 +1,116 @@
+# tests/test_llm_transport.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import pytest
+
+import llm_client
+import llm_transport
+from llm_transport import GeminiTransport, PromptPrefix
+from phq_items import PHQ_ITEMS
+from reply_mapper import has_risk_language
+from score_cache import ScoreCache
+
+PREFIX = PromptPrefix("score", "v9", "rules")
+OTHER = PromptPrefix("soothing", "v9", "other rules")
+
+
+class _StubClient:
+    """Stands in for google.genai.Client: records calls, cache creation takes `create_delay` seconds."""
+
+    def __init__(self, create_delay=0.0, fail=False):
+        self.create_delay, self.fail = create_delay, fail
+        self.created, self.configs = [], []
+        self._lock = threading.Lock()
+        self.caches = SimpleNamespace(create=self._create)
+        self.models = SimpleNamespace(generate_content=self._generate)
+
+    def _create(self, model, config):
+        with self._lock:
+            self.created.append(config["display_name"])
+        time.sleep(self.create_delay)
+        if self.fail:
+            raise RuntimeError("cached content too small")
+        return SimpleNamespace(name=f"cachedContents/{config['display_name']}")
+
+    def _generate(self, model, contents, config):
+        with self._lock:
+            self.configs.append(config)
+        return SimpleNamespace(text="{}", usage_metadata=None)
+
+
+def _transport(client) -> GeminiTransport:
+    transport = GeminiTransport(api_key="unused")
+    transport._client = client
+    return transport
+
+
+def test_cache_is_created_once_for_concurrent_callers():
+    client = _StubClient(create_delay=0.2)
+    transport = _transport(client)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: transport.generate("m", "hi", {}, PREFIX), range(16)))
+    assert client.created == ["phq-score-v9"]
+    assert all(c.get("cached_content") == "cachedContents/phq-score-v9" for c in client.configs)
+
+
+def test_creation_does_not_block_other_requests():
+    client = _StubClient(create_delay=1.0)
+    transport = _transport(client)
+    creating = threading.Thread(target=transport.generate, args=("m", "hi", {}, PREFIX))
+    creating.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    transport.generate("m", "no prefix", {})
+    assert time.monotonic() - started < 0.5
+    creating.join()
+
+
+def test_failed_creation_is_not_retried_on_every_request():
+    client = _StubClient(fail=True)
+    transport = _transport(client)
+    for _ in range(5):
+        transport.generate("m", "hi", {}, PREFIX)
+    assert client.created == ["phq-score-v9"]
+    assert all(c.get("system_instruction") == "rules" and "cached_content" not in c for c in client.configs)
+
+
+def test_renewal_keeps_serving_the_previous_cache(monkeypatch):
+    client = _StubClient(create_delay=0.5)
+    transport = _transport(client)
+    monkeypatch.setattr(llm_transport, "CONTEXT_CACHE_TTL_S", 3600)
+    transport.generate("m", "hi", {}, OTHER)
+    key = ("m", OTHER.name, OTHER.version)
+    transport._caches[key] = (transport._caches[key][0], time.monotonic() - 1)   # due for renewal
+
+    renewing = threading.Thread(target=transport.generate, args=("m", "hi", {}, OTHER))
+    renewing.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    transport.generate("m", "hi", {}, OTHER)
+    assert time.monotonic() - started < 0.3
+    renewing.join()
+    assert client.created == ["phq-soothing-v9"] * 2
+    assert all(c["cached_content"] == "cachedContents/phq-soothing-v9" for c in client.configs)
+
+
+# ----------------------
+# fake transport
+# ----------------------
+@pytest.mark.parametrize("reply", ["not really", "nearly every day, honestly", "I want to end my life"])
+def test_fake_transport_scores_the_reply_the_same_in_every_mode(monkeypatch, reply):
+    monkeypatch.setattr(llm_client, "_score_cache", ScoreCache(None, llm_client.SCORE_PROMPT_VERSION))
+    scored = llm_client.map_reply_to_score(PHQ_ITEMS[0], reply, item_idx=0)
+    turn = llm_client.process_turn(PHQ_ITEMS[0], reply, PHQ_ITEMS[1])
+    turn_pooled = llm_client.process_turn(PHQ_ITEMS[0], reply, None)
+    assert (turn["answer"], turn["risk"]) == (scored["answer"], scored["risk"])
+    assert (turn_pooled["answer"], turn_pooled["risk"]) == (scored["answer"], scored["risk"])
+    assert scored["risk"] == ("suicidal" if has_risk_language(reply) else "none")
+
+
+def test_fake_transport_reads_the_reply_not_the_question():
+    # Q9's own wording is risk language; only the user's reply may decide the risk
+    turn = llm_client.process_turn(PHQ_ITEMS[8], "no, never", None)
+    assert turn["risk"] == "none"
@@ -0,0 +1,40 @@
+# tests/test_question_pool.py
+import importlib
+
+import pytest
+
+import question_pool
+from question_pool import QuestionPool
+
+
+def test_missing_pool_file_falls_back_loudly(tmp_path, capsys):
+    pool = QuestionPool.load(str(tmp_path / "missing.json"), "random")
+    assert pool.get(1) is None
+    assert "[pool] cannot load" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("content", ["{not json", '{"version": 1}', '{"items": ["a", "b"]}'])
+def test_corrupt_pool_file_falls_back_loudly(tmp_path, capsys, content):
+    path = tmp_path / "question_pool.json"
+    path.write_text(content, encoding="utf-8")
+    pool = QuestionPool.load(str(path), "random")
+    assert pool.get(1) is None
+    assert f"[pool] cannot load {path}" in capsys.readouterr().out
+
+
+def test_round_robin_cycles_the_variants(tmp_path):
+    path = tmp_path / "question_pool.json"
+    path.write_text('{"items": {"1": ["A?", " ", "B?"]}}', encoding="utf-8")
+    pool = QuestionPool.load(str(path), "round_robin")
+    assert [pool.get(1) for _ in range(3)] == ["A?", "B?", "A?"]
+    assert pool.get(2) is None
+
+
+def test_unknown_strategy_fails_at_import(monkeypatch):
+    monkeypatch.setenv("QUESTION_POOL_STRATEGY", "roundrobin")
+    try:
+        with pytest.raises(ValueError, match="QUESTION_POOL_STRATEGY 'roundrobin'"):
+            importlib.reload(question_pool)
+    finally:
+        monkeypatch.delenv("QUESTION_POOL_STRATEGY")
+        importlib.reload(question_pool)
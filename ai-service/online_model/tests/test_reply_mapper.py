@@ -0,0 +1,58 @@
+# tests/test_reply_mapper.py
+import pytest
+
+from reply_mapper import LOCAL_CONFIDENCE_THRESHOLD, map_reply_locally
+
+
+@pytest.mark.parametrize("reply", ["no", "Nope.", "none", "zero", "nothing like that", "not really", "never"])
+def test_whole_reply_negations_score_zero_locally(reply):
+    out = map_reply_locally(reply)
+    assert out["answer"] == 0 and out["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("reply", [
+    "no idea",
+    "none of your business",
+    "nope, not telling you",
+    "nothing like that, it's worse",
+    "zero energy",
+    "honestly no",
+])
+def test_contained_negations_go_to_the_llm(reply):
+    assert map_reply_locally(reply)["confidence"] < LOCAL_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("reply, answer", [
+    ("no, never", 0),
+    ("no not really", 0),
+    ("every day no doubt", 3),
+    ("most days", 2),
+])
+def test_negation_next_to_a_frequency_phrase_is_ignored(reply, answer):
+    out = map_reply_locally(reply)
+    assert out["answer"] == answer and out["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("reply", [
+    "over the last 14 days, maybe twice",          # the look-back window is not an answer
+    "i had no days off work, felt low most days",  # conflicting frequencies
+    "not 3 days",
+    "I never feel like that, maybe one day",
+    "someone days",                                # number words only as whole words
+])
+def test_ambiguous_numeric_replies_go_to_the_llm(reply):
+    assert map_reply_locally(reply)["confidence"] < LOCAL_CONFIDENCE_THRESHOLD
+
+
+@pytest.mark.parametrize("reply, answer", [
+    ("3 days", 1),
+    ("about five days", 1),
+    ("3 out of the last 14 days", 1),
+    ("10 out of 14 days", 2),
+    ("twice a week", 1),
+    ("4 days a week", 2),
+    ("in the past two weeks, maybe 13 days", 3),
+])
+def test_numeric_replies_score_locally(reply, answer):
+    out = map_reply_locally(reply)
+    assert out["answer"] == answer and out["confidence"] >= LOCAL_CONFIDENCE_THRESHOLD
@@ -0,0 +1,90 @@
+# tests/test_resilience.py
+import time
+
+import pytest
+
+import llm_client
+from resilience import BudgetExceededError, CircuitBreaker, CircuitOpenError, turn_budget
+from scheduler import HIGH, LLMScheduler, Throttled
+
+
+def _half_open_breaker() -> CircuitBreaker:
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=2, window_s=60, cooldown_s=0.05)
+    breaker.record(False)
+    breaker.record(False)
+    assert breaker.state == "open"
+    time.sleep(0.06)
+    assert breaker.state == "half_open"
+    return breaker
+
+
+def test_probe_is_released_when_throttled(monkeypatch):
+    breaker = _half_open_breaker()
+    scheduler = LLMScheduler(rate_per_min=60, burst=1, reserved=0, max_queue=4)
+    assert scheduler.try_acquire(HIGH)   # empty the bucket
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    monkeypatch.setattr(llm_client, "scheduler", scheduler)
+
+    with turn_budget(0.05):
+        with pytest.raises(Throttled):
+            llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+
+    # the probe slot is free again: the next call is allowed and its success closes the circuit
+    scheduler.bucket.tokens = 1.0
+    llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+    assert breaker.state == "closed"
+
+
+def test_stream_probe_is_released_when_throttled(monkeypatch):
+    breaker = _half_open_breaker()
+    scheduler = LLMScheduler(rate_per_min=60, burst=1, reserved=0, max_queue=4)
+    assert scheduler.try_acquire(HIGH)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    monkeypatch.setattr(llm_client, "scheduler", scheduler)
+
+    with turn_budget(0.05):
+        with pytest.raises(Throttled):
+            list(llm_client.stream_soothing("I feel tired"))
+    assert breaker.allow() is True   # still half open, and this call may probe
+
+
+def test_abandoned_stream_releases_probe(monkeypatch):
+    breaker = _half_open_breaker()
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    stream = llm_client.stream_soothing("I feel tired")
+    next(stream)
+    stream.close()
+    assert breaker.allow() is True
+
+
+def test_open_circuit_rejects_without_spending_quota(monkeypatch):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=2, window_s=60, cooldown_s=60)
+    breaker.record(False)
+    breaker.record(False)
+    scheduler = LLMScheduler(rate_per_min=60, burst=1, reserved=0, max_queue=4)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    monkeypatch.setattr(llm_client, "scheduler", scheduler)
+    with pytest.raises(CircuitOpenError):
+        llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+    assert scheduler.try_acquire(HIGH)
+
+
+def test_exhausted_budget_is_not_a_provider_failure(monkeypatch):
+    breaker = CircuitBreaker(error_rate=0.5, min_calls=2, window_s=60, cooldown_s=60)
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    for _ in range(3):
+        with turn_budget(0):
+            with pytest.raises(BudgetExceededError):
+                llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+    assert breaker.stats() == {"state": "closed", "trips": 0, "window_calls": 0, "window_failures": 0}
+
+
+def test_probe_without_budget_is_released(monkeypatch):
+    breaker = _half_open_breaker()
+    monkeypatch.setattr(llm_client, "breaker", breaker)
+    with turn_budget(0):
+        with pytest.raises(BudgetExceededError):
+            llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+    assert breaker.state == "half_open"
+    llm_client._generate("score", llm_client.SCORE_PREFIX, "x", temperature=0.0, max_output_tokens=8)
+    assert breaker.state == "closed"
@@ -0,0 +1,130 @@
+# tests/test_scheduler.py
+"""
+LLMScheduler on a fake clock: tokens only appear when a test advances it, so the
+admission order does not depend on thread timing.
+"""
+import threading
+import time
+
+import pytest
+
+from scheduler import HIGH, LOW, NORMAL, LLMScheduler, Throttled
+
+
+class _Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _scheduler(clock, **kw) -> LLMScheduler:
+    # 600/min = one token every 0.1 fake seconds
+    kw = {"rate_per_min": 600, "burst": 1, "reserved": 0, "max_queue": 8, "low_max_wait_s": 100.0, **kw}
+    return LLMScheduler(clock=clock, **kw)
+
+
+def _tick(scheduler: LLMScheduler, clock: _Clock, seconds: float):
+    """Advance the fake clock and wake the waiters so they look at it."""
+    clock.now += seconds
+    with scheduler._cond:
+        scheduler._cond.notify_all()
+
+
+def _wait_for(predicate, timeout: float = 2.0):
+    end = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < end, "timed out"
+        time.sleep(0.005)
+
+
+def _start(scheduler: LLMScheduler, priority: int, results: list, timeout=None) -> threading.Thread:
+    def run():
+        try:
+            scheduler.acquire(priority, timeout=timeout)
+            results.append(priority)
+        except Throttled:
+            results.append(("throttled", priority))
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t
+
+
+def _queued(scheduler: LLMScheduler) -> int:
+    return sum(scheduler.stats()["queued"].values())
+
+
+def test_waiters_are_admitted_by_priority():
+    clock = _Clock()
+    scheduler = _scheduler(clock)
+    assert scheduler.try_acquire(HIGH)   # empty the bucket
+    admitted = []
+    threads = []
+    for n, priority in enumerate((LOW, NORMAL, HIGH)):   # arrive lowest priority first
+        threads.append(_start(scheduler, priority, admitted))
+        _wait_for(lambda: _queued(scheduler) == n + 1)
+
+    for n in range(3):
+        _tick(scheduler, clock, 0.1)
+        _wait_for(lambda: len(admitted) == n + 1)
+    assert admitted == [HIGH, NORMAL, LOW]
+    for t in threads:
+        t.join(timeout=1.0)
+
+
+def test_reserved_tokens_are_kept_for_high_priority():
+    clock = _Clock()
+    scheduler = _scheduler(clock, burst=3, reserved=2)
+    assert scheduler.try_acquire(NORMAL)       # 3 -> 2 tokens
+    assert not scheduler.try_acquire(NORMAL)   # the last 2 belong to HIGH
+    assert not scheduler.try_acquire(LOW)
+    assert scheduler.try_acquire(HIGH)
+    assert scheduler.try_acquire(HIGH)
+    assert not scheduler.try_acquire(HIGH)
+
+
+def test_full_queue_rejects_lower_priorities_first():
+    clock = _Clock()
+    scheduler = _scheduler(clock, max_queue=4)   # limits: HIGH 4, NORMAL 2, LOW 1
+    assert scheduler.try_acquire(HIGH)
+    admitted = []
+    threads = [_start(scheduler, HIGH, admitted) for _ in range(2)]
+    _wait_for(lambda: _queued(scheduler) == 2)
+
+    with pytest.raises(Throttled):
+        scheduler.acquire(LOW)
+    with pytest.raises(Throttled):
+        scheduler.acquire(NORMAL)
+    threads.append(_start(scheduler, HIGH, admitted))   # HIGH still gets a place
+    _wait_for(lambda: _queued(scheduler) == 3)
+
+    for n in range(3):
+        _tick(scheduler, clock, 0.1)
+        _wait_for(lambda: len(admitted) == n + 1)
+    assert admitted == [HIGH, HIGH, HIGH]
+    for t in threads:
+        t.join(timeout=1.0)
+
+
+def test_low_priority_gives_up_after_its_max_wait():
+    clock = _Clock()
+    scheduler = _scheduler(clock, rate_per_min=0.6, low_max_wait_s=0.5)   # next token in 100 s
+    assert scheduler.try_acquire(HIGH)
+    results = []
+    low = _start(scheduler, LOW, results)
+    high = _start(scheduler, HIGH, results)   # no timeout: HIGH is not capped
+    _wait_for(lambda: _queued(scheduler) == 2)
+
+    _tick(scheduler, clock, 0.4)
+    time.sleep(0.05)
+    assert results == []
+    _tick(scheduler, clock, 0.2)
+    _wait_for(lambda: results == [("throttled", LOW)])
+    low.join(timeout=1.0)
+    assert scheduler.stats()["queued"] == {"high": 1, "normal": 0, "low": 0}
+
+    _tick(scheduler, clock, 100.0)
+    _wait_for(lambda: results == [("throttled", LOW), HIGH])
+    high.join(timeout=1.0)
@@ -0,0 +1,78 @@
+# tests/test_score_cache.py
+import threading
+
+import score_cache
+from score_cache import ScoreCache, make_key
+
+RISKY = {"answer": 3, "risk": "suicidal", "explain": "x", "raw": "3"}
+
+
+class _Clock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _key(reply: str, version: str = "v1") -> str:
+    return make_key(8, reply, "gemini-test", version)
+
+
+def test_entries_expire_after_the_ttl(tmp_path, monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(score_cache.time, "time", clock)
+    cache = ScoreCache(str(tmp_path / "c.sqlite3"), "v1", maxsize=8, ttl_s=60)
+    cache.put(_key("every day"), RISKY)
+    clock.now += 59
+    assert cache.get(_key("every day")) == RISKY
+    clock.now += 2
+    assert cache.get(_key("every day")) is None
+    # expired on disk too, so a fresh process does not bring it back
+    assert ScoreCache(str(tmp_path / "c.sqlite3"), "v1", maxsize=8, ttl_s=60).get(_key("every day")) is None
+
+
+def test_memory_is_bounded_least_recently_used_first():
+    cache = ScoreCache(None, "v1", maxsize=2)
+    cache.put(_key("a"), {"answer": 0})
+    cache.put(_key("b"), {"answer": 1})
+    assert cache.get(_key("a")) == {"answer": 0}   # "b" is now the oldest
+    cache.put(_key("c"), {"answer": 2})
+    assert cache.get(_key("b")) is None
+    assert cache.get(_key("a")) == {"answer": 0}
+    assert cache.get(_key("c")) == {"answer": 2}
+    assert cache.stats()["size"] == 2
+
+
+def test_disk_hit_after_restart(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    ScoreCache(path, "v1", maxsize=8).put(_key("not really"), {"answer": 0, "risk": "none"})
+
+    restarted = ScoreCache(path, "v1", maxsize=8)
+    assert restarted.get(_key("not really")) == {"answer": 0, "risk": "none"}
+    assert restarted.get(_key("not really")) == {"answer": 0, "risk": "none"}
+    stats = restarted.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_other_prompt_versions_are_purged_on_open(tmp_path):
+    path = str(tmp_path / "c.sqlite3")
+    ScoreCache(path, "v1", maxsize=8).put(_key("sometimes"), RISKY)
+
+    # even a lookup with the old key must not serve the old version's risk decision
+    upgraded = ScoreCache(path, "v2", maxsize=8)
+    assert upgraded.get(_key("sometimes", "v1")) is None
+    assert upgraded.get(_key("sometimes", "v2")) is None
+    rows = upgraded._db.execute("SELECT COUNT(*) FROM score_cache WHERE prompt_version != 'v2'").fetchone()[0]
+    assert rows == 0
+
+
+def test_memory_hits_do_not_wait_on_the_disk(tmp_path):
+    cache = ScoreCache(str(tmp_path / "c.sqlite3"), "v1", maxsize=8)
+    cache.put(_key("hot"), {"answer": 1})
+    hit = []
+    with cache._db_lock:   # a slow disk read in another thread
+        t = threading.Thread(target=lambda: hit.append(cache.get(_key("hot"))))
+        t.start()
+        t.join(timeout=1.0)
+        assert hit == [{"answer": 1}]
@@ -0,0 +1,76 @@
+# tests/test_streaming.py
+import queue
+import threading
+import time
+
+import pytest
+
+import app
+import llm_client
+from llm_transport import FakeTransport
+from resilience import CircuitBreaker, turn_budget
+
+
+def _slow_stream(closed: threading.Event, step: float = 0.05):
+    try:
+        for _ in range(200):
+            time.sleep(step)
+            yield "x "
+    finally:
+        closed.set()
+
+
+def test_pump_stops_at_the_deadline_and_closes_the_stream():
+    closed, out = threading.Event(), queue.Queue()
+    started = time.monotonic()
+    app._pump_stream(_slow_stream(closed), out, time.monotonic() + 0.2, threading.Event())
+    assert time.monotonic() - started < 1.0
+    assert closed.is_set()
+    items = []
+    while True:
+        item = out.get_nowait()
+        if item is None:
+            break
+        items.append(item)
+    assert 0 < len(items) < 10
+
+
+def test_pump_stops_when_the_reader_goes_away():
+    closed, out, stop = threading.Event(), queue.Queue(), threading.Event()
+    pump = threading.Thread(target=app._pump_stream, args=(_slow_stream(closed), out, time.monotonic() + 60, stop))
+    pump.start()
+    assert out.get(timeout=1) == "x "
+    stop.set()
+    pump.join(timeout=1)
+    assert not pump.is_alive() and closed.is_set()
+
+
+def test_stream_soothing_is_bounded_by_the_turn_budget(monkeypatch):
+    monkeypatch.setattr(llm_client, "transport", FakeTransport(latency="30"))
+    monkeypatch.setattr(llm_client, "breaker", CircuitBreaker())
+    started = time.monotonic()
+    with turn_budget(0.2):
+        with pytest.raises(TimeoutError):
+            list(llm_client.stream_soothing("I feel tired"))
+    assert time.monotonic() - started < 5.0
+
+
+def test_disconnected_client_ends_the_pump(monkeypatch):
+    # ~3 s of streamed words; the pump should end soon after the client goes away
+    monkeypatch.setattr(llm_client, "transport", FakeTransport(latency="3"))
+    finished = threading.Event()
+    real_pump = app._pump_stream
+
+    def pump(*args):
+        try:
+            real_pump(*args)
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(app, "_pump_stream", pump)
+    client = app.app.test_client()
+    client.post("/start")
+    resp = client.post("/answer/stream", json={"reply": "most days"}, buffered=False)
+    assert next(resp.response).startswith(b"event: soothing")
+    resp.close()
+    assert finished.wait(1.5)